@@ -136,6 +136,42 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
+# 缓存
+# - default：限流计数等
+# - responses：读接口响应缓存（core/response_cache.py）。键中包含数据版本号，数据变化后旧条目自然失效，
+#   由 MAX_ENTRIES 限制条目数、TIMEOUT 回收长期不再访问的条目；多进程部署可换成共享的 Redis 等后端。
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "TIMEOUT": 600,
+        "OPTIONS": {"MAX_ENTRIES": 1000, "CULL_FREQUENCY": 4},
+    },
+}
+
+# 谷子统计（/api/goods/stats/）带筛选时的计算引擎（apps/goods/stats_engine.py）：
+# - columnar：一次读取筛选结果的列数组，用 NumPy 计算全部分布与趋势（需要 numpy，未安装时自动退回 sql）
+# - sql：逐项分组聚合
+GOODS_STATS_ENGINE = "columnar"
+
+# 相似随机（/api/goods/similar-random/）分组时的相似度计算引擎（apps/goods/similarity_engine.py）：
+# - vectorized：把谷子编码为列数组，用 NumPy 一次算出全部种子 × 谷子的分数（需要 numpy，未安装时自动退回 python）
+# - python：GoodsSimilarityCalculator 逐对计算
+GOODS_SIMILARITY_ENGINE = "vectorized"
+# 向量化引擎编码后的相似度特征按「数据版本号 + 筛选条件」缓存的保留时间（秒），数据变化即换键
+GOODS_SIMILARITY_FEATURE_TTL = 3600
+# 相似随机第一页返回的排序会话（完整 ID 列表）的保留时间（秒），每次翻页顺延
+GOODS_SIMILAR_SESSION_TTL = 1800
+# 近邻表（/api/goods/{id}/similar/）为每件谷子保存的相似谷子数，即 ?k= 的上限；修改后需执行 rebuild_goods_neighbors
+GOODS_SIMILAR_NEIGHBORS = 50
+
+# 统计等接口的「过期先返回、后台重算」（core/revalidate.py）：旧结果保留时间（秒）与后台线程数
+STALE_WHILE_REVALIDATE_TTL = 24 * 3600
+STALE_WHILE_REVALIDATE_WORKERS = 2
+
 # DRF 统一配置
 REST_FRAMEWORK = {
     # 默认要求登录（auth 相关接口会单独 AllowAny）
@@ -1,12 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import AdminRoleViewSet, AdminUserViewSet
+from .views import AdminResponseCacheView, AdminRoleViewSet, AdminUserViewSet
 
 router = DefaultRouter()
 router.register("users", AdminUserViewSet, basename="admin-users")
 router.register("roles", AdminRoleViewSet, basename="admin-roles")
 
 urlpatterns = [
+    path("response-cache/", AdminResponseCacheView.as_view(), name="admin-response-cache"),
     path("", include(router.urls)),
 ]
@@ -5,8 +5,10 @@ from rest_framework import mixins, status, viewsets
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from apps.users.models import Role, User
+from core import response_cache
 from core.permissions import IsAdmin
 
 from .serializers import (
@@ -104,3 +106,23 @@ class AdminRoleViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated, IsAdmin]
     serializer_class = AdminRoleSerializer
     queryset = Role.objects.order_by("id")
+
+
+@extend_schema(
+    tags=["Admin"],
+    summary="管理员：读接口响应缓存统计",
+    description=(
+        "GET 返回各视图动作的命中 / 未命中 / 跳过次数（按进程统计）；"
+        "DELETE 清空缓存条目并重置计数。"
+    ),
+)
+class AdminResponseCacheView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+    def delete(self, request):
+        response_cache.clear()
+        response_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
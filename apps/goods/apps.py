@@ -5,12 +5,15 @@ class GoodsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.goods'
 
-    # def ready(self):
-    #     # 导入信号，确保模型文件清理逻辑生效
-    #     import apps.goods.signals  # noqa: F401
+    def ready(self):
+        # 派生索引 / 读模型的维护逻辑（闭包表等）
+        import apps.goods.receivers  # noqa: F401
+
+        # # 导入信号，确保模型文件清理逻辑生效
+        # import apps.goods.signals  # noqa: F401
         
-    #     # 初始化品类数据
-    #     self._init_categories()
+        # # 初始化品类数据
+        # self._init_categories()
     
     # def _init_categories(self):
     #     """系统启动时自动创建默认品类"""
@@ -0,0 +1,139 @@
+"""
+谷子列表卡片读模型（GoodsCard）的构建、读取与失效。
+
+列表接口的开销主要在嵌套部分：JOIN ip / category / location / theme / user，prefetch characters__ip 与
+关键词，再逐层跑嵌套序列化器。卡片把这部分（GoodsCardSerializer 的输出）持久化到 GoodsCard，
+列表渲染时只需：
+
+1. 一次查询取出本页谷子行（不再 select_related / prefetch）；
+2. 一次查询按主键取出本页卡片；缺失或过期的卡片批量重建并写回；
+3. 用 GoodsRowSerializer 序列化行上的标量字段（order / status 等，拖拽排序不会使卡片失效），
+   按 GoodsListSerializer 的字段顺序与卡片合并，并把相对 URL 补全为绝对 URL。
+
+输出与直接使用 GoodsListSerializer 完全一致。
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db.models import Q
+
+from .models import Goods, GoodsCard
+from .serializers import GoodsCardSerializer, GoodsListSerializer, GoodsRowSerializer
+
+# 卡片格式版本：GoodsCardSerializer 输出结构变化时 +1，旧卡片会因签名不符自动重建
+CARD_VERSION = 1
+
+CARD_FIELDS = GoodsCardSerializer.Meta.fields
+
+# 参与签名的外键列：这些列变化（含 queryset.update）后卡片自动过期，无需信号
+SIGNATURE_FIELDS = ("ip_id", "category_id", "theme_id", "location_id", "user_id")
+
+
+def signature_of(goods) -> str:
+    values = ":".join(str(getattr(goods, field) or "") for field in SIGNATURE_FIELDS)
+    return f"v{CARD_VERSION}:{values}"
+
+
+def build_cards(goods_ids: Iterable) -> dict:
+    """
+    批量构建并写回卡片，返回 {goods_id: card_data}。查询次数与谷子数量无关
+    （IP 角色数量由 IPSimpleSerializer 的批量加载器一次统计）。
+    """
+    goods_list = list(
+        Goods.objects.filter(id__in=list(goods_ids))
+        .select_related("ip", "category", "location", "theme", "user")
+        .prefetch_related("ip__keywords", "characters__ip__keywords")
+    )
+    if not goods_list:
+        return {}
+
+    data = GoodsCardSerializer(goods_list, many=True, context={"request": None}).data
+    cards = [
+        GoodsCard(goods_id=goods.pk, data=dict(card), signature=signature_of(goods))
+        for goods, card in zip(goods_list, data)
+    ]
+    GoodsCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=["goods"],
+        update_fields=["data", "signature", "built_at"],
+    )
+    return {card.goods_id: card.data for card in cards}
+
+
+def _absolute(request, url):
+    if not url or request is None or url.startswith(("http://", "https://")):
+        return url
+    return request.build_absolute_uri(url)
+
+
+def render(goods_list, request) -> list:
+    """把一页谷子对象渲染为与 GoodsListSerializer 相同的列表数据。"""
+    goods_list = list(goods_list)
+    if not goods_list:
+        return []
+
+    stored = {
+        goods_id: (data, signature)
+        for goods_id, data, signature in GoodsCard.objects.filter(
+            goods_id__in=[goods.pk for goods in goods_list]
+        ).values_list("goods_id", "data", "signature")
+    }
+    cards = {}
+    stale = []
+    for goods in goods_list:
+        entry = stored.get(goods.pk)
+        if entry is not None and entry[1] == signature_of(goods):
+            cards[goods.pk] = entry[0]
+        else:
+            stale.append(goods.pk)
+    if stale:
+        cards.update(build_cards(stale))
+
+    rows = GoodsRowSerializer(goods_list, many=True, context={"request": request}).data
+    results = []
+    for goods, row in zip(goods_list, rows):
+        card = cards[goods.pk]
+        item = {}
+        for field in GoodsListSerializer.Meta.fields:
+            item[field] = card[field] if field in CARD_FIELDS else row[field]
+        for character in item["characters"]:
+            character["avatar"] = _absolute(request, character.get("avatar"))
+        results.append(item)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 失效：删除受影响的卡片，下次读取时按需重建
+# ---------------------------------------------------------------------------
+
+def invalidate(condition: Q) -> int:
+    """删除满足条件（以 goods__ 开头的查找）的卡片，返回删除条数。"""
+    deleted, _ = GoodsCard.objects.filter(condition).delete()
+    return deleted
+
+
+def invalidate_goods(goods_ids: Iterable) -> int:
+    goods_ids = list(goods_ids)
+    if not goods_ids:
+        return 0
+    return invalidate(Q(goods_id__in=goods_ids))
+
+
+def invalidate_ip(ip_id) -> int:
+    """IP 及其关键词 / 角色数量会嵌套出现在 goods.ip 与 goods.characters[].ip 中。"""
+    return invalidate(
+        Q(goods__ip_id=ip_id)
+        | Q(goods_id__in=Goods.characters.through.objects.filter(character__ip_id=ip_id).values("goods_id"))
+    )
+
+
+def rebuild_all(batch_size: int = 500) -> int:
+    """全量重建卡片，返回写入条数。"""
+    GoodsCard.objects.all().delete()
+    goods_ids = list(Goods.objects.order_by("id").values_list("id", flat=True))
+    written = 0
+    for start in range(0, len(goods_ids), batch_size):
+        written += len(build_cards(goods_ids[start:start + batch_size]))
+    return written
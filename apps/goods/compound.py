@@ -0,0 +1,141 @@
+"""
+侧载（compound）响应：?format=compound 时列表行只携带外键 ID，被引用的 IP / 角色 / 品类 / 主题 /
+位置 / 用户统一放在 ``included`` 中，每个对象只序列化一次。
+
+结构示例::
+
+    {
+      "results": [{"id": 1, "ip": 3, "characters": [5, 8], "category": 2, "location": 7, ...}],
+      "included": {"ip": {"3": {...}}, "character": {"5": {...}, "8": {...}}, ...}
+    }
+
+``included`` 按类型分组、以 ID（字符串）为键，前端按 ID 直接查表即可。
+每种类型一次批量查询，查询次数与行数 / 引用重复度无关。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.db.models import Count
+
+from apps.location.models import StorageNode
+from apps.users.models import User
+
+from .models import Category, Character, Goods, IP, Theme
+from .serializers import (
+    CategorySimpleSerializer,
+    GoodsListSerializer,
+    GoodsRowSerializer,
+    IncludedCharacterSerializer,
+    IncludedLocationSerializer,
+    IncludedUserSerializer,
+    IPSimpleSerializer,
+    ThemeSimpleSerializer,
+)
+
+# 行字段顺序与 GoodsListSerializer 一致，location_path 换成位置 ID
+ROW_FIELDS = tuple(
+    "location" if field == "location_path" else field for field in GoodsListSerializer.Meta.fields
+)
+
+# 行上的外键字段 -> included 类型
+FOREIGN_KEYS = {
+    "user": "user",
+    "ip": "ip",
+    "category": "category",
+    "theme": "theme",
+    "location": "location",
+}
+
+
+def _character_ids(goods_ids) -> dict:
+    """一次查询取出各谷子的角色 ID，顺序与 goods.characters.all()（角色默认排序）一致。"""
+    result = defaultdict(list)
+    through = (
+        Goods.characters.through.objects.filter(goods_id__in=goods_ids)
+        .order_by(*[f"character__{field}" for field in Character._meta.ordering], "character_id")
+        .values_list("goods_id", "character_id")
+    )
+    for goods_id, character_id in through:
+        result[goods_id].append(character_id)
+    return result
+
+
+def build_rows(goods_list, request) -> tuple[list, dict]:
+    """
+    把一页谷子对象转换为只含外键 ID 的行，同时收集被引用的对象 ID。
+
+    返回 (rows, refs)，refs 为 {类型: {ID, ...}}，交给 build_included 批量加载。
+    """
+    goods_list = list(goods_list)
+    refs = defaultdict(set)
+    if not goods_list:
+        return [], refs
+
+    characters = _character_ids([goods.pk for goods in goods_list])
+    scalars = GoodsRowSerializer(goods_list, many=True, context={"request": request}).data
+    rows = []
+    for goods, scalar in zip(goods_list, scalars):
+        row = {}
+        for field in ROW_FIELDS:
+            if field in FOREIGN_KEYS:
+                value = getattr(goods, f"{field}_id")
+                if value is not None:
+                    refs[FOREIGN_KEYS[field]].add(value)
+                row[field] = value
+            elif field == "characters":
+                row[field] = characters[goods.pk]
+                refs["character"].update(row[field])
+            else:
+                row[field] = scalar[field]
+        rows.append(row)
+    return rows, refs
+
+
+def _keyed(data) -> dict:
+    return {str(item["id"]): item for item in data}
+
+
+def build_included(refs: dict, request) -> dict:
+    """按类型批量加载并序列化被引用对象；角色所属的 IP 也一并放入 included["ip"]。"""
+    context = {"request": request}
+    included = {}
+
+    character_ids = refs.get("character") or set()
+    if character_ids:
+        characters = list(Character.objects.filter(id__in=character_ids))
+        included["character"] = _keyed(
+            IncludedCharacterSerializer(characters, many=True, context=context).data
+        )
+        refs = {**refs, "ip": set(refs.get("ip") or ()) | {c.ip_id for c in characters}}
+
+    if refs.get("ip"):
+        ips = (
+            IP.objects.filter(id__in=refs["ip"])
+            .annotate(character_count=Count("characters"))
+            .prefetch_related("keywords")
+        )
+        included["ip"] = _keyed(IPSimpleSerializer(ips, many=True, context=context).data)
+    if refs.get("category"):
+        categories = Category.objects.filter(id__in=refs["category"])
+        included["category"] = _keyed(
+            CategorySimpleSerializer(categories, many=True, context=context).data
+        )
+    if refs.get("theme"):
+        themes = Theme.objects.filter(id__in=refs["theme"])
+        included["theme"] = _keyed(ThemeSimpleSerializer(themes, many=True, context=context).data)
+    if refs.get("location"):
+        locations = StorageNode.objects.filter(id__in=refs["location"])
+        included["location"] = _keyed(
+            IncludedLocationSerializer(locations, many=True, context=context).data
+        )
+    if refs.get("user"):
+        users = User.objects.filter(id__in=refs["user"])
+        included["user"] = _keyed(IncludedUserSerializer(users, many=True, context=context).data)
+    return included
+
+
+def build(goods_list, request) -> tuple[list, dict]:
+    """返回 (rows, included)。"""
+    rows, refs = build_rows(goods_list, request)
+    return rows, build_included(refs, request)
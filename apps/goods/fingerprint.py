@@ -0,0 +1,105 @@
+"""
+谷子重复检测指纹（Goods.duplicate_fingerprint）。
+
+新建 / 合并谷子时的重复判定为「同一用户 + IP + 名称 + 入手日期 + 单价 + 角色集合完全一致」。
+指纹是这些值规范化后的 SHA-1，持久化在谷子行上并建索引，重复检测只需一次等值查询，
+不再按候选逐个读取角色在 Python 中比较。
+
+- 名称：NFKC（全角转半角）、去掉首尾空白并合并连续空白、casefold；
+  不做繁简转换（zhconv 为可选依赖，安装与否不应改变已保存的指纹）；
+- 单价按两位小数规范化，入手日期为 ISO 格式，空值为空字符串；角色 ID 排序去重。
+
+维护（见 receivers.py）：保存谷子时在 pre_save 中写入，角色关联变化 / 角色删除后按批刷新；
+批量导入在 bulk_create 之前直接计算。compute() 为纯函数，迁移中也可直接使用。
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Iterable
+
+from .models import Goods
+
+_SPACES_RE = re.compile(r"\s+")
+CENT = Decimal("0.01")
+
+# 参与指纹的谷子列（角色集合另计）
+FIELDS = ("user_id", "ip_id", "name", "purchase_date", "price")
+
+BATCH_SIZE = 500
+
+
+def normalize_name(name) -> str:
+    if not name:
+        return ""
+    return _SPACES_RE.sub(" ", unicodedata.normalize("NFKC", str(name))).strip().casefold()
+
+
+def _price(value) -> str:
+    if value is None or value == "":
+        return ""
+    try:
+        return str(Decimal(str(value)).quantize(CENT))
+    except InvalidOperation:
+        return str(value)
+
+
+def _date(value) -> str:
+    if not value:
+        return ""
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+def compute(user_id, ip_id, name, purchase_date, price, character_ids: Iterable) -> str:
+    raw = "\x1f".join([
+        str(user_id or ""),
+        str(ip_id or ""),
+        normalize_name(name),
+        _date(purchase_date),
+        _price(price),
+        ",".join(str(character_id) for character_id in sorted(set(character_ids))),
+    ])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def of_instance(goods, character_ids: Iterable) -> str:
+    return compute(
+        goods.user_id, goods.ip_id, goods.name, goods.purchase_date, goods.price, character_ids
+    )
+
+
+def _chunks(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def refresh(goods_ids: Iterable) -> int:
+    """重新计算指定谷子的指纹（每批一次读取谷子行与角色关联），只写回变化的行，返回写入条数。"""
+    updated = 0
+    for batch in _chunks(list(dict.fromkeys(goods_ids))):
+        characters = defaultdict(set)
+        through = Goods.characters.through.objects.filter(goods_id__in=batch)
+        for goods_id, character_id in through.values_list("goods_id", "character_id"):
+            characters[goods_id].add(character_id)
+        changed = []
+        for goods_id, stored, *values in Goods.objects.filter(id__in=batch).values_list(
+            "id", "duplicate_fingerprint", *FIELDS
+        ):
+            value = compute(*values, characters[goods_id])
+            if value != stored:
+                changed.append(Goods(id=goods_id, duplicate_fingerprint=value))
+        if changed:
+            Goods.objects.bulk_update(changed, ["duplicate_fingerprint"])
+            updated += len(changed)
+    return updated
+
+
+def rebuild() -> int:
+    """全量重算，返回写入条数。"""
+    return refresh(Goods.objects.order_by("id").values_list("id", flat=True))
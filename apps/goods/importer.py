@@ -0,0 +1,441 @@
+"""
+谷子批量导入（POST /api/goods/import/ 与 manage.py import_goods）。
+
+逐条 POST /api/goods/ 时每件谷子都要做一次重复检测、一次 Min("order") 聚合、一次序列化器保存与
+characters.set()，迁移整张表格时开销与行数成正比。批量导入改为：
+
+1. 解析 CSV / NDJSON（列与 /api/goods/export/ 一致，导出文件可直接导回），逐行校验标量字段；
+2. IP / 角色 / 品类 / 主题 / 收纳位置按名称（或 ID）批量解析，每类一次查询（分批）；
+3. 重复检测（与新建接口相同的重复指纹，见 fingerprint.py；草稿不检测）按指纹批量做索引查找，
+   文件内的重复行同样识别；
+4. 一次聚合取得当前最小 order，为新谷子按文件顺序分配稀疏排序值（排在最前，保持文件顺序）；
+5. 谷子与角色关联分批 bulk_create；bulk_create 不触发信号，搜索文档、分组最近活动、统计汇总、
+   数据版本号在同一事务内按批维护（列表卡片在首次读取时按需构建），近邻表在事务提交后由后台任务刷新。
+
+每行的结果（错误、重复及其处理方式）汇总在报告中返回；有错误的行不影响其他行导入。
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.location.models import StorageNode
+from core import versions
+
+from . import fingerprint, neighbors, recency, rollups, search
+from .export import CSV_LIST_SEPARATOR, FORMAT_CSV, FORMAT_NDJSON
+from .models import Category, Character, Goods, GoodsGroupRecency, IP, Theme
+
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+# 重复行的处理：skip 跳过并报告；new 仍然新建；merge 候选唯一时把数量累加到已有谷子（多个候选时跳过）
+ON_DUPLICATE_SKIP = "skip"
+ON_DUPLICATE_NEW = "new"
+ON_DUPLICATE_MERGE = "merge"
+ON_DUPLICATE_CHOICES = (ON_DUPLICATE_SKIP, ON_DUPLICATE_NEW, ON_DUPLICATE_MERGE)
+
+# 与 GoodsViewSet.ORDER_STEP 一致
+ORDER_STEP = 1000
+
+BATCH_SIZE = 500
+
+# 标量列：与 GoodsDetailSerializer 的模型字段校验一致；字段实例复用，不为每行构造序列化器
+SCALAR_FIELDS = {
+    "name": serializers.CharField(max_length=200),
+    "quantity": serializers.IntegerField(min_value=0, max_value=2147483647),
+    "price": serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True),
+    "purchase_date": serializers.DateField(allow_null=True),
+    "is_official": serializers.BooleanField(),
+    "status": serializers.ChoiceField(choices=Goods.STATUS_CHOICES),
+    "notes": serializers.CharField(allow_blank=True, allow_null=True, trim_whitespace=False),
+}
+DEFAULTS = {
+    "quantity": 1,
+    "price": None,
+    "purchase_date": None,
+    "is_official": True,
+    "status": "in_cabinet",
+    "notes": None,
+}
+
+# 外键列：(名称列, ID 列)；两者都有时以名称为准（导出文件可导入到其他实例，ID 不一定对应）
+REFERENCES = {
+    "ip": ("ip", "ip_id"),
+    "category": ("category", "category_id"),
+    "theme": ("theme", "theme_id"),
+    "location": ("location", "location_id"),
+}
+REQUIRED_REFERENCES = ("ip", "category")
+
+
+def _chunks(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ---------------------------------------------------------------------------
+# 解析
+# ---------------------------------------------------------------------------
+
+def _csv_records(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for number, raw in enumerate(reader, start=1):
+        record = {key: value for key, value in raw.items() if key and value not in (None, "")}
+        for column in ("characters", "character_ids"):
+            if column in record:
+                record[column] = [part.strip() for part in record[column].split(CSV_LIST_SEPARATOR) if part.strip()]
+        yield number, record, None
+
+
+def _ndjson_records(stream):
+    number = 0
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig"):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, {"non_field_errors": ["不是有效的 JSON"]}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {"non_field_errors": ["每行应为一个 JSON 对象"]}
+            continue
+        yield number, {key: value for key, value in record.items() if value not in (None, "")}, None
+
+
+def read_records(stream, import_format: str):
+    """
+    逐行产出 (行号, 记录, 解析错误)，两者之一为 None；stream 为二进制文件对象，
+    行号从 1 开始（不含 CSV 表头与 NDJSON 空行）。
+    """
+    if import_format == FORMAT_NDJSON:
+        return _ndjson_records(stream)
+    return _csv_records(stream)
+
+
+def _reference(record: dict, name_column: str, id_column: str):
+    """外键引用：("name", 名称) / ("id", ID) / None。"""
+    if name_column in record:
+        return "name", str(record[name_column]).strip()
+    if id_column in record:
+        return "id", record[id_column]
+    return None
+
+
+def _character_references(record: dict) -> list:
+    """角色列表：名称（CSV 的 characters 列 / NDJSON 的字符串或 {"id", "name"}）优先，其次 character_ids。"""
+    references = []
+    for entry in record.get("characters") or []:
+        if isinstance(entry, dict):
+            if entry.get("name"):
+                references.append(("name", str(entry["name"]).strip()))
+            elif entry.get("id") is not None:
+                references.append(("id", entry["id"]))
+        else:
+            references.append(("name", str(entry).strip()))
+    if not references:
+        references = [("id", value) for value in record.get("character_ids") or []]
+    return references
+
+
+# ---------------------------------------------------------------------------
+# 批量解析名称
+# ---------------------------------------------------------------------------
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Lookup:
+    """一类对象的名称 / ID 解析：名称可以对应多个对象（同名品类、同名角色），由调用方消歧。"""
+
+    def __init__(self):
+        self.by_name = defaultdict(list)
+        self.by_id = {}
+
+    def add(self, obj, *names):
+        self.by_id[obj.pk] = obj
+        for name in dict.fromkeys(names):
+            if name:
+                self.by_name[name].append(obj)
+
+    def resolve(self, reference, prefer=None):
+        """返回 (对象, 错误信息)。prefer 用于在同名对象中优先选择（如 IP 下的角色）。"""
+        kind, value = reference
+        if kind == "id":
+            obj = self.by_id.get(_as_id(value))
+            return (obj, None) if obj is not None else (None, f"ID {value} 不存在")
+        candidates = self.by_name.get(value, [])
+        if prefer is not None and len(candidates) > 1:
+            candidates = [obj for obj in candidates if prefer(obj)] or candidates
+        if len(candidates) == 1:
+            return candidates[0], None
+        if not candidates:
+            return None, f"「{value}」不存在"
+        return None, f"「{value}」对应多个对象，请改用 ID"
+
+
+def _load(queryset, name_fields: tuple, references) -> _Lookup:
+    lookup = _Lookup()
+    names = sorted({value for kind, value in references if kind == "name"})
+    ids = sorted({_as_id(value) for kind, value in references if kind == "id"} - {None})
+    seen = set()
+    conditions = [Q(pk__in=batch) for batch in _chunks(ids)]
+    for batch in _chunks(names):
+        condition = Q()
+        for field in name_fields:
+            condition |= Q(**{f"{field}__in": batch})
+        conditions.append(condition)
+    for condition in conditions:
+        for obj in queryset.filter(condition):
+            if obj.pk not in seen:
+                seen.add(obj.pk)
+                lookup.add(obj, *(getattr(obj, field) for field in name_fields))
+    return lookup
+
+
+# ---------------------------------------------------------------------------
+# 导入
+# ---------------------------------------------------------------------------
+
+class _Row:
+    __slots__ = ("number", "values", "references", "character_references", "goods", "character_ids")
+
+    def __init__(self, number, values, references, character_references):
+        self.number = number
+        self.values = values
+        self.references = references
+        self.character_references = character_references
+        self.goods = None
+        self.character_ids = []
+
+
+
+def _validate(number: int, record: dict):
+    """标量字段校验，返回 (_Row, None) 或 (None, 错误字典)。"""
+    values, errors = {}, {}
+    for name, field in SCALAR_FIELDS.items():
+        if name not in record:
+            if name in DEFAULTS:
+                values[name] = DEFAULTS[name]
+            else:
+                errors[name] = ["该字段是必填项。"]
+            continue
+        try:
+            values[name] = field.run_validation(record[name])
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+    if errors:
+        return None, errors
+    references = {name: _reference(record, *columns) for name, columns in REFERENCES.items()}
+    return _Row(number, values, references, _character_references(record)), None
+
+
+def _resolve(rows: list, owner) -> dict:
+    """批量解析各行的外键与角色，写入 row.goods / row.character_ids；返回 {行号: 错误字典}。"""
+    def collect(name):
+        return [row.references[name] for row in rows if row.references[name] is not None]
+
+    lookups = {
+        "ip": _load(IP.objects.all(), ("name",), collect("ip")),
+        "category": _load(Category.objects.all(), ("path_name", "name"), collect("category")),
+        "theme": _load(Theme.objects.filter(user=owner), ("name",), collect("theme")),
+        "location": _load(StorageNode.objects.filter(user=owner), ("path_name", "name"), collect("location")),
+    }
+    characters = _load(
+        Character.objects.all(),
+        ("name",),
+        [reference for row in rows for reference in row.character_references],
+    )
+
+    errors = {}
+    for row in rows:
+        row_errors = {}
+        related = {}
+        for name, lookup in lookups.items():
+            reference = row.references[name]
+            if reference is None:
+                if name in REQUIRED_REFERENCES:
+                    row_errors[name] = ["创建时必填"]
+                related[name] = None
+                continue
+            related[name], message = lookup.resolve(reference)
+            if message:
+                row_errors[name] = [message]
+        ip = related["ip"]
+        character_ids = []
+        for reference in row.character_references:
+            # 同名角色优先取本行 IP 下的角色
+            character, message = characters.resolve(
+                reference, prefer=lambda obj: ip is not None and obj.ip_id == ip.pk
+            )
+            if message:
+                row_errors.setdefault("characters", []).append(message)
+            elif character.pk not in character_ids:
+                character_ids.append(character.pk)
+        if not character_ids and "characters" not in row_errors and row.values["status"] != "draft":
+            row_errors["characters"] = ["至少需要关联一个角色"]
+        if row_errors:
+            errors[row.number] = row_errors
+            continue
+        row.goods = Goods(user=owner, **related, **row.values)
+        row.character_ids = character_ids
+        # bulk_create 不触发信号，指纹直接随行写入
+        row.goods.duplicate_fingerprint = fingerprint.of_instance(row.goods, character_ids)
+    return errors
+
+
+def _existing_duplicates(rows: list, owner) -> dict:
+    """已有谷子中与导入行重复的候选：{指纹: [谷子, ...]}（按指纹分批做索引查找）。"""
+    candidates = defaultdict(list)
+    for batch in _chunks(sorted({row.goods.duplicate_fingerprint for row in rows})):
+        for goods in Goods.objects.filter(user=owner, duplicate_fingerprint__in=batch).only(
+            "id", "duplicate_fingerprint", "quantity"
+        ):
+            candidates[goods.duplicate_fingerprint].append(goods)
+    return candidates
+
+
+def import_records(records, owner, on_duplicate: str = ON_DUPLICATE_SKIP, dry_run: bool = False) -> dict:
+    """
+    导入 read_records() 产出的记录，归属 owner。返回报告：
+
+    {"total", "created", "merged", "skipped", "failed", "dry_run",
+     "errors": [{"row", "errors"}], "duplicates": [{"row", "name", "action", "candidates", "duplicate_of_row"}]}
+    """
+    errors = {}
+    rows = []
+    total = 0
+    for number, record, parse_errors in records:
+        total += 1
+        if parse_errors is not None:
+            errors[number] = parse_errors
+            continue
+        row, row_errors = _validate(number, record)
+        if row_errors:
+            errors[number] = row_errors
+        else:
+            rows.append(row)
+
+    errors.update(_resolve(rows, owner))
+    rows = [row for row in rows if row.goods is not None]
+
+    # 重复检测：已有谷子 + 文件内先出现的行；草稿不检测（与新建接口一致）
+    existing = _existing_duplicates(rows, owner) if rows else {}
+    seen = {}
+    to_create, merges, duplicates = [], defaultdict(int), []
+    for row in rows:
+        if row.values["status"] == "draft":
+            to_create.append(row)
+            continue
+        key = row.goods.duplicate_fingerprint
+        earlier = seen.get(key)
+        candidates = existing.get(key, [])
+        if earlier is None and not candidates:
+            seen[key] = row
+            to_create.append(row)
+            continue
+        report = {
+            "row": row.number,
+            "name": row.goods.name,
+            "candidates": [str(goods.pk) for goods in candidates],
+            "duplicate_of_row": earlier.number if earlier is not None else None,
+        }
+        if on_duplicate == ON_DUPLICATE_NEW:
+            report["action"] = "created"
+            to_create.append(row)
+        elif on_duplicate == ON_DUPLICATE_MERGE and earlier is not None and not candidates:
+            # 与文件内先出现的行合并：直接累加到待新建的谷子上
+            report["action"] = "merged"
+            earlier.goods.quantity += row.goods.quantity
+        elif on_duplicate == ON_DUPLICATE_MERGE and len(candidates) == 1:
+            report["action"] = "merged"
+            merges[candidates[0]] += row.goods.quantity
+        else:
+            report["action"] = "skipped"
+        duplicates.append(report)
+
+    if not dry_run:
+        with transaction.atomic():
+            _write(to_create, merges, owner)
+
+    return {
+        "dry_run": dry_run,
+        "total": total,
+        "created": len(to_create),
+        "merged": sum(1 for report in duplicates if report["action"] == "merged"),
+        "skipped": sum(1 for report in duplicates if report["action"] == "skipped"),
+        "failed": len(errors),
+        "errors": [{"row": number, "errors": errors[number]} for number in sorted(errors)],
+        "duplicates": duplicates,
+    }
+
+
+def _write(rows: list, merges: dict, owner) -> None:
+    if rows:
+        # 新谷子排在最前并保持文件顺序：第一行取最小的排序值
+        min_order = Goods.objects.filter(user=owner).aggregate(min_order=Min("order"))["min_order"] or 0
+        for index, row in enumerate(rows):
+            row.goods.order = min_order - ORDER_STEP * (len(rows) - index)
+        goods_list = [row.goods for row in rows]
+        Goods.objects.bulk_create(goods_list, batch_size=BATCH_SIZE)
+        Through = Goods.characters.through
+        Through.objects.bulk_create(
+            [
+                Through(goods_id=row.goods.pk, character_id=character_id)
+                for row in rows
+                for character_id in row.character_ids
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        _sync_created(rows, owner)
+
+    if merges:
+        before = {}
+        for batch in _chunks([goods.pk for goods in merges]):
+            before.update(rollups.snapshots(batch))
+        # 按增量分组逐批 UPDATE（增量种类很少），比 bulk_update 的逐行 CASE 表达式快得多
+        by_increment = defaultdict(list)
+        for goods, quantity in merges.items():
+            by_increment[quantity].append(goods.pk)
+        now = timezone.now()
+        for quantity, goods_ids in by_increment.items():
+            for batch in _chunks(goods_ids):
+                Goods.objects.filter(pk__in=batch).update(quantity=F("quantity") + quantity, updated_at=now)
+        for batch in _chunks(list(before)):
+            rollups.commit({goods_id: before[goods_id] for goods_id in batch})
+
+    if rows or merges:
+        versions.bump_user(owner.id)
+
+
+def _sync_created(rows: list, owner) -> None:
+    """bulk_create 不触发信号：按批维护搜索文档 / 拼音键、分组最近活动、统计汇总（均由内存中的对象计算），并调度近邻表刷新。"""
+    goods_ids = [row.goods.pk for row in rows]
+    search.reindex_goods(goods_ids)
+    search.reindex_goods_keys(goods_ids)
+
+    keys = set()
+    delta = rollups.Delta()
+    for row in rows:
+        keys |= recency.instance_keys(row.goods)
+        keys |= {
+            (owner.id, GoodsGroupRecency.DIMENSION_CHARACTER, character_id)
+            for character_id in row.character_ids
+        }
+        # row.goods.ip 已是解析得到的 IP 对象，快照不再查询作品类型
+        delta.add(rollups.instance_snapshot(row.goods, set(row.character_ids)))
+    recency.refresh(keys)
+    delta.apply()
+    neighbors.schedule(goods_ids)
@@ -0,0 +1,87 @@
+"""
+谷子相关序列化器方法字段使用的批量加载器（见 core/loaders.py）。
+每个加载器一次查询解析一批键，结果在同一请求内复用。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from apps.location.models import StorageNode
+from apps.users.models import User
+from core.loaders import BatchLoader
+
+from .models import Character, Goods, ShowcaseGoods
+
+# 展柜列表预览图数量
+PREVIEW_PHOTO_COUNT = 4
+
+
+class CharacterCountLoader(BatchLoader):
+    """IP ID -> 该 IP 下的角色数量"""
+
+    default = 0
+
+    def batch_load(self, keys):
+        return dict(
+            Character.objects.filter(ip_id__in=keys)
+            .values("ip_id")
+            .annotate(total=Count("id"))
+            .values_list("ip_id", "total")
+        )
+
+
+class LocationPathLoader(BatchLoader):
+    """收纳节点 ID -> 完整路径（未生成路径时退化为节点名称）"""
+
+    def batch_load(self, keys):
+        return {
+            node_id: path_name or name
+            for node_id, path_name, name in StorageNode.objects.filter(id__in=keys).values_list(
+                "id", "path_name", "name"
+            )
+        }
+
+
+class UserSummaryLoader(BatchLoader):
+    """用户 ID -> {"id", "username"}"""
+
+    def batch_load(self, keys):
+        return {
+            user_id: {"id": user_id, "username": username}
+            for user_id, username in User.objects.filter(id__in=keys).values_list("id", "username")
+        }
+
+
+class PreviewPhotoLoader(BatchLoader):
+    """展柜 ID -> 前 PREVIEW_PHOTO_COUNT 个展柜谷子的主图文件名（按展柜内排序，无主图的跳过）"""
+
+    def missing(self, key):
+        return []
+
+    def batch_load(self, keys):
+        ordering = [
+            F(field[1:]).desc() if field.startswith("-") else F(field).asc()
+            for field in ShowcaseGoods._meta.ordering
+        ]
+        rows = (
+            ShowcaseGoods.objects.filter(showcase_id__in=keys)
+            .annotate(
+                position=Window(RowNumber(), partition_by=F("showcase_id"), order_by=ordering)
+            )
+            .filter(position__lte=PREVIEW_PHOTO_COUNT)
+            .order_by("showcase_id", "position")
+            .values_list("showcase_id", "goods__main_photo")
+        )
+        result = defaultdict(list)
+        for showcase_id, photo in rows:
+            if photo:
+                result[showcase_id].append(photo)
+        return result
+
+
+def main_photo_url(name: str):
+    """与 Goods.main_photo.url 一致的地址（使用字段配置的存储）。"""
+    return Goods._meta.get_field("main_photo").storage.url(name)
@@ -0,0 +1,101 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework import filters as drf_filters
+from rest_framework.request import Request
+
+from apps.goods import search
+from apps.goods.models import Character, Goods, IP
+from apps.goods.views import GoodsViewSet
+
+
+class Command(BaseCommand):
+    """
+    对比谷子 ?search= 的两条路径：
+
+    - legacy：DRF SearchFilter，在 name / ip__name / ip__keywords__value / characters__name 上做
+      icontains OR，多值 JOIN 后需 distinct；
+    - index：GoodsSearchFilter，走 GoodsSearchDocument / FTS5。
+
+    每个查询分别计时「COUNT + 取第一页」（与列表页码分页一致），输出中位数并校验两边结果集一致。
+    未指定 --query 时从现有 IP / 角色 / 谷子名中取样。
+    """
+
+    help = "Benchmark goods search: SearchFilter icontains vs. the full-text index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--query",
+            action="append",
+            dest="queries",
+            default=None,
+            help="要测试的搜索词，可重复指定；默认从现有数据取样",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="每个查询重复次数，默认 20")
+        parser.add_argument("--page-size", type=int, default=18, help="第一页大小，默认 18")
+        parser.add_argument("--user", type=int, default=None, help="只在指定用户 ID 的谷子中检索")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        page_size = max(1, options["page_size"])
+
+        base_qs = Goods.objects.all()
+        if options["user"] is not None:
+            base_qs = base_qs.filter(user_id=options["user"])
+
+        queries = options["queries"] or self._sample_queries()
+        if not queries:
+            self.stderr.write(self.style.ERROR("没有可用的搜索词，请通过 --query 指定"))
+            return
+
+        backend = "FTS5" if search.fts_available() else "文档表 icontains"
+        self.stdout.write(
+            f"谷子 {base_qs.count()} 条，索引后端 {backend}，每个查询重复 {repeat} 次（单位 ms）"
+        )
+        self.stdout.write(f"{'query':<20}{'hits':>8}{'legacy':>12}{'index':>12}{'speedup':>10}")
+
+        legacy_view = SimpleNamespace(search_fields=GoodsViewSet.search_fields)
+        factory = RequestFactory()
+        for query in queries:
+            request = Request(factory.get("/api/goods/", {"search": query}))
+            legacy_qs = drf_filters.SearchFilter().filter_queryset(request, base_qs, legacy_view)
+            index_qs = search.GoodsSearchFilter().filter_queryset(
+                request, base_qs, SimpleNamespace(action="list")
+            )
+
+            legacy_ids = set(legacy_qs.values_list("id", flat=True))
+            index_ids = set(index_qs.values_list("id", flat=True))
+            if legacy_ids != index_ids:
+                self.stderr.write(
+                    self.style.WARNING(
+                        f"{query!r}: 结果不一致 legacy={len(legacy_ids)} index={len(index_ids)}"
+                    )
+                )
+
+            legacy_ms = self._time(legacy_qs, page_size, repeat)
+            index_ms = self._time(index_qs, page_size, repeat)
+            speedup = legacy_ms / index_ms if index_ms else float("inf")
+            self.stdout.write(
+                f"{query:<20}{len(index_ids):>8}{legacy_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x"
+            )
+
+    @staticmethod
+    def _time(queryset, page_size, repeat) -> float:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset.values_list("id", flat=True)[:page_size])
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
+
+    @staticmethod
+    def _sample_queries() -> list:
+        queries = []
+        queries += list(IP.objects.order_by("?").values_list("name", flat=True)[:2])
+        queries += list(Character.objects.order_by("?").values_list("name", flat=True)[:2])
+        queries += list(Goods.objects.order_by("?").values_list("name", flat=True)[:1])
+        return [q for q in dict.fromkeys(queries) if q]
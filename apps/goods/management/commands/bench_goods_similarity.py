@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.goods import similarity_engine
+from apps.goods.models import Category, Character, Goods, IP, Theme
+from apps.goods.similarity import GoodsSimilarityCalculator, SeedSelector
+from apps.users.models import Role, User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    对比相似随机（/api/goods/similar-random/）分组的两种相似度引擎：
+
+    - python：GoodsSimilarityCalculator 逐对计算（种子数 × 谷子数次调用）；
+    - vectorized：一次编码为列数组，NumPy 一次算出全部种子的分数矩阵；
+
+    每种引擎分别测量逐个计算与倒排索引剪枝（+index，见 CandidateIndex）两种方式。
+
+    每个规模在事务中批量生成一个临时用户的谷子，计时后整体回滚，不留下任何数据。
+    计时范围为分组构建（不含读取谷子），输出各方式的耗时中位数，并校验分组结果全部一致。
+    """
+
+    help = "Benchmark goods similarity engines (pairwise Python vs. vectorized NumPy) on synthetic data."
+
+    VARIANTS = (
+        (similarity_engine.ENGINE_PYTHON, False),
+        (similarity_engine.ENGINE_PYTHON, True),
+        (similarity_engine.ENGINE_VECTORIZED, False),
+        (similarity_engine.ENGINE_VECTORIZED, True),
+    )
+    LABELS = ["python", "python+index", "vectorized", "vectorized+index"]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 5000, 10000],
+            help="谷子数量规模，默认 1000 5000 10000",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="每种引擎重复次数，默认 3")
+        parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+
+    def handle(self, *args, **options):
+        if not similarity_engine.numpy_available():
+            raise CommandError("未安装 numpy，无法运行向量化引擎")
+        repeat = max(1, options["repeat"])
+        self.stdout.write(f"每种方式重复 {repeat} 次（单位 ms，括号内为相对 python 的加速比）")
+        self.stdout.write("".join(f"{label:>18}" if label else f"{'goods':>8}" for label in ["", *self.LABELS]))
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self._bench(size, repeat, options)
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _bench(self, size, repeat, options):
+        rng = random.Random(options["seed"])
+        user = self._populate(size, rng)
+        goods_list = list(
+            Goods.objects.filter(user=user)
+            .select_related("ip", "category", "theme")
+            .prefetch_related("characters")
+        )
+        calculator = GoodsSimilarityCalculator()
+        calculator.prime_category_cache({good.category_id for good in goods_list})
+
+        timings, results = [], []
+        for name, blocking in self.VARIANTS:
+            samples = []
+            for _ in range(repeat):
+                random.seed(options["seed"])
+                seeds = SeedSelector().select_seeds(goods_list)
+                builder = similarity_engine.group_builder(calculator, engine_name=name, blocking=blocking)
+                started = time.perf_counter()
+                groups = builder.build_groups(seeds, goods_list)
+                samples.append((time.perf_counter() - started) * 1000)
+            timings.append(statistics.median(samples))
+            results.append([[good.id for good in group] for group in groups])
+
+        if any(groups != results[0] for groups in results[1:]):
+            self.stderr.write(self.style.WARNING(f"{size}: 分组结果不一致"))
+        baseline = timings[0]
+        self.stdout.write(f"{size:>8}" + "".join(
+            f"{ms:>10.1f} ({baseline / ms if ms else float('inf'):>4.0f}x)" for ms in timings
+        ))
+
+    @staticmethod
+    def _populate(size, rng):
+        role = Role.objects.create(name="bench_goods_similarity")
+        user = User.objects.create(username=f"bench_goods_similarity_{size}", password="!", role=role)
+        roots = [Category.objects.create(name=f"bench-root-{i}") for i in range(3)]
+        parents = [Category.objects.create(name=f"bench-parent-{i}", parent=rng.choice(roots)) for i in range(6)]
+        categories = roots + parents + [
+            Category.objects.create(name=f"bench-leaf-{i}", parent=rng.choice(parents)) for i in range(12)
+        ]
+        ips = [IP.objects.create(name=f"bench-ip-{size}-{i}", subject_type=rng.choice([1, 2, 3, 4, 6, None])) for i in range(30)]
+        characters = [Character.objects.create(ip=rng.choice(ips), name=f"bench-char-{i}") for i in range(150)]
+        themes = [Theme.objects.create(user=user, name=f"bench-theme-{i}") for i in range(8)]
+        start = date(2020, 1, 1)
+
+        goods = [
+            Goods(
+                user=user,
+                name=f"bench-goods-{i}",
+                ip=rng.choice(ips),
+                category=rng.choice(categories),
+                theme=rng.choice(themes) if rng.random() < 0.4 else None,
+                price=Decimal(rng.randint(100, 30000)).scaleb(-2) if rng.random() < 0.8 else None,
+                purchase_date=start + timedelta(days=rng.randint(0, 1800)) if rng.random() < 0.9 else None,
+            )
+            for i in range(size)
+        ]
+        Goods.objects.bulk_create(goods, batch_size=2000)
+        Through = Goods.characters.through
+        links = {
+            (item.pk, character.pk)
+            for item in goods
+            for character in rng.sample(characters, rng.randint(0, 3))
+        }
+        Through.objects.bulk_create(
+            [Through(goods_id=goods_id, character_id=character_id) for goods_id, character_id in links],
+            batch_size=5000,
+        )
+        return user
@@ -0,0 +1,76 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.goods import importer
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    """
+    从 CSV / NDJSON 文件批量导入谷子（与 POST /api/goods/import/ 相同的逻辑，见 apps/goods/importer.py）。
+
+    名称批量解析、一次分配排序值、分批 bulk_create，适合从表格迁移整份收藏；
+    输出导入汇总与逐行的错误 / 重复报告。
+    """
+
+    help = "Bulk import goods for a user from a CSV or NDJSON file (same columns as the export endpoint)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV / NDJSON 文件路径")
+        parser.add_argument("--user", required=True, help="归属用户（用户名或用户 ID）")
+        parser.add_argument(
+            "--format",
+            choices=importer.FORMATS,
+            help="文件格式，默认按扩展名判断（.ndjson / .jsonl 为 NDJSON，其余为 CSV）",
+        )
+        parser.add_argument(
+            "--on-duplicate",
+            choices=importer.ON_DUPLICATE_CHOICES,
+            default=importer.ON_DUPLICATE_SKIP,
+            help="重复行的处理方式，默认 skip",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="只校验并输出报告，不写入")
+        parser.add_argument("--report", help="把完整报告（JSON）写入该文件")
+
+    def handle(self, *args, **options):
+        user_ref = options["user"]
+        owner = User.objects.filter(username=user_ref).first()
+        if owner is None and user_ref.isdigit():
+            owner = User.objects.filter(pk=int(user_ref)).first()
+        if owner is None:
+            raise CommandError(f"用户不存在：{user_ref}")
+
+        path = options["path"]
+        import_format = options["format"] or (
+            importer.FORMAT_NDJSON if path.lower().endswith((".ndjson", ".jsonl")) else importer.FORMAT_CSV
+        )
+        try:
+            with open(path, "rb") as stream:
+                report = importer.import_records(
+                    importer.read_records(stream, import_format),
+                    owner,
+                    options["on_duplicate"],
+                    options["dry_run"],
+                )
+        except OSError as exc:
+            raise CommandError(f"无法读取文件：{exc}")
+        except (UnicodeDecodeError, csv.Error):
+            raise CommandError("无法解析文件，请确认为 UTF-8 编码的 CSV / NDJSON")
+
+        for item in report["errors"]:
+            self.stderr.write(f"第 {item['row']} 行：{json.dumps(item['errors'], ensure_ascii=False)}")
+        for item in report["duplicates"]:
+            self.stdout.write(f"第 {item['row']} 行「{item['name']}」重复：{item['action']}")
+        if options["report"]:
+            with open(options["report"], "w", encoding="utf-8") as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+        prefix = "[dry-run] " if report["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}共 {report['total']} 行：新建 {report['created']}，合并 {report['merged']}，"
+                f"跳过 {report['skipped']}，失败 {report['failed']}"
+            )
+        )
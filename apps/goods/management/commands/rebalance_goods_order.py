@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from apps.goods.models import Goods
+from core import versions
 
 
 class Command(BaseCommand):
@@ -42,6 +43,7 @@ class Command(BaseCommand):
 
         updated = 0
         batch = []
+        touched_users = set()
 
         with transaction.atomic():
             for idx, obj in enumerate(qs.iterator()):
@@ -49,6 +51,7 @@ class Command(BaseCommand):
                 if obj.order != new_order:
                     obj.order = new_order
                     batch.append(obj)
+                    touched_users.add(obj.user_id)
 
                 if len(batch) >= batch_size:
                     Goods.objects.bulk_update(batch, ["order"])
@@ -59,4 +62,7 @@ class Command(BaseCommand):
                 Goods.objects.bulk_update(batch, ["order"])
                 updated += len(batch)
 
+            # bulk_update 不触发信号，手动递增受影响用户的数据版本号
+            versions.bump_user(*touched_users)
+
         self.stdout.write(self.style.SUCCESS(f"重排完成，共更新 {updated}/{total} 条记录"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.goods import cards
+
+
+class Command(BaseCommand):
+    """
+    全量重建谷子列表卡片（GoodsCard）。
+
+    卡片在列表读取时按需构建、随关联数据变化自动失效，一般无需手动执行；
+    用于上线后预热、修改卡片格式后批量刷新，或通过 SQL 直接改动关联表后的兜底。
+    """
+
+    help = "Rebuild the prebuilt goods list cards."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="每批构建的谷子数量，默认 500",
+        )
+
+    def handle(self, *args, **options):
+        batch_size: int = options["batch_size"]
+        if batch_size <= 0:
+            self.stderr.write(self.style.ERROR("batch-size 必须为正整数"))
+            return
+
+        self.stdout.write("准备重建谷子列表卡片 ...")
+        with transaction.atomic():
+            written = cards.rebuild_all(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"重建完成，共写入 {written} 张卡片"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.goods import fingerprint
+
+
+class Command(BaseCommand):
+    """
+    全量重算谷子的重复检测指纹（Goods.duplicate_fingerprint），供新建 / 导入时的重复检测使用。
+
+    指纹随谷子保存、角色增删与角色删除自动维护，一般无需手动执行；
+    用于通过 SQL / bulk_update 直接改动谷子或角色关联后的兜底。
+    """
+
+    help = "Recompute Goods.duplicate_fingerprint used by create-time duplicate detection."
+
+    def handle(self, *args, **options):
+        self.stdout.write("准备重算谷子重复检测指纹 ...")
+        with transaction.atomic():
+            written = fingerprint.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"重算完成，共更新 {written} 件谷子"))
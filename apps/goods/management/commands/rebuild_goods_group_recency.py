@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.goods import recency
+
+
+class Command(BaseCommand):
+    """
+    全量重建分组最近活动表（GoodsGroupRecency），供 ?group_by= 列表排序使用。
+
+    该表随谷子新建 / 删除 / 修改分组字段 / 增删角色自动维护，一般无需手动执行；
+    用于通过 SQL 直接改动谷子或角色关联后的兜底。
+    """
+
+    help = "Rebuild the per-user group recency table used by goods ?group_by= listing."
+
+    def handle(self, *args, **options):
+        self.stdout.write("准备重建分组最近活动表 ...")
+        with transaction.atomic():
+            written = recency.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"重建完成，共写入 {written} 行"))
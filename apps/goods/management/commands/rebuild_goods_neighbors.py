@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.goods import neighbors
+
+
+class Command(BaseCommand):
+    """
+    全量重建谷子近邻表（GoodsNeighbor），供 /api/goods/{id}/similar/ 使用。
+
+    该表随谷子的 IP、角色、品类、主题、单价、入手日期变化、新建 / 删除，以及品类移动、IP 作品类型变化
+    在事务提交后由后台任务增量维护；修改 GOODS_SIMILAR_NEIGHBORS、通过 SQL 或 bulk_update 直接改动谷子后需要手动执行，
+    升级到包含近邻表的版本后也需执行一次。
+    """
+
+    help = "Rebuild the per-goods nearest-neighbour table used by the goods similar endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild neighbours for this user's goods (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get("user_ids")
+        scope = f"用户 {', '.join(map(str, user_ids))}" if user_ids else "全部用户"
+        self.stdout.write(f"准备重建谷子近邻表（{scope}，每件 {neighbors.neighbor_count()} 个近邻）...")
+        written = neighbors.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"重建完成，共重算 {written} 件谷子"))
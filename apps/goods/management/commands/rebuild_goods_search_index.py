@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.goods import search
+from apps.goods import textkeys
+from apps.goods.models import GoodsSearchDocument
+
+
+class Command(BaseCommand):
+    """
+    重建谷子搜索文档（GoodsSearchDocument）、FTS5 索引（goods_search_fts）以及
+    IP / 角色 / 谷子的归一化搜索键（SearchKey）。
+
+    正常情况下它们随谷子 / IP / 关键词 / 角色的变化自动维护；安装 pypinyin / zhconv 后也需执行一次，
+    以补齐拼音键与繁简折叠；
+    当数据通过 SQL 或 bulk_create 直接导入、或怀疑索引与业务数据不一致时，用本命令全量重建。
+    """
+
+    help = "Rebuild the goods full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=search.BATCH_SIZE,
+            help=f"每批处理的谷子数量，默认 {search.BATCH_SIZE}",
+        )
+
+    def handle(self, *args, **options):
+        batch_size: int = options["batch_size"]
+        if batch_size <= 0:
+            self.stderr.write(self.style.ERROR("batch-size 必须为正整数"))
+            return
+
+        backend = "FTS5" if search.fts_available() else "文档表 icontains（未启用 FTS5）"
+        self.stdout.write(f"准备重建谷子搜索索引，检索后端：{backend} ...")
+        if not textkeys.PINYIN_ENABLED:
+            self.stdout.write(self.style.WARNING("未安装 pypinyin，跳过拼音 / 首字母搜索键"))
+        if not textkeys.FOLDING_ENABLED:
+            self.stdout.write(self.style.WARNING("未安装 zhconv，跳过繁简折叠"))
+
+        with transaction.atomic():
+            written = search.rebuild_index(batch_size=batch_size)
+            keys = search.rebuild_keys()
+        search.optimize_fts()
+
+        total = GoodsSearchDocument.objects.count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"重建完成，共写入 {written} 条搜索文档（当前 {total} 条）、{keys} 条搜索键"
+            )
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.goods import rollups
+
+
+class Command(BaseCommand):
+    """
+    全量重建统计汇总表（GoodsStatsRollup），供无筛选的 /api/goods/stats/ 使用。
+
+    该表随谷子写入、角色关联变化、角色 / 收纳位置删除、IP 作品类型变化自动维护，一般无需手动执行；
+    用于通过 SQL 或 bulk_update 直接改动谷子后的兜底。
+    """
+
+    help = "Rebuild the per-user stats rollup table used by the unfiltered goods stats endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild rollups for this user id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get("user_ids")
+        scope = f"用户 {', '.join(map(str, user_ids))}" if user_ids else "全部用户"
+        self.stdout.write(f"准备重建统计汇总表（{scope}）...")
+        with transaction.atomic():
+            written = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"重建完成，共写入 {written} 行"))
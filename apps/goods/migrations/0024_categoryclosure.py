@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core import closure
+
+
+def populate_closure(apps, schema_editor):
+    """为已有品类一次性构建闭包表"""
+    Category = apps.get_model('goods', 'Category')
+    CategoryClosure = apps.get_model('goods', 'CategoryClosure')
+    nodes = list(Category.objects.values_list('id', 'parent_id'))
+    closure.rebuild(CategoryClosure, nodes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0023_alter_goods_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0, help_text='祖先到后代的层级距离，自身为 0', verbose_name='层级差')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='goods.category', verbose_name='祖先品类')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='goods.category', verbose_name='后代品类')),
+            ],
+            options={
+                'verbose_name': '品类闭包',
+                'verbose_name_plural': '品类闭包',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='goods_catclos_desc_depth')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
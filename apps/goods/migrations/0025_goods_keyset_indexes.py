@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0024_categoryclosure'),
+        ('location', '0006_storagenodeclosure'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['user', 'order', '-created_at', 'id'], name='goods_user_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='goods_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+from collections import defaultdict
+
+import core.fts
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE goods_search_fts USING fts5(
+        name, ip_text, character_text,
+        content='goods_goodssearchdocument', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER goods_search_fts_ai AFTER INSERT ON goods_goodssearchdocument BEGIN
+        INSERT INTO goods_search_fts(rowid, name, ip_text, character_text)
+        VALUES (new.id, new.name, new.ip_text, new.character_text);
+    END
+    """,
+    """
+    CREATE TRIGGER goods_search_fts_ad AFTER DELETE ON goods_goodssearchdocument BEGIN
+        INSERT INTO goods_search_fts(goods_search_fts, rowid, name, ip_text, character_text)
+        VALUES ('delete', old.id, old.name, old.ip_text, old.character_text);
+    END
+    """,
+    """
+    CREATE TRIGGER goods_search_fts_au AFTER UPDATE ON goods_goodssearchdocument BEGIN
+        INSERT INTO goods_search_fts(goods_search_fts, rowid, name, ip_text, character_text)
+        VALUES ('delete', old.id, old.name, old.ip_text, old.character_text);
+        INSERT INTO goods_search_fts(rowid, name, ip_text, character_text)
+        VALUES (new.id, new.name, new.ip_text, new.character_text);
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS goods_search_fts_au",
+    "DROP TRIGGER IF EXISTS goods_search_fts_ad",
+    "DROP TRIGGER IF EXISTS goods_search_fts_ai",
+    "DROP TABLE IF EXISTS goods_search_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    """仅 SQLite 且编译了 FTS5（trigram 需 3.34+）时建表；否则搜索退化为文档表 icontains。"""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(FTS_SQL[0])
+        except Exception:
+            return
+        for sql in FTS_SQL[1:]:
+            cursor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def populate_documents(apps, schema_editor):
+    Goods = apps.get_model("goods", "Goods")
+    IPKeyword = apps.get_model("goods", "IPKeyword")
+    GoodsSearchDocument = apps.get_model("goods", "GoodsSearchDocument")
+
+    ip_text = defaultdict(list)
+    for ip_id, name in apps.get_model("goods", "IP").objects.values_list("id", "name"):
+        ip_text[ip_id].append(name)
+    for ip_id, value in IPKeyword.objects.values_list("ip_id", "value"):
+        ip_text[ip_id].append(value)
+    character_text = defaultdict(list)
+    for goods_id, name in Goods.characters.through.objects.values_list("goods_id", "character__name"):
+        character_text[goods_id].append(name)
+
+    GoodsSearchDocument.objects.bulk_create(
+        [
+            GoodsSearchDocument(
+                goods_id=goods_id,
+                name=name or "",
+                ip_text=" ".join(ip_text[ip_id]),
+                character_text=" ".join(character_text[goods_id]),
+            )
+            for goods_id, name, ip_id in Goods.objects.values_list("id", "name", "ip_id").iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0025_goods_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(blank=True, default='', verbose_name='谷子名称')),
+                ('ip_text', models.TextField(blank=True, default='', help_text='IP 名称与全部关键词，空格分隔', verbose_name='IP文本')),
+                ('character_text', models.TextField(blank=True, default='', help_text='关联角色名，空格分隔', verbose_name='角色文本')),
+                ('goods', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='goods.goods', verbose_name='谷子')),
+            ],
+            options={
+                'verbose_name': '谷子搜索文档',
+                'verbose_name_plural': '谷子搜索文档',
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsSearchIndex',
+            fields=[
+                ('document', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts', serialize=False, to='goods.goodssearchdocument')),
+                ('fulltext', core.fts.FullTextField(db_column='goods_search_fts')),
+                ('rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'goods_search_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
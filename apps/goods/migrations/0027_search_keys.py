@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:14
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.goods import textkeys
+
+
+def populate_search_keys(apps, schema_editor):
+    """生成 IP / 角色 / 谷子的搜索键，并把已有搜索文档折叠为归一化文本（小写、繁转简）。"""
+    IP = apps.get_model("goods", "IP")
+    IPKeyword = apps.get_model("goods", "IPKeyword")
+    Character = apps.get_model("goods", "Character")
+    Goods = apps.get_model("goods", "Goods")
+    SearchKey = apps.get_model("goods", "SearchKey")
+    GoodsSearchDocument = apps.get_model("goods", "GoodsSearchDocument")
+
+    def keys_for(entity, column, texts, raw=True):
+        for object_id, values in texts.items():
+            keys = set()
+            for text in values:
+                keys |= textkeys.search_keys(text, raw=raw)
+            for key in keys:
+                yield SearchKey(entity=entity, key=key, **{column: object_id})
+
+    ip_texts = defaultdict(list)
+    for ip_id, name in IP.objects.values_list("id", "name"):
+        ip_texts[ip_id].append(name)
+    for ip_id, value in IPKeyword.objects.values_list("ip_id", "value"):
+        ip_texts[ip_id].append(value)
+    SearchKey.objects.bulk_create(keys_for("ip", "ip_id", ip_texts), batch_size=500)
+
+    character_texts = {pk: [name] for pk, name in Character.objects.values_list("id", "name")}
+    SearchKey.objects.bulk_create(
+        keys_for("character", "character_id", character_texts), batch_size=500
+    )
+
+    if textkeys.PINYIN_ENABLED:
+        goods_texts = {pk: [name] for pk, name in Goods.objects.values_list("id", "name")}
+        SearchKey.objects.bulk_create(
+            keys_for("goods", "goods_id", goods_texts, raw=False), batch_size=500
+        )
+
+    fields = ("name", "ip_text", "character_text")
+    changed = []
+    for document in GoodsSearchDocument.objects.iterator():
+        folded = {field: textkeys.fold_text(getattr(document, field)) for field in fields}
+        if any(folded[field] != getattr(document, field) for field in fields):
+            for field, value in folded.items():
+                setattr(document, field, value)
+            changed.append(document)
+    GoodsSearchDocument.objects.bulk_update(changed, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0026_goods_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('ip', 'IP作品'), ('character', '角色'), ('goods', '谷子')], max_length=16, verbose_name='对象类型')),
+                ('key', models.CharField(max_length=100, verbose_name='搜索键')),
+                ('character', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_keys', to='goods.character', verbose_name='角色')),
+                ('goods', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_keys', to='goods.goods', verbose_name='谷子')),
+                ('ip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_keys', to='goods.ip', verbose_name='IP作品')),
+            ],
+            options={
+                'verbose_name': '搜索键',
+                'verbose_name_plural': '搜索键',
+                'indexes': [models.Index(fields=['entity', 'key'], name='goods_searchkey_lookup')],
+            },
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+    ]
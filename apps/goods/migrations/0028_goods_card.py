@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0027_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsCard',
+            fields=[
+                ('goods', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='goods.goods', verbose_name='谷子')),
+                ('data', models.JSONField(verbose_name='卡片数据')),
+                ('signature', models.CharField(help_text='构建卡片时的格式版本与 ip / category / theme / location / user 外键', max_length=255, verbose_name='外键快照')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='构建时间')),
+            ],
+            options={
+                'verbose_name': '谷子列表卡片',
+                'verbose_name_plural': '谷子列表卡片',
+            },
+        ),
+    ]
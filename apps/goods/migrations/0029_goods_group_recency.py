@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_recency(apps, schema_editor):
+    """按已有谷子一次性聚合各用户各分组的最近创建时间"""
+    Goods = apps.get_model('goods', 'Goods')
+    GoodsGroupRecency = apps.get_model('goods', 'GoodsGroupRecency')
+    Through = Goods.characters.through
+    sources = [
+        ('ip', Goods.objects.filter(ip_id__isnull=False).values_list('user_id', 'ip_id').annotate(latest=Max('created_at'))),
+        ('category', Goods.objects.filter(category_id__isnull=False).values_list('user_id', 'category_id').annotate(latest=Max('created_at'))),
+        ('theme', Goods.objects.filter(theme_id__isnull=False).values_list('user_id', 'theme_id').annotate(latest=Max('created_at'))),
+        ('character', Through.objects.values_list('goods__user_id', 'character_id').annotate(latest=Max('goods__created_at'))),
+    ]
+    for dimension, rows in sources:
+        GoodsGroupRecency.objects.bulk_create(
+            [
+                GoodsGroupRecency(user_id=user_id, dimension=dimension, dimension_id=object_id, latest_created_at=latest)
+                for user_id, object_id, latest in rows
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0028_goods_card'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsGroupRecency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('ip', 'IP作品'), ('character', '角色'), ('category', '品类'), ('theme', '主题')], max_length=20, verbose_name='分组维度')),
+                ('dimension_id', models.BigIntegerField(verbose_name='分组对象ID')),
+                ('latest_created_at', models.DateTimeField(verbose_name='最新谷子创建时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '分组最近活动',
+                'verbose_name_plural': '分组最近活动',
+                'constraints': [models.UniqueConstraint(fields=('user', 'dimension', 'dimension_id'), name='goods_group_recency_key')],
+            },
+        ),
+        migrations.RunPython(populate_recency, migrations.RunPython.noop),
+    ]
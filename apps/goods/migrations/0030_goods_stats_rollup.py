@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from apps.goods.rollups import SNAPSHOT_FIELDS, Snapshot, aggregate
+
+
+def populate_rollups(apps, schema_editor):
+    """按已有谷子一次性计算各用户的统计汇总（计算逻辑与 rollups.rebuild 共用）"""
+    Goods = apps.get_model('goods', 'Goods')
+    GoodsStatsRollup = apps.get_model('goods', 'GoodsStatsRollup')
+    characters = defaultdict(set)
+    for goods_id, character_id in Goods.characters.through.objects.values_list('goods_id', 'character_id'):
+        characters[goods_id].add(character_id)
+    rows = Goods.objects.values('id', *SNAPSHOT_FIELDS, 'ip__subject_type').iterator()
+    totals = aggregate(
+        Snapshot(row, row.pop('ip__subject_type'), characters[row['id']]) for row in rows
+    )
+    GoodsStatsRollup.objects.bulk_create(
+        [
+            GoodsStatsRollup(
+                user_id=user_id, dimension=dimension, key=key,
+                goods_count=count, quantity_sum=quantity, value_sum=value,
+            )
+            for (user_id, dimension, key), (count, quantity, value) in totals.items()
+            if count > 0
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0029_goods_group_recency'),
+        ('users', '0002_collection_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20, verbose_name='统计维度')),
+                ('key', models.CharField(blank=True, help_text='空字符串表示未填写', max_length=64, verbose_name='维度取值')),
+                ('goods_count', models.BigIntegerField(default=0, verbose_name='谷子数')),
+                ('quantity_sum', models.BigIntegerField(default=0, verbose_name='数量合计')),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='金额合计')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '统计汇总',
+                'verbose_name_plural': '统计汇总',
+                'constraints': [models.UniqueConstraint(fields=('user', 'dimension', 'key'), name='goods_stats_rollup_key')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from apps.goods.fingerprint import FIELDS, compute
+
+
+def populate_fingerprints(apps, schema_editor):
+    """为已有谷子计算重复检测指纹（计算逻辑与 fingerprint.refresh 共用）"""
+    Goods = apps.get_model('goods', 'Goods')
+    characters = defaultdict(set)
+    for goods_id, character_id in Goods.characters.through.objects.values_list('goods_id', 'character_id'):
+        characters[goods_id].add(character_id)
+    batch = []
+    for goods_id, *values in Goods.objects.values_list('id', *FIELDS).iterator():
+        batch.append(Goods(id=goods_id, duplicate_fingerprint=compute(*values, characters[goods_id])))
+        if len(batch) >= 500:
+            Goods.objects.bulk_update(batch, ['duplicate_fingerprint'])
+            batch = []
+    if batch:
+        Goods.objects.bulk_update(batch, ['duplicate_fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0030_goods_stats_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='duplicate_fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=40, verbose_name='重复检测指纹'),
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0031_goods_duplicate_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='名次')),
+                ('score', models.FloatField(verbose_name='相似度分数')),
+                ('goods', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_rows', to='goods.goods', verbose_name='谷子')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_of', to='goods.goods', verbose_name='相似谷子')),
+            ],
+            options={
+                'verbose_name': '谷子近邻',
+                'verbose_name_plural': '谷子近邻',
+                'constraints': [models.UniqueConstraint(fields=('goods', 'rank'), name='goods_neighbor_rank')],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from uuid import uuid4
 from django.db import models
 from django.utils import timezone
 
+from core.fts import FullTextField
+
 
 class IP(models.Model):
     """
@@ -184,6 +186,43 @@ class Category(models.Model):
         return self.path_name or self.name
 
 
+class CategoryClosure(models.Model):
+    """
+    品类树闭包表：每一对（祖先, 后代）一行，自身到自身 depth=0。
+    任意深度的「子树」/「祖先链」都只需一次索引查询，由 receivers 在品类新建/移动时维护，
+    删除品类时随外键级联清理。
+    """
+
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="descendant_links",
+        verbose_name="祖先品类",
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="ancestor_links",
+        verbose_name="后代品类",
+    )
+    depth = models.PositiveIntegerField(
+        default=0,
+        verbose_name="层级差",
+        help_text="祖先到后代的层级距离，自身为 0",
+    )
+
+    class Meta:
+        verbose_name = "品类闭包"
+        verbose_name_plural = "品类闭包"
+        unique_together = ("ancestor", "descendant")
+        indexes = [
+            models.Index(fields=["descendant", "depth"], name="goods_catclos_desc_depth"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 class Theme(models.Model):
     """
     主题表，例如：夏日主题、节日主题、限定主题等
@@ -383,6 +422,15 @@ class Goods(models.Model):
         help_text="值越小越靠前，默认0",
     )
 
+    # 重复检测指纹：用户 + IP + 规范化名称 + 入手日期 + 单价 + 角色集合的哈希（见 apps/goods/fingerprint.py）
+    duplicate_fingerprint = models.CharField(
+        max_length=40,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        verbose_name="重复检测指纹",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
@@ -391,11 +439,278 @@ class Goods(models.Model):
         verbose_name_plural = "谷子"
         # 默认排序：先按自定义顺序值从小到大，其次按创建时间倒序（保证新建未手动排序的谷子有稳定顺序）
         ordering = ["order", "-created_at"]
+        indexes = [
+            # 游标分页的全序键：按用户 + (order, -created_at, id) 直接 seek，不做 OFFSET 扫描
+            models.Index(fields=["user", "order", "-created_at", "id"], name="goods_user_order_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="goods_user_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class GoodsSearchDocument(models.Model):
+    """
+    谷子搜索文档：每个谷子一行，冗余其可检索文本（名称 / IP 名与关键词 / 角色名）。
+    由 receivers 在谷子、IP、关键词、角色变化时增量维护；SQLite 下 FTS5 表 goods_search_fts
+    以本表为外部内容表，由触发器同步。
+    """
+
+    goods = models.OneToOneField(
+        Goods,
+        on_delete=models.CASCADE,
+        related_name="search_document",
+        verbose_name="谷子",
+    )
+    name = models.TextField(blank=True, default="", verbose_name="谷子名称")
+    ip_text = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="IP文本",
+        help_text="IP 名称与全部关键词，空格分隔",
+    )
+    character_text = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="角色文本",
+        help_text="关联角色名，空格分隔",
+    )
+
+    class Meta:
+        verbose_name = "谷子搜索文档"
+        verbose_name_plural = "谷子搜索文档"
+
+    def __str__(self):
+        return f"{self.goods_id}: {self.name}"
+
+
+class GoodsSearchIndex(models.Model):
+    """
+    FTS5 虚拟表 goods_search_fts 的只读影子模型（由迁移建表，Django 不管理）。
+    rowid 即 GoodsSearchDocument.id；rank 为 FTS5 内置的 bm25 相关度（越小越相关）。
+    """
+
+    document = models.OneToOneField(
+        GoodsSearchDocument,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="fts",
+    )
+    fulltext = FullTextField(db_column="goods_search_fts")
+    rank = models.FloatField(db_column="rank")
+
+    class Meta:
+        managed = False
+        db_table = "goods_search_fts"
+
+
+class SearchKey(models.Model):
+    """
+    归一化搜索键（侧表）：为 IP 名称与关键词、角色名、谷子名称预先生成
+    原文 / 全拼 / 首字母 / 繁简折叠后的「后缀键」，搜索时用 key 上的索引做前缀（范围）查询，
+    不再对原表做 LIKE '%..%' 扫描。生成规则见 apps/goods/textkeys.py，由 receivers 维护，
+    所属对象删除时随外键级联清理。
+    """
+
+    ENTITY_IP = "ip"
+    ENTITY_CHARACTER = "character"
+    ENTITY_GOODS = "goods"
+    ENTITY_CHOICES = (
+        (ENTITY_IP, "IP作品"),
+        (ENTITY_CHARACTER, "角色"),
+        (ENTITY_GOODS, "谷子"),
+    )
+
+    entity = models.CharField(
+        max_length=16,
+        choices=ENTITY_CHOICES,
+        verbose_name="对象类型",
+    )
+    key = models.CharField(max_length=100, verbose_name="搜索键")
+    ip = models.ForeignKey(
+        IP,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="search_keys",
+        verbose_name="IP作品",
+    )
+    character = models.ForeignKey(
+        Character,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="search_keys",
+        verbose_name="角色",
+    )
+    goods = models.ForeignKey(
+        Goods,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="search_keys",
+        verbose_name="谷子",
+    )
+
+    class Meta:
+        verbose_name = "搜索键"
+        verbose_name_plural = "搜索键"
+        indexes = [
+            # 前缀查询：WHERE entity = ? AND key >= ? AND key < ?
+            models.Index(fields=["entity", "key"], name="goods_searchkey_lookup"),
+        ]
+
+    def __str__(self):
+        return f"{self.entity}: {self.key}"
+
+
+class GoodsCard(models.Model):
+    """
+    谷子列表卡片读模型：预先序列化好的 GoodsListSerializer 嵌套部分（用户 / IP / 角色 / 品类 / 主题 / 位置路径）。
+    列表接口直接读取卡片，不再 JOIN / prefetch 关联表并逐层跑嵌套序列化器。
+
+    signature 记录构建时谷子行上的外键快照（及卡片格式版本），外键变化（包括 queryset.update）后自动视为过期；
+    关联对象内容变化（改名、关键词、角色增删等）由 receivers 精确删除受影响的卡片，下次读取时重建。
+    """
+
+    goods = models.OneToOneField(
+        Goods,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card",
+        verbose_name="谷子",
+    )
+    data = models.JSONField(verbose_name="卡片数据")
+    signature = models.CharField(
+        max_length=255,
+        verbose_name="外键快照",
+        help_text="构建卡片时的格式版本与 ip / category / theme / location / user 外键",
+    )
+    built_at = models.DateTimeField(auto_now=True, verbose_name="构建时间")
+
+    class Meta:
+        verbose_name = "谷子列表卡片"
+        verbose_name_plural = "谷子列表卡片"
+
+    def __str__(self):
+        return f"{self.goods_id} ({self.signature})"
+
+
+class GoodsGroupRecency(models.Model):
+    """
+    分组最近活动表：每个用户在各分组维度（IP / 角色 / 品类 / 主题）下最新一件谷子的创建时间。
+
+    列表 group_by 按此表排序（(user, dimension, dimension_id) 唯一索引查找），
+    不再对整张谷子表做 Max("ip__goods__created_at") 之类的自连接聚合，角色分组也无需 distinct。
+    由 receivers 在谷子新增 / 修改 / 删除及角色关联变化时维护（见 apps/goods/recency.py）。
+    """
+
+    DIMENSION_IP = "ip"
+    DIMENSION_CHARACTER = "character"
+    DIMENSION_CATEGORY = "category"
+    DIMENSION_THEME = "theme"
+    DIMENSION_CHOICES = (
+        (DIMENSION_IP, "IP作品"),
+        (DIMENSION_CHARACTER, "角色"),
+        (DIMENSION_CATEGORY, "品类"),
+        (DIMENSION_THEME, "主题"),
+    )
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="所属用户",
+    )
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES, verbose_name="分组维度")
+    dimension_id = models.BigIntegerField(verbose_name="分组对象ID")
+    latest_created_at = models.DateTimeField(verbose_name="最新谷子创建时间")
+
+    class Meta:
+        verbose_name = "分组最近活动"
+        verbose_name_plural = "分组最近活动"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "dimension", "dimension_id"], name="goods_group_recency_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.dimension}:{self.dimension_id}"
+
+
+class GoodsStatsRollup(models.Model):
+    """
+    统计汇总表：每个用户在各统计维度（状态、官非、品类、IP、位置、角色、作品类型、按日的入手 / 录入趋势、
+    概览用的「是否填写」标记）下每个取值的谷子数、数量合计与金额合计（数量 × 单价）。
+
+    无筛选的 /api/goods/stats/ 直接读取本表，不再对整个收藏做十余次分组聚合；
+    由 receivers 在谷子写入时按差量维护（见 apps/goods/rollups.py）。
+    """
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="所属用户",
+    )
+    dimension = models.CharField(max_length=20, verbose_name="统计维度")
+    key = models.CharField(max_length=64, blank=True, verbose_name="维度取值", help_text="空字符串表示未填写")
+    goods_count = models.BigIntegerField(default=0, verbose_name="谷子数")
+    quantity_sum = models.BigIntegerField(default=0, verbose_name="数量合计")
+    value_sum = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, verbose_name="金额合计"
+    )
+
+    class Meta:
+        verbose_name = "统计汇总"
+        verbose_name_plural = "统计汇总"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "dimension", "key"], name="goods_stats_rollup_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.dimension}:{self.key}"
+
+
+class GoodsNeighbor(models.Model):
+    """
+    谷子近邻表：每件谷子在所属用户收藏中按 GoodsSimilarityCalculator 评分最相似的前 K 件（rank 从 0 开始）。
+
+    /api/goods/{id}/similar/ 按 (goods, rank) 唯一索引直接读取，不在请求中计算相似度；
+    由 receivers 在谷子的 IP、角色、品类、主题、单价、入手日期变化及新建 / 删除时增量维护（见 apps/goods/neighbors.py）。
+    """
+
+    goods = models.ForeignKey(
+        Goods,
+        on_delete=models.CASCADE,
+        related_name="neighbor_rows",
+        verbose_name="谷子",
+    )
+    neighbor = models.ForeignKey(
+        Goods,
+        on_delete=models.CASCADE,
+        related_name="neighbor_of",
+        verbose_name="相似谷子",
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="名次")
+    score = models.FloatField(verbose_name="相似度分数")
+
+    class Meta:
+        verbose_name = "谷子近邻"
+        verbose_name_plural = "谷子近邻"
+        constraints = [
+            models.UniqueConstraint(fields=["goods", "rank"], name="goods_neighbor_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.goods_id}#{self.rank}: {self.neighbor_id} ({self.score})"
+
+
 class GuziImage(models.Model):
     """
     谷子补充图片表，例如背板细节、瑕疵点等。
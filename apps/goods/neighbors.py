@@ -0,0 +1,401 @@
+"""
+谷子近邻表（GoodsNeighbor，/api/goods/{id}/similar/）的维护。
+
+每件谷子的近邻为所属用户收藏中按 GoodsSimilarityCalculator 评分最高的前 K 件（分数 > 0，同分按谷子 ID 升序；
+K = settings.GOODS_SIMILAR_NEIGHBORS，默认 50）。分数由相似随机的引擎计算（similarity_engine.engine()）：
+vectorized 时按批得出分数矩阵，python 时逐对调用 calculate_similarity，两者分数相同。
+
+增量维护：一件谷子的 IP、角色、品类、主题、单价、入手日期（或所属用户）变化，只改变它与其他谷子之间的分数
+（分数对称），需要重算近邻列表的只有：
+
+- 这件谷子本身；
+- 原近邻列表中含有它的谷子（分数变化可能改变名次或使它掉出前 K）；
+- 新分数不低于当前第 K 名分数（列表未满时为大于 0）的谷子（它可能进入前 K）。
+
+计算范围沿用 similarity.CandidateIndex 的倒排键（IP / 主题 / 角色 / 品类 / 父级品类），直接在数据库中筛出：
+与一件谷子没有共同键的谷子，分数不超过 GoodsSimilarityCalculator.upper_bound_for 给出的上界，因此
+
+- 找可能进入的列表时，只需计算有共同键的谷子，以及第 K 名分数不高于上界（或列表未满）的谷子；
+- 重算一件谷子的列表时先只与有共同键的谷子计算，第 K 名分数高于上界即为最终结果，否则退回与整个收藏计算。
+
+不必每次写入都读取、编码整个收藏；一个用户一次变化的谷子很多（如批量导入）时直接整体重算。
+
+写入时不同步计算：receivers / 批量导入调用 schedule()，事务提交后把谷子交给后台线程池（core/revalidate.py），
+同时只有一个刷新任务执行，其间提交的谷子合并到它的下一轮（同一谷子的字段保存与角色变更只算一次）。
+IP 作品类型变化（该 IP 下的谷子）、品类移动（子树下的谷子）同样调度刷新；删除谷子时近邻行随之级联删除，
+只需重算原本含有它的列表。
+
+每个用户的刷新在单独的事务中进行，先递增该用户的数据版本号（core/versions.py）：UPDATE 持有版本行的锁直到提交，
+多个进程刷新同一用户时依次执行，不会同时改写同一批近邻行；提交后新的近邻行与新版本号同时可见，
+/similar/ 的 ETag 随之变化，不会对刷新前取得的旧列表返回 304。刷新失败时稍后重试，仍失败的谷子留到下一次刷新。
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from core import revalidate, versions
+
+from . import similarity_engine
+from .models import CategoryClosure, Goods, GoodsNeighbor
+from .similarity import GoodsSimilarityCalculator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEIGHBORS = 50
+
+# 谷子上参与相似度计算的列（pre_save 比较用；角色关联由 m2m 信号单独处理）
+SCORE_FIELDS = ("user_id", "ip_id", "category_id", "theme_id", "price", "purchase_date")
+# save(update_fields=...) 中出现这些字段时才需要检查
+UPDATE_FIELDS = {
+    "user", "user_id", "ip", "ip_id", "category", "category_id",
+    "theme", "theme_id", "price", "purchase_date",
+}
+
+# 每批计算的谷子数（vectorized 时分数矩阵为 批大小 × 收藏谷子数）
+BATCH_SIZE = 256
+# 一个用户一次需要重算的谷子超过该数量时不再按倒排键缩小范围（也避免 IN 列表过长）
+BLOCKING_LIMIT = 128
+
+# 刷新失败后的重试间隔（秒）；全部失败时谷子留在待处理集合中，由下一次调度一并刷新
+RETRY_DELAYS = (1, 5)
+
+_pending = {"goods": set(), "lists": set()}
+_lock = threading.Lock()
+_scheduled = False
+
+
+def neighbor_count() -> int:
+    """每件谷子保存的近邻数（K）。"""
+    return getattr(settings, "GOODS_SIMILAR_NEIGHBORS", DEFAULT_NEIGHBORS)
+
+
+def _chunks(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Collection:
+    """一个用户的谷子（默认全部，按 ID 排序，行号即下标）及其相似度计算。"""
+
+    def __init__(self, user_id, goods=None):
+        """goods 为限定范围的谷子查询集（须属于该用户），默认为该用户的全部谷子。"""
+        self.user_id = user_id
+        self.calculator = GoodsSimilarityCalculator()
+        qs = (Goods.objects.filter(user_id=user_id) if goods is None else goods).order_by("id")
+        if similarity_engine.engine() == similarity_engine.ENGINE_VECTORIZED:
+            self.goods = None
+            self.features = similarity_engine.features_for_queryset(qs, self.calculator)
+            self.ids = self.features.ids
+            self._matrix = similarity_engine.SimilarityMatrix(self.calculator.WEIGHTS)
+        else:
+            self.features = None
+            self.goods = list(qs.select_related("ip", "category").prefetch_related("characters"))
+            self.calculator.prime_category_cache({good.category_id for good in self.goods})
+            self.ids = [good.id for good in self.goods]
+        self.index = {goods_id: row for row, goods_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, goods_ids: Iterable) -> set:
+        """属于本收藏的谷子的行号（已删除或属于其他用户的忽略）。"""
+        return {self.index[goods_id] for goods_id in goods_ids if goods_id in self.index}
+
+    def scores(self, rows: list) -> list:
+        """rows 中每件谷子对全部谷子的分数，每行一个序列（下标为行号）。"""
+        if self.features is not None:
+            return list(self._matrix.scores(self.features, rows))
+        return [
+            [self.calculator.calculate_similarity(self.goods[row], good) for good in self.goods]
+            for row in rows
+        ]
+
+    def top(self, row: int, scores, k: int) -> list:
+        """[(行号, 分数), ...]：除自身外分数 > 0 的前 k 件，同分按行号升序。"""
+        if self.features is not None:
+            candidates = np.flatnonzero(scores > 0)
+            candidates = candidates[candidates != row]
+            chosen = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+            return [(int(column), float(scores[column])) for column in chosen]
+        candidates = [column for column, score in enumerate(scores) if score > 0 and column != row]
+        candidates.sort(key=lambda column: -scores[column])
+        return [(column, scores[column]) for column in candidates[:k]]
+
+    def best_scores(self, rows: list) -> list:
+        """每件谷子与 rows 中谷子的最高分。"""
+        if self.features is not None:
+            best = np.zeros(len(self))
+            for batch in _chunks(rows):
+                best = np.maximum(best, self._matrix.scores(self.features, batch).max(axis=0))
+            return best.tolist()
+        best = [0.0] * len(self)
+        for scores in self.scores(rows):
+            best = [max(a, b) for a, b in zip(best, scores)]
+        return best
+
+    def bound(self, row: int) -> float:
+        """与这件谷子没有共同倒排键的谷子的分数上界（同 GoodsSimilarityCalculator.unrelated_upper_bound）。"""
+        if self.features is None:
+            return self.calculator.unrelated_upper_bound(self.goods[row])
+        features = self.features
+        return self.calculator.upper_bound_for(
+            bool(features.subject_type[row]),
+            bool(features.theme[row] != similarity_engine.MISSING),
+            bool(features.has_price[row]),
+            bool(features.has_purchase[row]),
+        )
+
+
+def _related(goods_ids) -> tuple:
+    """
+    与 goods_ids 中任一谷子有共同倒排键（同 similarity.CandidateIndex）的谷子的筛选条件，
+    以及没有共同键的谷子与它们的分数上界（取最大值）。
+    """
+    calculator = GoodsSimilarityCalculator()
+    ips, themes, categories, bound = set(), set(), set(), 0.0
+    for ip_id, subject_type, theme_id, category_id, price, purchase_date in Goods.objects.filter(
+        id__in=goods_ids
+    ).values_list("ip_id", "ip__subject_type", "theme_id", "category_id", "price", "purchase_date"):
+        ips.add(ip_id)
+        categories.add(category_id)
+        if theme_id:
+            themes.add(theme_id)
+        bound = max(bound, calculator.upper_bound_for(
+            bool(subject_type), bool(theme_id), price is not None, purchase_date is not None
+        ))
+    Through = Goods.characters.through
+    characters = set(Through.objects.filter(goods_id__in=goods_ids).values_list("character_id", flat=True))
+    parents = set(
+        CategoryClosure.objects.filter(descendant_id__in=categories, depth=1).values_list("ancestor_id", flat=True)
+    )
+    condition = Q(ip_id__in=ips) | Q(category_id__in=categories)
+    if themes:
+        condition |= Q(theme_id__in=themes)
+    if characters:
+        condition |= Q(id__in=Through.objects.filter(character_id__in=characters).values("goods_id"))
+    if parents:
+        condition |= Q(
+            category_id__in=CategoryClosure.objects.filter(ancestor_id__in=parents, depth=1).values("descendant_id")
+        )
+    return condition, bound
+
+
+def _entering(user_id, goods_ids: set, k: int) -> set:
+    """与 goods_ids 的新分数可能进入其前 k 的谷子：不低于当前第 k 名的分数，列表未满时大于 0。"""
+    related, bound = _related(goods_ids)
+    # 第 k 名分数高于上界的列表，没有共同键的谷子进不去
+    closed = GoodsNeighbor.objects.filter(
+        goods_id=OuterRef("pk"), rank=k - 1, score__gt=bound + GoodsSimilarityCalculator.BOUND_EPSILON
+    )
+    scope = Goods.objects.filter(user_id=user_id).filter(Q(id__in=goods_ids) | related | ~Exists(closed))
+    collection = Collection(user_id, scope)
+    kth = dict(GoodsNeighbor.objects.filter(goods__in=scope, rank=k - 1).values_list("goods_id", "score"))
+    best = collection.best_scores(sorted(collection.rows(goods_ids)))
+    entering = set()
+    for goods_id, score in zip(collection.ids, best):
+        threshold = kth.get(goods_id)
+        if score > 0 and (threshold is None or score >= threshold):
+            entering.add(goods_id)
+    return entering
+
+
+def _store(lists: dict) -> None:
+    """
+    保存近邻列表 {谷子ID: [(近邻ID, 分数), ...]}（每次不超过一批谷子）。
+
+    与已保存的行逐个名次比较，只删除 / 插入内容变化的 (谷子, 名次)：一件谷子分数变化通常只让它在各列表中
+    移动几个名次，不必整表重写。
+    """
+    stored = {
+        (goods_id, rank): (pk, neighbor_id, score)
+        for pk, goods_id, rank, neighbor_id, score in GoodsNeighbor.objects.filter(
+            goods_id__in=list(lists)
+        ).values_list("pk", "goods_id", "rank", "neighbor_id", "score")
+    }
+    entries = []
+    for goods_id, neighbors in lists.items():
+        for rank, (neighbor_id, score) in enumerate(neighbors):
+            old = stored.pop((goods_id, rank), None)
+            if old is not None and old[1:] == (neighbor_id, score):
+                continue
+            if old is not None:
+                stored[(goods_id, rank)] = old
+            entries.append(GoodsNeighbor(goods_id=goods_id, neighbor_id=neighbor_id, rank=rank, score=score))
+    # 剩下的为内容变化或超出新列表长度的名次
+    stale = [pk for pk, _, _ in stored.values()]
+    for chunk in _chunks(stale, 500):
+        GoodsNeighbor.objects.filter(pk__in=chunk).delete()
+    GoodsNeighbor.objects.bulk_create(entries, batch_size=500)
+
+
+def _lists(collection: Collection, rows: list, k: int) -> dict:
+    return {
+        collection.ids[row]: [(collection.ids[column], score) for column, score in collection.top(row, scores, k)]
+        for row, scores in zip(rows, collection.scores(rows))
+    }
+
+
+def _write(collection: Collection, rows: Iterable, k: int) -> int:
+    """在整个收藏中为 rows 重算近邻列表，返回重算的谷子数。"""
+    rows = sorted(rows)
+    for batch in _chunks(rows):
+        _store(_lists(collection, batch, k))
+    return len(rows)
+
+
+def _rewrite(user_id, goods_ids: set, k: int) -> int:
+    """重算这些谷子的近邻列表：先只与有共同倒排键的谷子计算，前 k 名不能确定的再与整个收藏计算。"""
+    if len(goods_ids) > BLOCKING_LIMIT:
+        collection = Collection(user_id)
+        return _write(collection, collection.rows(goods_ids), k)
+    related, _ = _related(goods_ids)
+    collection = Collection(user_id, Goods.objects.filter(user_id=user_id).filter(Q(id__in=goods_ids) | related))
+    rows = sorted(collection.rows(goods_ids))
+    lists, undecided = {}, []
+    for goods_id, neighbors in _lists(collection, rows, k).items():
+        row = collection.index[goods_id]
+        # 范围外的谷子分数不超过上界：第 k 名严格高于上界时，它们不可能进入前 k
+        if len(neighbors) == k and neighbors[-1][1] > collection.bound(row) + GoodsSimilarityCalculator.BOUND_EPSILON:
+            lists[goods_id] = neighbors
+        else:
+            undecided.append(goods_id)
+    _store(lists)
+    if undecided:
+        collection = Collection(user_id)
+        _write(collection, collection.rows(undecided), k)
+    return len(rows)
+
+
+def refresh(goods_ids: Iterable = (), lists: Iterable = ()) -> int:
+    """
+    增量更新近邻表，返回重算了近邻列表的谷子数。
+
+    goods_ids 为相似度相关字段或角色变化（含新建）的谷子；lists 为只需重算自身列表的谷子（如列表中的谷子被删除）。
+    原近邻列表中含有变化谷子、但属于其他用户的谷子（谷子换了所属用户）在各自的收藏中重算。
+    """
+    goods_ids, lists = list(dict.fromkeys(goods_ids)), list(dict.fromkeys(lists))
+    users = set()
+    for batch in _chunks(goods_ids, 500):
+        users.update(Goods.objects.filter(id__in=batch).values_list("user_id", flat=True))
+        users.update(GoodsNeighbor.objects.filter(neighbor_id__in=batch).values_list("goods__user_id", flat=True))
+    for batch in _chunks(lists, 500):
+        users.update(Goods.objects.filter(id__in=batch).values_list("user_id", flat=True))
+
+    k = neighbor_count()
+    written = 0
+    # 按用户 ID 顺序加锁，多个进程同时刷新时不会互相等待成环
+    for user_id in sorted(users):
+        with transaction.atomic():
+            versions.bump_user(user_id)
+            written += _refresh_user(user_id, goods_ids, lists, k)
+    return written
+
+
+def _refresh_user(user_id, goods_ids: list, lists: list, k: int) -> int:
+    """在已加锁的事务中刷新一个用户（变化谷子与含有它们的列表在加锁后读取）。"""
+    changed, affected = set(), set()
+    for batch in _chunks(goods_ids, 500):
+        changed.update(Goods.objects.filter(user_id=user_id, id__in=batch).values_list("id", flat=True))
+        affected.update(
+            GoodsNeighbor.objects.filter(goods__user_id=user_id, neighbor_id__in=batch).values_list("goods_id", flat=True)
+        )
+    for batch in _chunks(lists, 500):
+        affected.update(Goods.objects.filter(user_id=user_id, id__in=batch).values_list("id", flat=True))
+
+    if changed and (
+        len(changed) > BLOCKING_LIMIT or len(changed) * 2 >= Goods.objects.filter(user_id=user_id).count()
+    ):
+        # 大部分谷子都变化了（如批量导入），直接整体重算
+        collection = Collection(user_id)
+        return _write(collection, range(len(collection)), k)
+    affected |= changed
+    if changed:
+        affected |= _entering(user_id, changed, k)
+    return _rewrite(user_id, affected, k)
+
+
+def recompute(goods_ids: Iterable) -> int:
+    """只重算指定谷子的近邻列表，返回重算的谷子数。"""
+    return refresh(lists=goods_ids)
+
+
+def rebuild(user_ids: Iterable | None = None) -> int:
+    """全量重建（可限定用户），返回重算的谷子数。"""
+    users = Goods.objects.order_by("user_id").values_list("user_id", flat=True).distinct()
+    stale = GoodsNeighbor.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        users = users.filter(user_id__in=user_ids)
+        stale = stale.filter(goods__user_id__in=user_ids)
+    k = neighbor_count()
+    written = 0
+    with transaction.atomic():
+        stale.delete()
+        for user_id in list(users):
+            versions.bump_user(user_id)
+            collection = Collection(user_id)
+            written += _write(collection, range(len(collection)), k)
+    return written
+
+
+def schedule(goods_ids: Iterable = (), lists: Iterable = ()) -> None:
+    """当前事务提交后在后台执行 refresh(goods_ids, lists)（事务回滚时不执行）；参数在调用时即读取。"""
+    goods_ids, lists = set(goods_ids), set(lists)
+    if goods_ids or lists:
+        transaction.on_commit(lambda: _enqueue(goods_ids, lists))
+
+
+def _enqueue(goods_ids: set, lists: set) -> None:
+    global _scheduled
+    with _lock:
+        _pending["goods"] |= goods_ids
+        _pending["lists"] |= lists
+        if _scheduled:
+            # 已有刷新任务在等待或执行，由它在下一轮一并处理
+            return
+        _scheduled = True
+    try:
+        revalidate.submit(_drain)
+    except Exception:
+        with _lock:
+            _scheduled = False
+        raise
+
+
+def _drain() -> None:
+    global _scheduled
+    while True:
+        with _lock:
+            goods_ids, lists = _pending["goods"], _pending["lists"]
+            if not goods_ids and not lists:
+                _scheduled = False
+                return
+            _pending["goods"], _pending["lists"] = set(), set()
+        for delay in (*RETRY_DELAYS, None):
+            try:
+                refresh(goods_ids, lists)
+                break
+            except Exception:
+                if delay is None:
+                    # 不丢弃：放回待处理集合，下一次调度时一并刷新
+                    logger.exception("近邻表刷新失败，留待下次刷新：%d 件谷子", len(goods_ids | lists))
+                    with _lock:
+                        _pending["goods"] |= goods_ids
+                        _pending["lists"] |= lists
+                        _scheduled = False
+                    return
+                # 多进程同时写入（唯一约束冲突、SQLite 的 database is locked）等暂时性错误，稍后重试
+                logger.warning("近邻表刷新失败，%s 秒后重试", delay, exc_info=True)
+                time.sleep(delay)
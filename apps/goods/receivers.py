@@ -0,0 +1,592 @@
+"""
+派生数据（索引 / 读模型）维护用的信号接收器。
+
+在 GoodsConfig.ready() 中注册。与 signals.py（媒体文件清理）分开，互不影响。
+"""
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.location.models import StorageNode
+from apps.users.models import User
+from core import closure, versions
+
+from . import cards, fingerprint, neighbors, recency, rollups, search
+from .models import (
+    Category,
+    CategoryClosure,
+    Character,
+    Goods,
+    GoodsGroupRecency,
+    GoodsNeighbor,
+    GuziImage,
+    IP,
+    IPKeyword,
+    Showcase,
+    ShowcaseGoods,
+    Theme,
+    ThemeImage,
+)
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance, raw=False, update_fields=None, **kwargs):
+    """记录保存前的父节点，供 post_save 判断是否需要移动闭包子树。"""
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and "parent" not in update_fields:
+        # 仅更新 order 等字段（如批量排序）时无需查询
+        instance._closure_old_parent_id = instance.parent_id
+        return
+    instance._closure_old_parent_id = (
+        Category.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def sync_category_closure(sender, instance, created, raw=False, **kwargs):
+    """新建品类时插入闭包行；父节点变化时整体移动子树。"""
+    if raw:
+        return
+    if created:
+        closure.insert_node(CategoryClosure, instance.pk, instance.parent_id)
+        return
+    old_parent_id = getattr(instance, "_closure_old_parent_id", instance.parent_id)
+    if old_parent_id != instance.parent_id:
+        closure.move_subtree(CategoryClosure, instance.pk, instance.parent_id)
+        # 父级品类参与相似度：子树下谷子的近邻列表需要刷新
+        neighbors.schedule(
+            Goods.objects.filter(category__ancestor_links__ancestor_id=instance.pk).values_list("id", flat=True)
+        )
+    instance._closure_old_parent_id = instance.parent_id
+
+
+# ---------------------------------------------------------------------------
+# 搜索文档（GoodsSearchDocument / FTS5）与搜索键（SearchKey）
+# ---------------------------------------------------------------------------
+
+SEARCH_GOODS_FIELDS = {"name", "ip", "ip_id"}
+
+
+@receiver(post_save, sender=Goods)
+def sync_goods_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    """谷子新建或名称 / IP 变化时重建其搜索文档与拼音键；仅改排序、状态等字段时跳过。"""
+    if raw:
+        return
+    if update_fields is not None and not SEARCH_GOODS_FIELDS.intersection(update_fields):
+        return
+    search.reindex_goods([instance.pk])
+    if update_fields is None or "name" in update_fields:
+        search.reindex_goods_keys([instance.pk])
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def sync_goods_characters(sender, instance, action, reverse, pk_set, **kwargs):
+    """角色关联变化（含从角色一侧 add/remove/clear）时更新受影响谷子的角色文本与列表卡片。"""
+    if action == "pre_clear":
+        # clear 在 post_clear 时拿不到 pk_set，提前记录受影响的谷子 / 角色
+        if reverse:
+            instance._search_cleared_goods = list(instance.goods.values_list("id", flat=True))
+        else:
+            instance._recency_cleared_characters = list(instance.characters.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        goods_ids = [instance.pk]
+        if action == "post_clear":
+            character_ids = getattr(instance, "_recency_cleared_characters", [])
+        else:
+            character_ids = pk_set or []
+    else:
+        if action == "post_clear":
+            goods_ids = getattr(instance, "_search_cleared_goods", [])
+        else:
+            goods_ids = list(pk_set or [])
+        character_ids = [instance.pk]
+    search.reindex_goods(goods_ids)
+    cards.invalidate_goods(goods_ids)
+    recency.refresh(recency.character_keys(goods_ids, character_ids))
+
+
+@receiver(post_save, sender=IP)
+def sync_ip_search(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.reindex_ip_keys([instance.pk])
+    if not created:
+        search.reindex_queryset(Goods.objects.filter(ip=instance))
+        cards.invalidate_ip(instance.pk)
+
+
+@receiver(post_save, sender=IPKeyword)
+@receiver(post_delete, sender=IPKeyword)
+def sync_ip_keyword_search(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    if isinstance(origin, IP) or getattr(origin, "model", None) is IP:
+        # 随 IP 一起级联删除，搜索键也会被级联清理，不能再为即将删除的 IP 写入新键
+        return
+    search.reindex_ip_keys([instance.ip_id])
+    search.reindex_queryset(Goods.objects.filter(ip_id=instance.ip_id))
+    cards.invalidate_ip(instance.ip_id)
+
+
+@receiver(pre_save, sender=Character)
+def remember_character_ip(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._old_ip_id = Character.objects.filter(pk=instance.pk).values_list("ip_id", flat=True).first()
+
+
+@receiver(post_save, sender=Character)
+def sync_character_search(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.reindex_character_keys([instance.pk])
+    if not created:
+        search.reindex_queryset(instance.goods.all())
+    # 角色本身与所属 IP 的 character_count 都嵌套在卡片中；换 IP 时新旧两个 IP 都受影响
+    cards.invalidate_ip(instance.ip_id)
+    old_ip_id = getattr(instance, "_old_ip_id", None)
+    if old_ip_id and old_ip_id != instance.ip_id:
+        cards.invalidate_ip(old_ip_id)
+
+
+@receiver(pre_delete, sender=Character)
+def remember_character_goods(sender, instance, **kwargs):
+    """删除角色时关联行被级联删除且不触发 m2m_changed，先记下受影响的谷子。"""
+    instance._search_goods_ids = list(instance.goods.values_list("id", flat=True))
+    cards.invalidate_ip(instance.ip_id)
+
+
+@receiver(post_delete, sender=Character)
+def sync_deleted_character_search(sender, instance, **kwargs):
+    search.reindex_goods(getattr(instance, "_search_goods_ids", []))
+
+
+# ---------------------------------------------------------------------------
+# 列表卡片（GoodsCard）：谷子行上的外键变化由卡片签名自动识别，这里只处理关联对象内容变化
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Category)
+def invalidate_category_cards(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    cards.invalidate(Q(goods__category_id=instance.pk))
+
+
+@receiver(post_save, sender=Theme)
+def invalidate_theme_cards(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    cards.invalidate(Q(goods__theme_id=instance.pk))
+
+
+@receiver(post_save, sender=StorageNode)
+def invalidate_location_cards(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    cards.invalidate(Q(goods__location_id=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cards(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and "username" not in update_fields:
+        return
+    cards.invalidate(Q(goods__user_id=instance.pk))
+
+
+
+# ---------------------------------------------------------------------------
+# 分组最近活动（GoodsGroupRecency）：谷子进入 / 离开分组时刷新受影响的键
+# ---------------------------------------------------------------------------
+
+@receiver(pre_save, sender=Goods)
+def remember_goods_groups(sender, instance, raw=False, update_fields=None, **kwargs):
+    """记录保存前的用户与外键分组，供 post_save 计算需要刷新的键。"""
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not recency.GROUP_FIELDS.intersection(update_fields):
+        return
+    row = (
+        Goods.objects.filter(pk=instance.pk)
+        .values_list("user_id", *recency.FK_DIMENSIONS.values())
+        .first()
+    )
+    if row is not None:
+        instance._recency_old_user_id = row[0]
+        instance._recency_old_keys = recency.row_keys(row[0], dict(zip(recency.FK_DIMENSIONS, row[1:])))
+
+
+@receiver(post_save, sender=Goods)
+def sync_goods_group_recency(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not recency.GROUP_FIELDS.intersection(update_fields):
+        return
+    keys = recency.instance_keys(instance)
+    old_keys = getattr(instance, "_recency_old_keys", set())
+    if not created and keys == old_keys:
+        return
+    keys |= old_keys
+    old_user_id = getattr(instance, "_recency_old_user_id", instance.user_id)
+    if old_user_id != instance.user_id:
+        # 换了所属用户：新旧两个用户的角色分组都受影响
+        character_ids = list(instance.characters.values_list("id", flat=True))
+        for user_id in (old_user_id, instance.user_id):
+            keys |= {(user_id, GoodsGroupRecency.DIMENSION_CHARACTER, cid) for cid in character_ids}
+        # 原用户的谷子集合同样发生了变化（新用户的版本号由 bump_owner_version 递增）
+        versions.bump_user(old_user_id)
+    instance._recency_old_keys = recency.instance_keys(instance)
+    instance._recency_old_user_id = instance.user_id
+    recency.refresh(keys)
+
+
+@receiver(pre_delete, sender=Goods)
+def remember_deleted_goods_groups(sender, instance, **kwargs):
+    """角色关联行会先于谷子被删除，提前记下谷子所属的全部分组。"""
+    instance._recency_deleted_keys = recency.goods_keys([instance.pk])
+
+
+@receiver(post_delete, sender=Goods)
+def sync_deleted_goods_group_recency(sender, instance, **kwargs):
+    recency.refresh(getattr(instance, "_recency_deleted_keys", set()))
+
+
+RECENCY_DIMENSIONS = {
+    IP: GoodsGroupRecency.DIMENSION_IP,
+    Character: GoodsGroupRecency.DIMENSION_CHARACTER,
+    Category: GoodsGroupRecency.DIMENSION_CATEGORY,
+    Theme: GoodsGroupRecency.DIMENSION_THEME,
+}
+
+
+@receiver(post_delete, sender=IP)
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Theme)
+def forget_group_recency(sender, instance, **kwargs):
+    """分组对象被删除（主题删除时谷子外键被置空、角色删除时关联行被级联删除，均不触发谷子信号）。"""
+    recency.forget(RECENCY_DIMENSIONS[sender], instance.pk)
+
+
+# ---------------------------------------------------------------------------
+# 统计汇总（GoodsStatsRollup）：谷子写入前后的快照之差累加到汇总行
+# ---------------------------------------------------------------------------
+
+@receiver(pre_save, sender=Goods)
+def remember_goods_rollup(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not rollups.ROLLUP_FIELDS.intersection(update_fields):
+        return
+    instance._rollup_old = rollups.snapshots([instance.pk]).get(instance.pk)
+
+
+@receiver(post_save, sender=Goods)
+def sync_goods_rollup(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not rollups.ROLLUP_FIELDS.intersection(update_fields):
+        return
+    old = None if created else getattr(instance, "_rollup_old", None)
+    # 角色关联不随 save 变化（新建时尚未关联角色），由 m2m_changed 单独处理
+    character_ids = old.character_ids if old is not None else ()
+    rollups.replace(old, rollups.instance_snapshot(instance, character_ids, old, update_fields))
+    instance._rollup_old = None
+
+
+@receiver(pre_delete, sender=Goods)
+def remember_deleted_goods_rollup(sender, instance, **kwargs):
+    instance._rollup_old = rollups.snapshots([instance.pk]).get(instance.pk)
+
+
+@receiver(post_delete, sender=Goods)
+def sync_deleted_goods_rollup(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) or getattr(origin, "model", None) is User:
+        # 随用户一起级联删除，汇总行也会被级联清理
+        return
+    rollups.replace(getattr(instance, "_rollup_old", None), None)
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def sync_goods_characters_rollup(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("pre_add", "pre_remove", "pre_clear"):
+        if not reverse:
+            goods_ids = [instance.pk]
+        elif action == "pre_clear":
+            goods_ids = list(instance.goods.values_list("id", flat=True))
+        else:
+            goods_ids = list(pk_set or [])
+        instance._rollup_m2m_old = rollups.snapshots(goods_ids)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        rollups.commit(getattr(instance, "_rollup_m2m_old", {}))
+        instance._rollup_m2m_old = {}
+
+
+@receiver(pre_delete, sender=Character)
+def remember_character_rollup(sender, instance, **kwargs):
+    """角色关联行随角色级联删除，不触发 m2m_changed。"""
+    instance._rollup_old = rollups.snapshots(instance.goods.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Character)
+def sync_deleted_character_rollup(sender, instance, **kwargs):
+    rollups.commit(getattr(instance, "_rollup_old", {}))
+
+
+@receiver(pre_delete, sender=StorageNode)
+def remember_storage_node_rollup(sender, instance, **kwargs):
+    """谷子的 location 由 SET_NULL 置空，不触发谷子信号。"""
+    instance._rollup_old = rollups.snapshots(
+        Goods.objects.filter(location_id=instance.pk).values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=StorageNode)
+def sync_deleted_storage_node_rollup(sender, instance, **kwargs):
+    rollups.commit(getattr(instance, "_rollup_old", {}))
+
+
+@receiver(pre_save, sender=IP)
+def remember_ip_subject_type(sender, instance, raw=False, **kwargs):
+    """作品类型是统计维度之一：变化时记下该 IP 下谷子的快照。"""
+    instance._rollup_old = {}
+    if raw or instance._state.adding:
+        return
+    old_subject_type = IP.objects.filter(pk=instance.pk).values_list("subject_type", flat=True).first()
+    if old_subject_type != instance.subject_type:
+        instance._rollup_old = rollups.snapshots(
+            Goods.objects.filter(ip_id=instance.pk).values_list("id", flat=True)
+        )
+
+
+@receiver(post_save, sender=IP)
+def sync_ip_subject_type_rollup(sender, instance, raw=False, **kwargs):
+    """作品类型同样参与相似度（IP 不同、作品类型相同时得部分分）：一并刷新这些谷子的近邻列表。"""
+    if raw:
+        return
+    old = getattr(instance, "_rollup_old", {})
+    rollups.commit(old)
+    neighbors.schedule(old)
+    instance._rollup_old = {}
+
+
+# ---------------------------------------------------------------------------
+# 重复检测指纹（Goods.duplicate_fingerprint，见 fingerprint.py）
+# ---------------------------------------------------------------------------
+
+FINGERPRINT_GOODS_FIELDS = {"user", "user_id", "ip", "ip_id", "name", "purchase_date", "price"}
+
+
+@receiver(pre_save, sender=Goods)
+def compute_goods_fingerprint(sender, instance, raw=False, update_fields=None, **kwargs):
+    """完整保存时随同一条 INSERT / UPDATE 写入指纹；新建的谷子此时还没有角色，关联后由 m2m 信号刷新。"""
+    if raw or update_fields is not None:
+        return
+    if instance._state.adding:
+        character_ids = []
+    else:
+        character_ids = Goods.characters.through.objects.filter(goods_id=instance.pk).values_list(
+            "character_id", flat=True
+        )
+    instance.duplicate_fingerprint = fingerprint.of_instance(instance, character_ids)
+
+
+@receiver(post_save, sender=Goods)
+def refresh_goods_fingerprint(sender, instance, raw=False, update_fields=None, **kwargs):
+    """save(update_fields=...)（含带延迟字段的对象）改到指纹相关字段时，保存后重新计算。"""
+    if raw or update_fields is None or "duplicate_fingerprint" in update_fields:
+        return
+    if FINGERPRINT_GOODS_FIELDS.intersection(update_fields):
+        fingerprint.refresh([instance.pk])
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def refresh_characters_fingerprint(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._fingerprint_cleared_goods = list(instance.goods.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        goods_ids = [instance.pk]
+    elif action == "post_clear":
+        goods_ids = getattr(instance, "_fingerprint_cleared_goods", [])
+    else:
+        goods_ids = list(pk_set or [])
+    fingerprint.refresh(goods_ids)
+
+
+@receiver(pre_delete, sender=Character)
+def remember_character_fingerprints(sender, instance, **kwargs):
+    instance._fingerprint_goods_ids = list(instance.goods.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Character)
+def refresh_deleted_character_fingerprints(sender, instance, **kwargs):
+    fingerprint.refresh(getattr(instance, "_fingerprint_goods_ids", []))
+
+
+# ---------------------------------------------------------------------------
+# 谷子近邻表（GoodsNeighbor，见 neighbors.py）：只在相似度相关的值变化时调度，事务提交后在后台增量更新
+# ---------------------------------------------------------------------------
+
+@receiver(pre_save, sender=Goods)
+def remember_goods_similarity_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not neighbors.UPDATE_FIELDS.intersection(update_fields):
+        return
+    instance._neighbors_old = (
+        Goods.objects.filter(pk=instance.pk).values_list(*neighbors.SCORE_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Goods)
+def refresh_goods_neighbors(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not neighbors.UPDATE_FIELDS.intersection(update_fields):
+        return
+    if not created:
+        # 单价按字段类型规范化后再比较（表单 / 序列化器可能传入字符串或多余小数位）
+        price = Goods._meta.get_field("price").to_python(instance.price)
+        current = tuple(
+            price if field == "price" else getattr(instance, field) for field in neighbors.SCORE_FIELDS
+        )
+        if current == getattr(instance, "_neighbors_old", None):
+            return
+    instance._neighbors_old = None
+    neighbors.schedule([instance.pk])
+
+
+@receiver(pre_delete, sender=Goods)
+def remember_goods_neighbor_lists(sender, instance, **kwargs):
+    """谷子删除后指向它的近邻行被级联删除，先记下需要补位的列表。"""
+    instance._neighbor_lists = list(
+        GoodsNeighbor.objects.filter(neighbor_id=instance.pk).values_list("goods_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Goods)
+def recompute_goods_neighbor_lists(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) or getattr(origin, "model", None) is User:
+        # 随用户一起级联删除，近邻行也会被级联清理
+        return
+    neighbors.schedule(lists=getattr(instance, "_neighbor_lists", []))
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def refresh_characters_neighbors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._neighbors_cleared_goods = list(instance.goods.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        goods_ids = [instance.pk]
+    elif action == "post_clear":
+        goods_ids = getattr(instance, "_neighbors_cleared_goods", [])
+    else:
+        goods_ids = list(pk_set or [])
+    neighbors.schedule(goods_ids)
+
+
+@receiver(pre_delete, sender=Character)
+@receiver(pre_delete, sender=Theme)
+def remember_related_goods_neighbors(sender, instance, **kwargs):
+    """角色关联行被级联删除、主题外键被置空，均不触发谷子信号。"""
+    instance._neighbors_goods_ids = list(instance.goods.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Theme)
+def refresh_related_goods_neighbors(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) or getattr(origin, "model", None) is User:
+        return
+    neighbors.schedule(getattr(instance, "_neighbors_goods_ids", []))
+
+
+# ---------------------------------------------------------------------------
+# 数据版本号（core/versions.py）：与写入同一事务递增，供读接口 ETag / 304 使用
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+@receiver(post_save, sender=Theme)
+@receiver(post_delete, sender=Theme)
+@receiver(post_save, sender=Showcase)
+@receiver(post_delete, sender=Showcase)
+@receiver(post_save, sender=StorageNode)
+@receiver(post_delete, sender=StorageNode)
+def bump_owner_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump_user(instance.user_id)
+
+
+@receiver(post_save, sender=GuziImage)
+@receiver(post_delete, sender=GuziImage)
+def bump_goods_image_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump_user(*Goods.objects.filter(pk=instance.guzi_id).values_list("user_id", flat=True))
+
+
+@receiver(post_save, sender=ThemeImage)
+@receiver(post_delete, sender=ThemeImage)
+def bump_theme_image_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump_user(*Theme.objects.filter(pk=instance.theme_id).values_list("user_id", flat=True))
+
+
+@receiver(post_save, sender=ShowcaseGoods)
+@receiver(post_delete, sender=ShowcaseGoods)
+def bump_showcase_goods_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump_user(
+        *Showcase.objects.filter(pk=instance.showcase_id).values_list("user_id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def bump_goods_characters_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        versions.bump_user(instance.user_id)
+        return
+    goods_ids = getattr(instance, "_search_cleared_goods", []) if action == "post_clear" else pk_set
+    versions.bump_user(
+        *Goods.objects.filter(pk__in=list(goods_ids or [])).values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """用户名出现在谷子列表中。"""
+    if raw or created:
+        return
+    if update_fields is not None and "username" not in update_fields:
+        return
+    versions.bump_user(instance.pk)
+
+
+@receiver(post_save, sender=IP)
+@receiver(post_delete, sender=IP)
+@receiver(post_save, sender=IPKeyword)
+@receiver(post_delete, sender=IPKeyword)
+@receiver(post_save, sender=Character)
+@receiver(post_delete, sender=Character)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump_catalog()
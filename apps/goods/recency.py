@@ -0,0 +1,189 @@
+"""
+分组最近活动表（GoodsGroupRecency）的维护与查询。
+
+键为 (user_id, dimension, dimension_id)，值为该用户在该分组下最新一件谷子的 created_at。
+created_at 不会被修改，因此只有谷子进入 / 离开某个分组（新建、删除、改外键、增删角色）时需要刷新，
+刷新时按维度对受影响的键重新聚合（每个维度一次聚合 + 一次 upsert + 一次删除）。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Iterable
+
+from django.db.models import Max, OuterRef, Q, Subquery
+
+from .models import Goods, GoodsGroupRecency
+
+# 外键维度 -> 谷子上的外键列
+FK_DIMENSIONS = {
+    GoodsGroupRecency.DIMENSION_IP: "ip_id",
+    GoodsGroupRecency.DIMENSION_CATEGORY: "category_id",
+    GoodsGroupRecency.DIMENSION_THEME: "theme_id",
+}
+DIMENSIONS = (*FK_DIMENSIONS, GoodsGroupRecency.DIMENSION_CHARACTER)
+
+# 谷子上决定分组归属的字段（pre_save / update_fields 判断用）
+GROUP_FIELDS = {"user", "user_id", "ip", "ip_id", "category", "category_id", "theme", "theme_id"}
+
+
+def row_keys(user_id, fk_values: dict) -> set:
+    """由用户与外键取值（{维度: ID}）得到外键维度的分组键。"""
+    return {
+        (user_id, dimension, value)
+        for dimension, value in fk_values.items()
+        if value is not None
+    }
+
+
+def instance_keys(goods) -> set:
+    """谷子对象当前外键维度的分组键（不查询数据库）。"""
+    return row_keys(
+        goods.user_id,
+        {dimension: getattr(goods, column) for dimension, column in FK_DIMENSIONS.items()},
+    )
+
+
+def goods_keys(goods_ids: Iterable, include_characters: bool = True) -> set:
+    """谷子当前所属的全部分组键（一次查询外键，一次查询角色）。"""
+    goods_ids = list(goods_ids)
+    keys = set()
+    if not goods_ids:
+        return keys
+    columns = ["user_id", *FK_DIMENSIONS.values()]
+    for row in Goods.objects.filter(id__in=goods_ids).values_list(*columns):
+        keys |= row_keys(row[0], dict(zip(FK_DIMENSIONS, row[1:])))
+    if include_characters:
+        through = Goods.characters.through.objects.filter(goods_id__in=goods_ids)
+        for user_id, character_id in through.values_list("goods__user_id", "character_id"):
+            keys.add((user_id, GoodsGroupRecency.DIMENSION_CHARACTER, character_id))
+    return keys
+
+
+def character_keys(goods_ids: Iterable, character_ids: Iterable) -> set:
+    """角色关联变化涉及的键：这些谷子的所属用户 × 这些角色。"""
+    character_ids = set(character_ids)
+    if not character_ids:
+        return set()
+    user_ids = set(Goods.objects.filter(id__in=list(goods_ids)).values_list("user_id", flat=True))
+    return {
+        (user_id, GoodsGroupRecency.DIMENSION_CHARACTER, character_id)
+        for user_id in user_ids
+        for character_id in character_ids
+    }
+
+
+def _latest(dimension: str, user_ids: set, object_ids: set) -> dict:
+    if dimension == GoodsGroupRecency.DIMENSION_CHARACTER:
+        rows = (
+            Goods.characters.through.objects.filter(
+                goods__user_id__in=user_ids, character_id__in=object_ids
+            )
+            .values("goods__user_id", "character_id")
+            .annotate(latest=Max("goods__created_at"))
+            .values_list("goods__user_id", "character_id", "latest")
+        )
+    else:
+        column = FK_DIMENSIONS[dimension]
+        rows = (
+            Goods.objects.filter(user_id__in=user_ids, **{f"{column}__in": object_ids})
+            .values("user_id", column)
+            .annotate(latest=Max("created_at"))
+            .values_list("user_id", column, "latest")
+        )
+    return {(user_id, object_id): latest for user_id, object_id, latest in rows}
+
+
+def refresh(keys: Iterable) -> None:
+    """重新计算给定键的最近活动时间；分组下已没有谷子的键被删除。"""
+    by_dimension = defaultdict(set)
+    for user_id, dimension, object_id in keys:
+        by_dimension[dimension].add((user_id, object_id))
+
+    for dimension, pairs in by_dimension.items():
+        latest = _latest(
+            dimension,
+            {user_id for user_id, _ in pairs},
+            {object_id for _, object_id in pairs},
+        )
+        rows = [
+            GoodsGroupRecency(
+                user_id=user_id,
+                dimension=dimension,
+                dimension_id=object_id,
+                latest_created_at=latest[(user_id, object_id)],
+            )
+            for user_id, object_id in pairs
+            if (user_id, object_id) in latest
+        ]
+        if rows:
+            GoodsGroupRecency.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["user", "dimension", "dimension_id"],
+                update_fields=["latest_created_at"],
+            )
+        empty = [pair for pair in pairs if pair not in latest]
+        if empty:
+            condition = Q()
+            for user_id, object_id in empty:
+                condition |= Q(user_id=user_id, dimension_id=object_id)
+            GoodsGroupRecency.objects.filter(condition, dimension=dimension).delete()
+
+
+def forget(dimension: str, object_id) -> None:
+    """分组对象（IP / 角色 / 品类 / 主题）被删除时清理其全部行。"""
+    GoodsGroupRecency.objects.filter(dimension=dimension, dimension_id=object_id).delete()
+
+
+def rebuild() -> int:
+    """全量重建，返回写入行数。"""
+    GoodsGroupRecency.objects.all().delete()
+    written = 0
+    for dimension in DIMENSIONS:
+        if dimension == GoodsGroupRecency.DIMENSION_CHARACTER:
+            rows = (
+                Goods.characters.through.objects.values("goods__user_id", "character_id")
+                .annotate(latest=Max("goods__created_at"))
+                .values_list("goods__user_id", "character_id", "latest")
+            )
+        else:
+            column = FK_DIMENSIONS[dimension]
+            rows = (
+                Goods.objects.filter(**{f"{column}__isnull": False})
+                .values("user_id", column)
+                .annotate(latest=Max("created_at"))
+                .values_list("user_id", column, "latest")
+            )
+        objects = [
+            GoodsGroupRecency(
+                user_id=user_id, dimension=dimension, dimension_id=object_id, latest_created_at=latest
+            )
+            for user_id, object_id, latest in rows
+        ]
+        GoodsGroupRecency.objects.bulk_create(objects, batch_size=500)
+        written += len(objects)
+    return written
+
+
+def group_latest(dimension: str):
+    """
+    谷子所在分组的最近活动时间表达式（按 (user, dimension, dimension_id) 唯一索引查找）。
+    角色维度取谷子各角色中最新的一个。
+    """
+    recency = GoodsGroupRecency.objects.filter(user_id=OuterRef("user_id"), dimension=dimension)
+    if dimension == GoodsGroupRecency.DIMENSION_CHARACTER:
+        character_ids = Goods.characters.through.objects.filter(
+            goods_id=OuterRef(OuterRef("pk"))
+        ).values("character_id")
+        recency = recency.filter(dimension_id__in=character_ids)
+    else:
+        recency = recency.filter(dimension_id=OuterRef(FK_DIMENSIONS[dimension]))
+    return Subquery(recency.order_by("-latest_created_at").values("latest_created_at")[:1])
+
+
+def order_by_group(queryset, dimension: str):
+    """按分组最近活动倒序排列，同一分组的谷子聚集在一起，分组内按创建时间倒序。"""
+    queryset = queryset.annotate(group_latest=group_latest(dimension))
+    if dimension == GoodsGroupRecency.DIMENSION_CHARACTER:
+        return queryset.order_by("-group_latest", "-created_at")
+    return queryset.order_by("-group_latest", FK_DIMENSIONS[dimension], "-created_at")
@@ -0,0 +1,504 @@
+"""
+统计汇总表（GoodsStatsRollup）的维护与读取。
+
+每件谷子对若干 (维度, 取值) 各贡献「1 件 / quantity / quantity × price」。写入时取谷子变化前后的快照，
+把两者的贡献之差累加到汇总行上（读取受影响的行、计算、一次 upsert、一次删除归零行），
+无筛选的统计接口读取该用户的全部汇总行即可组装出与实时聚合相同的结果（stats_payload）。
+
+趋势按「日」汇总，月 / 周粒度在读取时合并，因此 group_by=month|week|day 都能走汇总表。
+角色关联变化、角色删除、收纳节点删除、IP 作品类型变化等不触发谷子 save 信号，
+由调用方先 snapshots() 记下受影响谷子的快照，变化后 commit() 写入差量。
+"""
+from __future__ import annotations
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Category, Character, Goods, GoodsStatsRollup, IP
+from apps.location.models import StorageNode
+
+# Delta.apply 每条加锁查询包含的 (用户, 维度, 取值) 个数
+LOCK_BATCH = 300
+
+DIM_STATUS = "status"
+DIM_OFFICIAL = "is_official"
+DIM_CATEGORY = "category"
+DIM_IP = "ip"
+DIM_LOCATION = "location"
+DIM_CHARACTER = "character"
+DIM_SUBJECT_TYPE = "subject_type"
+DIM_PURCHASE_DAY = "purchase_day"
+DIM_CREATED_DAY = "created_day"
+DIM_HAS_PRICE = "has_price"
+DIM_HAS_PURCHASE_DATE = "has_purchase_date"
+DIM_HAS_LOCATION = "has_location"
+DIM_HAS_MAIN_PHOTO = "has_main_photo"
+
+# 快照读取的谷子列
+SNAPSHOT_FIELDS = (
+    "user_id",
+    "status",
+    "is_official",
+    "category_id",
+    "ip_id",
+    "location_id",
+    "purchase_date",
+    "created_at",
+    "price",
+    "quantity",
+    "main_photo",
+)
+
+# 谷子上影响汇总的字段（pre_save / update_fields 判断用）
+ROLLUP_FIELDS = {
+    "user", "user_id", "status", "is_official", "category", "category_id", "ip", "ip_id",
+    "location", "location_id", "purchase_date", "price", "quantity", "main_photo",
+}
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+
+
+def _key(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+def _flag(value) -> str:
+    return "1" if value else "0"
+
+
+def keys_of(row: dict, subject_type, character_ids) -> list:
+    """一件谷子贡献的 (维度, 取值) 列表；row 为 SNAPSHOT_FIELDS 对应的字典。"""
+    keys = [
+        (DIM_STATUS, _key(row["status"])),
+        (DIM_OFFICIAL, _key(bool(row["is_official"]))),
+        (DIM_CATEGORY, _key(row["category_id"])),
+        (DIM_IP, _key(row["ip_id"])),
+        (DIM_LOCATION, _key(row["location_id"])),
+        (DIM_SUBJECT_TYPE, _key(subject_type)),
+        (DIM_CREATED_DAY, _key(timezone.localtime(row["created_at"]).date())),
+        (DIM_HAS_PRICE, _flag(row["price"] is not None)),
+        (DIM_HAS_PURCHASE_DATE, _flag(row["purchase_date"] is not None)),
+        (DIM_HAS_LOCATION, _flag(row["location_id"] is not None)),
+        (DIM_HAS_MAIN_PHOTO, _flag(row["main_photo"] is not None)),
+    ]
+    if row["purchase_date"] is not None:
+        keys.append((DIM_PURCHASE_DAY, _key(row["purchase_date"])))
+    # 没有角色的谷子计入空取值（与实时聚合 LEFT JOIN 后的 NULL 分组一致）
+    for character_id in sorted(character_ids) or [None]:
+        keys.append((DIM_CHARACTER, _key(character_id)))
+    return keys
+
+
+def measures_of(row: dict) -> tuple:
+    quantity = row["quantity"] or 0
+    value = (Decimal(quantity) * (row["price"] or ZERO)).quantize(CENT)
+    return quantity, value
+
+
+class Snapshot:
+    """一件谷子在某一时刻对汇总表的贡献。"""
+
+    def __init__(self, row: dict, subject_type, character_ids):
+        self.user_id = row["user_id"]
+        self.row = row
+        self.subject_type = subject_type
+        self.character_ids = set(character_ids)
+        self.quantity, self.value = measures_of(row)
+
+    def keys(self) -> list:
+        return keys_of(self.row, self.subject_type, self.character_ids)
+
+    def with_characters(self, character_ids) -> "Snapshot":
+        return Snapshot(self.row, self.subject_type, character_ids)
+
+
+def snapshots(goods_ids) -> dict:
+    """从数据库读取谷子当前快照（一次查询谷子行，一次查询角色关联）：{谷子 ID: Snapshot}。"""
+    goods_ids = list(goods_ids)
+    if not goods_ids:
+        return {}
+    characters = defaultdict(set)
+    through = Goods.characters.through.objects.filter(goods_id__in=goods_ids)
+    for goods_id, character_id in through.values_list("goods_id", "character_id"):
+        characters[goods_id].add(character_id)
+    return {
+        row["id"]: Snapshot(row, row.pop("ip__subject_type"), characters[row["id"]])
+        for row in Goods.objects.filter(id__in=goods_ids).values(
+            "id", *SNAPSHOT_FIELDS, "ip__subject_type"
+        )
+    }
+
+
+def instance_snapshot(goods, character_ids, base: Snapshot | None = None, update_fields=None) -> Snapshot:
+    """
+    由刚保存的谷子对象构造快照，与数据库中的值一致：
+    属性可能仍是未转换的原始值（如 create(price="12.50")），按字段的 to_python 转换；
+    文件字段保存时写入 name 或空字符串；save(update_fields=...) 未写入的字段沿用 base（保存前快照）。
+    作品类型优先取已加载的 IP，避免查询。
+    """
+    row = {
+        field: Goods._meta.get_field(field).to_python(getattr(goods, field))
+        for field in SNAPSHOT_FIELDS
+        if field != "main_photo"
+    }
+    row["main_photo"] = goods.main_photo.name or ""
+    if base is not None and update_fields is not None:
+        saved = set(update_fields)
+        for field in SNAPSHOT_FIELDS:
+            if field not in saved and field.removesuffix("_id") not in saved:
+                row[field] = base.row[field]
+    if Goods.ip.is_cached(goods) and goods.ip is not None and goods.ip.pk == row["ip_id"]:
+        subject_type = goods.ip.subject_type
+    elif base is not None and base.row["ip_id"] == row["ip_id"]:
+        subject_type = base.subject_type
+    else:
+        subject_type = IP.objects.filter(pk=row["ip_id"]).values_list("subject_type", flat=True).first()
+    return Snapshot(row, subject_type, character_ids)
+
+
+class Delta:
+    """累积 (user, 维度, 取值) -> [谷子数, 数量, 金额] 的增量，apply() 一次写入。"""
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0, 0, ZERO])
+
+    def add(self, snapshot: Snapshot | None, sign: int = 1, keys=None) -> None:
+        if snapshot is None:
+            return
+        for dimension, key in keys if keys is not None else snapshot.keys():
+            entry = self.changes[(snapshot.user_id, dimension, key)]
+            entry[0] += sign
+            entry[1] += sign * snapshot.quantity
+            entry[2] += sign * snapshot.value
+
+    def replace(self, old: Snapshot | None, new: Snapshot | None) -> None:
+        self.add(old, -1)
+        self.add(new, 1)
+
+    def apply(self) -> None:
+        changes = {key: entry for key, entry in self.changes.items() if any(entry)}
+        if not changes:
+            return
+        with transaction.atomic():
+            # 先为尚无汇总行的键插入零值行（已存在则忽略），再对全部键加锁后累加：
+            # 并发写入同一个新键时后到的事务会等待先到的提交，而不是都读到「无行」后各写一个绝对值、丢失增量。
+            # 加锁前行被并发删除（计数归零）时重新插入
+            # 按 (用户, 维度, 取值) 的固定顺序插入与加锁，并发的 apply 不会互相等待成环（死锁）；
+            # 只锁变化的键本身，每批不超过 LOCK_BATCH 个键（SQLite 参数个数限制）
+            rows = {}
+            while len(rows) < len(changes):
+                missing = sorted(key for key in changes if key not in rows)
+                GoodsStatsRollup.objects.bulk_create(
+                    [
+                        GoodsStatsRollup(user_id=user_id, dimension=dimension, key=key)
+                        for user_id, dimension, key in missing
+                    ],
+                    ignore_conflicts=True,
+                )
+                for start in range(0, len(missing), LOCK_BATCH):
+                    condition = Q()
+                    for user_id, dimension, key in missing[start:start + LOCK_BATCH]:
+                        condition |= Q(user_id=user_id, dimension=dimension, key=key)
+                    locked = GoodsStatsRollup.objects.select_for_update().filter(condition)
+                    for row in locked.order_by("user_id", "dimension", "key"):
+                        rows[(row.user_id, row.dimension, row.key)] = row
+
+            updated, empty = [], []
+            for identity, (count, quantity, value) in changes.items():
+                row = rows[identity]
+                row.goods_count += count
+                row.quantity_sum += quantity
+                row.value_sum += value
+                (updated if row.goods_count > 0 else empty).append(row)
+            if updated:
+                # 行已加锁，写回累加后的值（一条 upsert，比 bulk_update 的逐行 CASE 表达式快）
+                GoodsStatsRollup.objects.bulk_create(
+                    [
+                        GoodsStatsRollup(
+                            user_id=row.user_id, dimension=row.dimension, key=row.key,
+                            goods_count=row.goods_count, quantity_sum=row.quantity_sum, value_sum=row.value_sum,
+                        )
+                        for row in updated
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["user", "dimension", "key"],
+                    update_fields=["goods_count", "quantity_sum", "value_sum"],
+                )
+            if empty:
+                GoodsStatsRollup.objects.filter(pk__in=[row.pk for row in empty]).delete()
+
+
+def replace(old: Snapshot | None, new: Snapshot | None) -> None:
+    """一件谷子从 old 变为 new（新建时 old 为 None，删除时 new 为 None）。"""
+    if old is not None and new is not None and (
+        old.user_id == new.user_id
+        and old.quantity == new.quantity
+        and old.value == new.value
+        and old.keys() == new.keys()
+    ):
+        return
+    delta = Delta()
+    delta.replace(old, new)
+    delta.apply()
+
+
+def commit(before: dict) -> None:
+    """
+    批量变化（角色关联、角色删除、位置删除、IP 作品类型变化）：before 为变化前 snapshots() 的结果，
+    重新读取这些谷子的当前快照，把差量一次写入。
+    """
+    if not before:
+        return
+    after = snapshots(before)
+    delta = Delta()
+    for goods_id, snapshot in before.items():
+        delta.replace(snapshot, after.get(goods_id))
+    delta.apply()
+
+
+def aggregate(snapshots_iter) -> dict:
+    """全量汇总：{(user, 维度, 取值): [谷子数, 数量, 金额]}（重建与迁移共用）。"""
+    delta = Delta()
+    for snapshot in snapshots_iter:
+        delta.add(snapshot)
+    return delta.changes
+
+
+def rebuild(user_ids=None, batch_size: int = 500) -> int:
+    """重建指定用户（None 表示全部）的汇总行，返回写入行数。"""
+    goods = Goods.objects.order_by()
+    rollups = GoodsStatsRollup.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        goods = goods.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    def iter_snapshots():
+        ids = list(goods.values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            yield from snapshots(ids[start:start + batch_size]).values()
+
+    totals = aggregate(iter_snapshots())
+    rollups.delete()
+    rows = [
+        GoodsStatsRollup(
+            user_id=user_id,
+            dimension=dimension,
+            key=key,
+            goods_count=count,
+            quantity_sum=quantity,
+            value_sum=value,
+        )
+        for (user_id, dimension, key), (count, quantity, value) in totals.items()
+        if count > 0
+    ]
+    GoodsStatsRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# 读取：组装与 GoodsViewSet.stats 实时聚合相同结构的数据
+# ---------------------------------------------------------------------------
+
+def _int_or_none(key: str):
+    return int(key) if key != "" else None
+
+
+def _bucket(day: datetime.date, group_by: str) -> datetime.date:
+    if group_by == "month":
+        return day.replace(day=1)
+    if group_by == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def _trend(rows: dict, group_by: str, aware: bool, with_value: bool) -> list:
+    buckets = {}
+    for key, row in rows.items():
+        bucket = _bucket(datetime.date.fromisoformat(key), group_by)
+        entry = buckets.setdefault(bucket, [0, 0, ZERO])
+        entry[0] += row.goods_count
+        entry[1] += row.quantity_sum
+        entry[2] += row.value_sum
+    result = []
+    for bucket in sorted(buckets):
+        count, quantity, value = buckets[bucket]
+        if aware and group_by != "day":
+            # 与 TruncMonth / TruncWeek 作用于 DateTimeField 时一致：当前时区的零点
+            label = timezone.make_aware(datetime.datetime.combine(bucket, datetime.time())).isoformat()
+        else:
+            label = bucket.isoformat()
+        item = {"bucket": label, "goods_count": count, "quantity_sum": quantity}
+        if with_value:
+            item["value_sum"] = value
+        result.append(item)
+    return result
+
+
+def _ranked(rows: dict, top_n=None) -> list:
+    ordered = sorted(rows.items(), key=lambda item: (-item[1].goods_count, item[0]))
+    return ordered[:top_n] if top_n is not None else ordered
+
+
+def stats_payload(user_id, top_n: int, group_by: str) -> dict:
+    """由汇总表组装统计数据（meta 由调用方填写）：一次读取该用户全部汇总行。"""
+    by_dimension = defaultdict(dict)
+    for row in GoodsStatsRollup.objects.filter(user_id=user_id):
+        by_dimension[row.dimension][row.key] = row
+    return build_payload(by_dimension, top_n, group_by)
+
+
+def build_payload(by_dimension: dict, top_n: int, group_by: str) -> dict:
+    """
+    由 {维度: {取值: 行}} 组装统计数据，行只需 goods_count / quantity_sum / value_sum 三个属性
+    （汇总表行，或 apps/goods/stats_engine.py 列式引擎的计算结果）。TopN 中的品类 / IP / 位置 / 角色各查询一次名称。
+    """
+    by_dimension = defaultdict(dict, by_dimension)
+
+    def flag_count(dimension, flag):
+        row = by_dimension[dimension].get(flag)
+        return row.goods_count if row else 0
+
+    status_rows = by_dimension[DIM_STATUS].values()
+    overview = {
+        "goods_count": sum(row.goods_count for row in status_rows),
+        "quantity_sum": sum(row.quantity_sum for row in status_rows),
+        "value_sum": sum((row.value_sum for row in status_rows), ZERO),
+    }
+    for name, dimension in (
+        ("price", DIM_HAS_PRICE),
+        ("purchase_date", DIM_HAS_PURCHASE_DATE),
+        ("location", DIM_HAS_LOCATION),
+        ("main_photo", DIM_HAS_MAIN_PHOTO),
+    ):
+        overview[f"with_{name}_count"] = flag_count(dimension, "1")
+        overview[f"missing_{name}_count"] = flag_count(dimension, "0")
+
+    status_labels = dict(Goods.STATUS_CHOICES)
+    subject_type_labels = dict(IP.SUBJECT_TYPE_CHOICES)
+
+    status_dist = [
+        {
+            "status": key,
+            "goods_count": row.goods_count,
+            "quantity_sum": row.quantity_sum,
+            "label": status_labels.get(key, key),
+        }
+        for key, row in _ranked(by_dimension[DIM_STATUS])
+    ]
+    official_dist = [
+        {
+            "is_official": key == "1",
+            "goods_count": row.goods_count,
+            "quantity_sum": row.quantity_sum,
+            "label": "官谷" if key == "1" else "同人/非官谷",
+        }
+        for key, row in _ranked(by_dimension[DIM_OFFICIAL])
+    ]
+    ip_subject_type_dist = [
+        {
+            "ip__subject_type": _int_or_none(key),
+            "goods_count": row.goods_count,
+            "quantity_sum": row.quantity_sum,
+            "label": subject_type_labels.get(_int_or_none(key), "未知"),
+        }
+        for key, row in _ranked(by_dimension[DIM_SUBJECT_TYPE])
+    ]
+
+    def measured(row):
+        return {
+            "goods_count": row.goods_count,
+            "quantity_sum": row.quantity_sum,
+            "value_sum": row.value_sum,
+        }
+
+    def top(dimension):
+        ranked = _ranked(by_dimension[dimension], top_n)
+        ids = [_int_or_none(key) for key, _ in ranked]
+        return ranked, [object_id for object_id in ids if object_id is not None]
+
+    ranked, ids = top(DIM_CATEGORY)
+    categories = {
+        row[0]: row[1:]
+        for row in Category.objects.filter(id__in=ids).values_list("id", "name", "path_name", "color_tag")
+    }
+    category_top = []
+    for key, row in ranked:
+        name, path_name, color_tag = categories.get(_int_or_none(key), (None, None, None))
+        category_top.append({
+            "category_id": _int_or_none(key),
+            "category__name": name,
+            "category__path_name": path_name,
+            "category__color_tag": color_tag,
+            **measured(row),
+        })
+
+    ranked, ids = top(DIM_IP)
+    ips = {row[0]: row[1:] for row in IP.objects.filter(id__in=ids).values_list("id", "name", "subject_type")}
+    ip_top = []
+    for key, row in ranked:
+        name, subject_type = ips.get(_int_or_none(key), (None, None))
+        ip_top.append({
+            "ip_id": _int_or_none(key),
+            "ip__name": name,
+            "ip__subject_type": subject_type,
+            **measured(row),
+            "subject_type_label": subject_type_labels.get(subject_type, None),
+        })
+
+    ranked, ids = top(DIM_LOCATION)
+    nodes = {row[0]: row[1:] for row in StorageNode.objects.filter(id__in=ids).values_list("id", "name", "path_name")}
+    location_top = []
+    for key, row in ranked:
+        name, path_name = nodes.get(_int_or_none(key), (None, None))
+        location_top.append({
+            "location_id": _int_or_none(key),
+            "location__name": name,
+            "location__path_name": path_name,
+            **measured(row),
+        })
+
+    ranked, ids = top(DIM_CHARACTER)
+    characters = {
+        row[0]: row[1:]
+        for row in Character.objects.filter(id__in=ids).values_list("id", "name", "ip_id", "ip__name")
+    }
+    character_top = []
+    for key, row in ranked:
+        name, ip_id, ip_name = characters.get(_int_or_none(key), (None, None, None))
+        character_top.append({
+            "characters__id": _int_or_none(key),
+            "characters__name": name,
+            "characters__ip__id": ip_id,
+            "characters__ip__name": ip_name,
+            **measured(row),
+        })
+
+    return {
+        "overview": overview,
+        "distributions": {
+            "status": status_dist,
+            "is_official": official_dist,
+            "ip_subject_type": ip_subject_type_dist,
+            "category_top": category_top,
+            "ip_top": ip_top,
+            "character_top": character_top,
+            "location_top": location_top,
+        },
+        "trends": {
+            "purchase_date": _trend(by_dimension[DIM_PURCHASE_DAY], group_by, aware=False, with_value=True),
+            "created_at": _trend(by_dimension[DIM_CREATED_DAY], group_by, aware=True, with_value=False),
+        },
+    }
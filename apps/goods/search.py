@@ -0,0 +1,297 @@
+"""
+谷子全文检索：搜索文档 / 搜索键的构建与增量维护，以及各 ViewSet 使用的搜索后端。
+
+- GoodsSearchDocument：每个谷子一行冗余文本（名称 / IP 名与关键词 / 角色名），任何数据库都可用。
+- goods_search_fts：SQLite FTS5（trigram 分词）外部内容表，由触发器与文档表同步，支持任意子串
+  匹配与 bm25 排序。非 SQLite 或 SQLite 未编译 FTS5 时自动退化为只扫文档表的 icontains。
+- SearchKey：IP / 角色 / 谷子名称的原文、全拼、首字母后缀键（见 textkeys.py），支持 lx / liuying
+  这类拼音输入，以及 IP / 角色列表搜索的索引前缀查询。
+
+文档文本与搜索词都经过 fold_text（全角转半角、小写、繁体转简体），因此 崩壞 与 崩坏 等价。
+与原先 SearchFilter 的 icontains 语义保持一致：多个词之间为 AND，每个词命中任意一列即可。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework import filters as drf_filters
+
+from core import fts
+
+from . import textkeys
+from .models import Character, Goods, GoodsSearchDocument, GoodsSearchIndex, IP, IPKeyword, SearchKey
+
+FTS_TABLE = "goods_search_fts"
+
+# trigram 分词最短只能匹配 3 个字符，更短的词走文档表的 icontains
+FTS_MIN_TERM_LENGTH = 3
+
+TEXT_FIELDS = ("name", "ip_text", "character_text")
+
+# SQLite 单条语句的变量上限较低（老版本 999），分批处理
+BATCH_SIZE = 500
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def build_documents(goods_ids: Iterable) -> list:
+    """批量计算谷子的搜索文档（不写库），查询次数与谷子数量无关。"""
+    goods_rows = list(
+        Goods.objects.filter(id__in=list(goods_ids)).values_list("id", "name", "ip_id")
+    )
+    if not goods_rows:
+        return []
+
+    ip_ids = {ip_id for _, _, ip_id in goods_rows}
+    ip_names = dict(IP.objects.filter(id__in=ip_ids).values_list("id", "name"))
+    ip_keywords = defaultdict(list)
+    for ip_id, value in IPKeyword.objects.filter(ip_id__in=ip_ids).values_list("ip_id", "value"):
+        ip_keywords[ip_id].append(value)
+
+    character_names = defaultdict(list)
+    through = Goods.characters.through.objects.filter(
+        goods_id__in=[goods_id for goods_id, _, _ in goods_rows]
+    ).values_list("goods_id", "character__name")
+    for goods_id, name in through:
+        character_names[goods_id].append(name)
+
+    fold = textkeys.fold_text
+    return [
+        GoodsSearchDocument(
+            goods_id=goods_id,
+            name=fold(name),
+            ip_text=fold(" ".join([ip_names.get(ip_id, ""), *ip_keywords[ip_id]]).strip()),
+            character_text=fold(" ".join(character_names[goods_id])),
+        )
+        for goods_id, name, ip_id in goods_rows
+    ]
+
+
+def reindex_goods(goods_ids: Iterable) -> int:
+    """重新生成指定谷子的搜索文档（upsert），返回写入条数。已删除的谷子会被忽略。"""
+    goods_ids = list(dict.fromkeys(goods_ids))
+    written = 0
+    for batch in _chunks(goods_ids, BATCH_SIZE):
+        documents = build_documents(batch)
+        GoodsSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["goods"],
+            update_fields=list(TEXT_FIELDS),
+        )
+        written += len(documents)
+    return written
+
+
+def reindex_queryset(goods_queryset) -> int:
+    return reindex_goods(goods_queryset.values_list("id", flat=True))
+
+
+def rebuild_index(batch_size: int = BATCH_SIZE) -> int:
+    """全量重建：清空文档表后按批重新生成（FTS 表由触发器同步），返回文档条数。"""
+    GoodsSearchDocument.objects.all().delete()
+    goods_ids = list(Goods.objects.order_by("id").values_list("id", flat=True))
+    written = 0
+    for batch in _chunks(goods_ids, batch_size):
+        documents = build_documents(batch)
+        GoodsSearchDocument.objects.bulk_create(documents)
+        written += len(documents)
+    return written
+
+
+# ---------------------------------------------------------------------------
+# 搜索键（SearchKey）
+# ---------------------------------------------------------------------------
+
+def _ip_texts(ip_ids) -> dict:
+    texts = defaultdict(list)
+    for ip_id, name in IP.objects.filter(id__in=ip_ids).values_list("id", "name"):
+        texts[ip_id].append(name)
+    for ip_id, value in IPKeyword.objects.filter(ip_id__in=ip_ids).values_list("ip_id", "value"):
+        texts[ip_id].append(value)
+    return texts
+
+
+def _write_keys(entity: str, column: str, texts: dict, raw: bool = True) -> int:
+    """用 texts（{对象ID: [文本, ...]}）整体替换这些对象的搜索键。"""
+    SearchKey.objects.filter(entity=entity, **{f"{column}__in": list(texts)}).delete()
+    rows = []
+    for object_id, values in texts.items():
+        keys = set()
+        for text in values:
+            keys |= textkeys.search_keys(text, raw=raw)
+        rows.extend(SearchKey(entity=entity, key=key, **{column: object_id}) for key in keys)
+    SearchKey.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def reindex_ip_keys(ip_ids: Iterable) -> int:
+    written = 0
+    for batch in _chunks(list(dict.fromkeys(ip_ids)), BATCH_SIZE):
+        written += _write_keys(SearchKey.ENTITY_IP, "ip_id", _ip_texts(batch))
+    return written
+
+
+def reindex_character_keys(character_ids: Iterable) -> int:
+    written = 0
+    for batch in _chunks(list(dict.fromkeys(character_ids)), BATCH_SIZE):
+        texts = {
+            character_id: [name]
+            for character_id, name in Character.objects.filter(id__in=batch).values_list("id", "name")
+        }
+        written += _write_keys(SearchKey.ENTITY_CHARACTER, "character_id", texts)
+    return written
+
+
+def reindex_goods_keys(goods_ids: Iterable) -> int:
+    """谷子名称的原文子串已由 FTS / 搜索文档覆盖，这里只生成拼音键。"""
+    if not textkeys.PINYIN_ENABLED:
+        return 0
+    written = 0
+    for batch in _chunks(list(dict.fromkeys(goods_ids)), BATCH_SIZE):
+        texts = {
+            goods_id: [name]
+            for goods_id, name in Goods.objects.filter(id__in=batch).values_list("id", "name")
+        }
+        written += _write_keys(SearchKey.ENTITY_GOODS, "goods_id", texts, raw=False)
+    return written
+
+
+def rebuild_keys() -> int:
+    """全量重建搜索键，返回写入行数。"""
+    SearchKey.objects.all().delete()
+    return (
+        reindex_ip_keys(IP.objects.values_list("id", flat=True))
+        + reindex_character_keys(Character.objects.values_list("id", flat=True))
+        + reindex_goods_keys(Goods.objects.values_list("id", flat=True))
+    )
+
+
+def matching_keys(entity: str, token: str, column: str):
+    """前缀匹配 token 的对象 ID 子查询：key >= token AND key < token + U+10FFFF，走 (entity, key) 索引。"""
+    return SearchKey.objects.filter(
+        entity=entity,
+        key__gte=token,
+        key__lt=token + textkeys.PREFIX_UPPER_BOUND,
+    ).values(column)
+
+
+def ip_key_condition(token: str, field: str = "pk") -> Q:
+    return Q(**{f"{field}__in": matching_keys(SearchKey.ENTITY_IP, token, "ip_id")})
+
+
+def character_key_condition(token: str, field: str = "pk") -> Q:
+    return Q(**{f"{field}__in": matching_keys(SearchKey.ENTITY_CHARACTER, token, "character_id")})
+
+
+def fts_available() -> bool:
+    return fts.fts5_table_exists(FTS_TABLE)
+
+
+def optimize_fts() -> None:
+    """批量写入后合并 FTS5 段文件（b-tree 合并），减少后续查询需要扫描的段数。"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def apply_search(queryset, terms: list[str], rank: bool = True):
+    """
+    在谷子查询集上应用搜索条件。
+
+    长词合并为一次 FTS5 MATCH（走倒排索引，并按 bm25 排序）；短词以及不支持 FTS5 的环境
+    退化为搜索文档表上的 icontains，始终只 JOIN 一张单值表，不会产生重复行，也无需 distinct。
+    """
+    use_fts = fts_available()
+    terms = [term for term in (textkeys.fold_text(t).strip() for t in terms) if term]
+    # 纯字母的词可能是拼音 / 首字母，需要与搜索键 OR，不能并入 MATCH JOIN
+    pinyin_terms = [t for t in terms if textkeys.PINYIN_ENABLED and textkeys.is_pinyin_like(t)]
+    long_terms = [
+        t for t in terms
+        if use_fts and len(t) >= FTS_MIN_TERM_LENGTH and t not in pinyin_terms
+    ]
+    short_terms = [t for t in terms if t not in long_terms and t not in pinyin_terms]
+
+    if long_terms:
+        queryset = queryset.filter(
+            search_document__fts__fulltext__match=fts.phrase_query(long_terms)
+        )
+    for term in short_terms:
+        queryset = queryset.filter(_document_condition(term))
+    for term in pinyin_terms:
+        queryset = queryset.filter(_pinyin_condition(term, use_fts))
+
+    if long_terms and rank:
+        queryset = queryset.order_by("search_document__fts__rank", *Goods._meta.ordering)
+    return queryset
+
+
+def _document_condition(term: str) -> Q:
+    condition = Q()
+    for field in TEXT_FIELDS:
+        condition |= Q(**{f"search_document__{field}__icontains": term})
+    return condition
+
+
+def _pinyin_condition(term: str, use_fts: bool) -> Q:
+    """原文命中（FTS 子查询或文档 icontains）OR 谷子名 / IP / 角色的拼音键前缀命中。"""
+    if use_fts and len(term) >= FTS_MIN_TERM_LENGTH:
+        text_condition = Q(
+            search_document__id__in=GoodsSearchIndex.objects.filter(
+                fulltext__match=fts.phrase_query([term])
+            ).values("document_id")
+        )
+    else:
+        text_condition = _document_condition(term)
+    goods_with_character = Goods.characters.through.objects.filter(
+        character_key_condition(term, field="character_id")
+    ).values("goods_id")
+    return (
+        text_condition
+        | Q(id__in=matching_keys(SearchKey.ENTITY_GOODS, term, "goods_id"))
+        | ip_key_condition(term, field="ip_id")
+        | Q(id__in=goods_with_character)
+    )
+
+
+class GoodsSearchFilter(drf_filters.SearchFilter):
+    """
+    基于搜索文档 / FTS5 的 ?search= 后端，替代跨 IP / 关键词 / 角色多值 JOIN 的 icontains 搜索。
+    参数名与分词规则与 DRF SearchFilter 相同；列表接口按相关度排序，相关度相同再按谷子默认排序，
+    统计等聚合接口只做过滤（避免排序列混入 GROUP BY）。
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return apply_search(queryset, terms, rank=getattr(view, "action", None) == "list")
+
+
+class SearchKeyFilter(drf_filters.SearchFilter):
+    """
+    IP / 角色列表的 ?search= 后端：每个词归一化后在 SearchKey 上做索引前缀查询，
+    支持子串、拼音、首字母与繁简混输。角色同时匹配其所属 IP 的名称与关键词（与原 search_fields 一致）。
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        for term in terms:
+            for token in textkeys.query_tokens(term):
+                queryset = queryset.filter(self.token_condition(queryset.model, token))
+        return queryset
+
+    @staticmethod
+    def token_condition(model, token: str) -> Q:
+        if model is IP:
+            return ip_key_condition(token)
+        if model is Character:
+            return character_key_condition(token) | ip_key_condition(token, field="ip_id")
+        raise TypeError(f"SearchKeyFilter 不支持 {model.__name__}")
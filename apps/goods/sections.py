@@ -0,0 +1,119 @@
+"""
+分段分组列表（?group_by=...&layout=sections）。
+
+- 分组头：对筛选后的谷子做一次 GROUP BY 聚合，得到每个分组的名称、谷子数量与最新创建时间，
+  按最新创建时间倒序排列（分页针对分组）；
+- 分组内容：一次窗口函数查询取出本页每个分组最新的 N 件谷子；
+- 加载更多：每个分组返回 ``next`` 游标，客户端以 ?group_by=...&section=<分组ID>&cursor=<next>
+  继续按创建时间倒序翻页（未归入任何分组的谷子，section 取 none）。
+"""
+from __future__ import annotations
+
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+
+from .models import Goods
+
+LAYOUT_PARAM = "layout"
+LAYOUT_SECTIONS = "sections"
+SECTION_PARAM = "section"
+SECTION_SIZE_PARAM = "section_size"
+NONE_SECTION = "none"
+
+DEFAULT_SECTION_SIZE = 6
+MAX_SECTION_SIZE = 50
+
+# 分组维度 -> (谷子上的分组列, 分组名称)
+GROUPS = {
+    "ip": ("ip_id", "ip__name"),
+    "character": ("characters", "characters__name"),
+    "category": ("category_id", "category__name"),
+    "theme": ("theme_id", "theme__name"),
+}
+
+# 分组内排序（与游标分页的 -created_at 全序一致）
+SECTION_ORDERING = ("-created_at", "-id")
+
+
+def wants_sections(request) -> bool:
+    return request.query_params.get(LAYOUT_PARAM) == LAYOUT_SECTIONS
+
+
+def get_section_size(request) -> int:
+    try:
+        size = int(request.query_params.get(SECTION_SIZE_PARAM, DEFAULT_SECTION_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_SECTION_SIZE
+    if size <= 0:
+        return DEFAULT_SECTION_SIZE
+    return min(size, MAX_SECTION_SIZE)
+
+
+def parse_section(value: str):
+    """?section= 取值：分组 ID，或 none 表示未归入任何分组。"""
+    if value == NONE_SECTION:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({SECTION_PARAM: f"应为分组 ID 或 {NONE_SECTION}"})
+
+
+def section_filter(dimension: str, group_id) -> Q:
+    column = GROUPS[dimension][0]
+    if group_id is None:
+        return Q(**{f"{column}__isnull": True})
+    return Q(**{column: group_id})
+
+
+def _scoped(queryset):
+    """以主键子查询重新起步，分组用的 JOIN 不会与筛选条件（角色筛选、搜索排名、DISTINCT）互相影响。"""
+    return Goods.objects.filter(pk__in=queryset.values("pk"))
+
+
+def headers(queryset, dimension: str) -> list:
+    """全部分组头（一次聚合查询）：[{"group": {"id", "name"} | None, "count"}]，按分组最新谷子倒序。"""
+    column, name = GROUPS[dimension]
+    rows = (
+        _scoped(queryset)
+        .values(column, name)
+        .annotate(goods_count=Count("id"), latest=Max("created_at"))
+        .order_by(F("latest").desc(), F(column).asc(nulls_last=True))
+        .values_list(column, name, "goods_count")
+    )
+    return [
+        {
+            "group": None if group_id is None else {"id": group_id, "name": group_name},
+            "count": goods_count,
+        }
+        for group_id, group_name, goods_count in rows
+    ]
+
+
+def first_items(queryset, dimension: str, group_ids: list, size: int) -> dict:
+    """本页各分组最新的 size 件谷子 ID（一次窗口函数查询）：{分组 ID: [谷子 ID, ...]}。"""
+    column = GROUPS[dimension][0]
+    ids = [group_id for group_id in group_ids if group_id is not None]
+    condition = Q(**{f"{column}__in": ids})
+    if None in group_ids:
+        condition |= Q(**{f"{column}__isnull": True})
+    ordering = [
+        F(field[1:]).desc() if field.startswith("-") else F(field).asc()
+        for field in SECTION_ORDERING
+    ]
+    rows = (
+        _scoped(queryset)
+        .filter(condition)
+        .annotate(
+            section=F(column),
+            position=Window(RowNumber(), partition_by=F(column), order_by=ordering),
+        )
+        .filter(position__lte=size)
+        .order_by("section", "position")
+        .values_list("section", "id")
+    )
+    result = {group_id: [] for group_id in group_ids}
+    for group_id, goods_id in rows:
+        result.setdefault(group_id, []).append(goods_id)
+    return result
@@ -23,17 +23,25 @@ from .theme import (
     ThemeSimpleSerializer,
 )
 from .goods import (
+    GoodsCardSerializer,
     GoodsDetailSerializer,
     GoodsDuplicateCandidateSerializer,
     GoodsListSerializer,
     GoodsMoveSerializer,
+    GoodsRowSerializer,
     GuziImageSerializer,
 )
+from .compound import (
+    IncludedCharacterSerializer,
+    IncludedLocationSerializer,
+    IncludedUserSerializer,
+)
 from .showcase import (
     AddGoodsToShowcaseSerializer,
     MoveGoodsInShowcaseSerializer,
     RemoveGoodsFromShowcaseSerializer,
     ShowcaseDetailSerializer,
+    ShowcaseGoodsRowSerializer,
     ShowcaseGoodsSerializer,
     ShowcaseListSerializer,
 )
@@ -74,13 +82,20 @@ __all__ = [
     # Goods
     "GuziImageSerializer",
     "GoodsListSerializer",
+    "GoodsCardSerializer",
+    "GoodsRowSerializer",
     "GoodsDetailSerializer",
     "GoodsDuplicateCandidateSerializer",
     "GoodsMoveSerializer",
+    # Compound
+    "IncludedCharacterSerializer",
+    "IncludedLocationSerializer",
+    "IncludedUserSerializer",
     # Showcase
     "ShowcaseListSerializer",
     "ShowcaseDetailSerializer",
     "ShowcaseGoodsSerializer",
+    "ShowcaseGoodsRowSerializer",
     "AddGoodsToShowcaseSerializer",
     "RemoveGoodsFromShowcaseSerializer",
     "MoveGoodsInShowcaseSerializer",
@@ -3,7 +3,7 @@
 """
 from rest_framework import serializers
 
-from ..models import Category
+from ..models import Category, CategoryClosure
 
 
 class CategorySimpleSerializer(serializers.ModelSerializer):
@@ -66,6 +66,16 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
         model = Category
         fields = ("id", "name", "parent", "path_name", "color_tag", "order")
     
+    def validate_parent(self, value):
+        """禁止把品类挂到自身或自身的子孙节点下（会形成环）"""
+        if value is None or self.instance is None:
+            return value
+        if CategoryClosure.objects.filter(
+            ancestor_id=self.instance.pk, descendant_id=value.pk
+        ).exists():
+            raise serializers.ValidationError("不能将品类移动到自身或其子品类下")
+        return value
+    
     def create(self, validated_data):
         """创建品类时，如果未提供 path_name，则根据父节点自动生成"""
         path_name = validated_data.get("path_name")
@@ -3,6 +3,7 @@
 """
 from rest_framework import serializers
 
+from core.loaders import BatchListSerializer
 from ..models import Character, IP
 from .fields import AvatarField
 from .ip import IPSimpleSerializer
@@ -26,3 +27,4 @@ class CharacterSimpleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Character
         fields = ("id", "name", "ip", "ip_id", "avatar", "gender")
+        list_serializer_class = BatchListSerializer
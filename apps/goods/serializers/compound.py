@@ -0,0 +1,33 @@
+"""
+侧载（compound，?format=compound）响应中 ``included`` 部分使用的序列化器。
+被引用对象之间也只通过外键 ID 关联（例如角色的 ip 为 IP ID），不再嵌套。
+"""
+from rest_framework import serializers
+
+from apps.location.models import StorageNode
+from apps.users.models import User as UserModel
+from ..models import Character
+from .fields import AvatarField
+
+
+class IncludedCharacterSerializer(serializers.ModelSerializer):
+    ip = serializers.PrimaryKeyRelatedField(read_only=True, help_text="所属IP作品ID")
+    avatar = AvatarField(read_only=True)
+
+    class Meta:
+        model = Character
+        fields = ("id", "name", "ip", "avatar", "gender")
+
+
+class IncludedLocationSerializer(serializers.ModelSerializer):
+    parent = serializers.PrimaryKeyRelatedField(read_only=True, help_text="父节点ID")
+
+    class Meta:
+        model = StorageNode
+        fields = ("id", "name", "parent", "path_name")
+
+
+class IncludedUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserModel
+        fields = ("id", "username")
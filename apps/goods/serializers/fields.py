@@ -7,6 +7,7 @@ from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from rest_framework import serializers
 
+from core.loaders import prefetch_relation
 from ..models import IPKeyword
 from ..utils import compress_image
 
@@ -14,6 +15,10 @@ from ..utils import compress_image
 class KeywordsField(serializers.Field):
     """自定义关键词字段：读取时返回对象数组，写入时接收字符串数组"""
 
+    def prime(self, instances):
+        """列表序列化前批量加载本批 IP 的关键词（见 core/loaders.py）"""
+        prefetch_relation(instances, self.source)
+
     def to_representation(self, value):
         """读取时：返回关键词对象数组"""
         if value is None:
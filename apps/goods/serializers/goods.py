@@ -6,7 +6,9 @@ from rest_framework import serializers
 from apps.users.models import User as UserModel
 from ..models import Category, Character, Goods, GuziImage, IP, Theme
 from apps.location.models import StorageNode
+from core.loaders import BatchListSerializer, get_loader
 from core.permissions import is_admin
+from ..loaders import LocationPathLoader, UserSummaryLoader
 from ..utils import compress_image
 from .category import CategorySimpleSerializer
 from .character import CharacterSimpleSerializer
@@ -113,8 +115,24 @@ class GoodsListSerializer(serializers.ModelSerializer):
             "is_official",
             "order",  # 自定义排序值
         )
+        list_serializer_class = BatchListSerializer
+        # 方法字段依赖的关联（供 core/planner.py 推导 JOIN）
+        query_requires = {"user": ("user",), "location_path": ("location",)}
+
+    # 用户 / 位置未随谷子一起加载时，按批取数（见 core/loaders.py），避免逐个查询
+    def prime_user(self, instances):
+        get_loader(self.context, UserSummaryLoader).prime(
+            obj.user_id for obj in instances if not Goods.user.is_cached(obj)
+        )
+
+    def prime_location_path(self, instances):
+        get_loader(self.context, LocationPathLoader).prime(
+            obj.location_id for obj in instances if not Goods.location.is_cached(obj)
+        )
 
     def get_user(self, obj):
+        if not Goods.user.is_cached(obj):
+            return get_loader(self.context, UserSummaryLoader).load(obj.user_id)
         user = getattr(obj, "user", None)
         if not user:
             return None
@@ -124,11 +142,36 @@ class GoodsListSerializer(serializers.ModelSerializer):
         }
 
     def get_location_path(self, obj):
+        if not Goods.location.is_cached(obj):
+            return get_loader(self.context, LocationPathLoader).load(obj.location_id)
         if obj.location:
             return obj.location.path_name or obj.location.name
         return None
 
 
+class GoodsCardSerializer(GoodsListSerializer):
+    """
+    列表卡片读模型（GoodsCard）中预先序列化的嵌套部分，构建时不传 request（URL 保持相对路径）。
+    """
+
+    class Meta(GoodsListSerializer.Meta):
+        fields = ("user", "ip", "characters", "category", "theme", "location_path")
+
+
+class GoodsRowSerializer(serializers.ModelSerializer):
+    """
+    列表中直接取自谷子行的标量字段（不涉及任何关联表），渲染时与卡片按 GoodsListSerializer 的字段顺序合并。
+    """
+
+    class Meta:
+        model = Goods
+        fields = tuple(
+            field
+            for field in GoodsListSerializer.Meta.fields
+            if field not in GoodsCardSerializer.Meta.fields
+        )
+
+
 class GoodsDetailSerializer(serializers.ModelSerializer):
     """
     详情页序列化器，返回完整信息及补充图片。
@@ -229,6 +272,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
             "additional_photos",
             "order",  # 自定义排序值
         )
+        query_requires = {"user": ("user",), "location_path": ("location",)}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -239,9 +283,11 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         if is_admin(user):
             return
 
-        # 私有外键只允许指向当前用户的数据，避免越权关联
-        self.fields["theme_id"].queryset = Theme.objects.filter(user=user)
-        self.fields["location"].queryset = StorageNode.objects.filter(user=user)
+        # 私有外键只允许指向当前用户的数据，避免越权关联（按需字段模式下可能已被裁剪）
+        if "theme_id" in self.fields:
+            self.fields["theme_id"].queryset = Theme.objects.filter(user=user)
+        if "location" in self.fields:
+            self.fields["location"].queryset = StorageNode.objects.filter(user=user)
 
     def validate_user_id(self, value):
         request = self.context.get("request")
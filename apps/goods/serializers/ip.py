@@ -3,6 +3,8 @@ IP作品相关的序列化器
 """
 from rest_framework import serializers
 
+from core.loaders import BatchListSerializer, get_loader
+from ..loaders import CharacterCountLoader
 from ..models import IP, IPKeyword
 from .fields import KeywordsField
 
@@ -24,14 +26,20 @@ class IPSimpleSerializer(serializers.ModelSerializer):
     class Meta:
         model = IP
         fields = ("id", "name", "subject_type", "order", "keywords", "character_count")
+        list_serializer_class = BatchListSerializer
+
+    def prime_character_count(self, instances):
+        get_loader(self.context, CharacterCountLoader).prime(
+            obj.id for obj in instances if not hasattr(obj, "character_count")
+        )
 
     def get_character_count(self, obj):
         """统计IP下的角色数量"""
         # 如果使用了annotate预计算，直接使用结果
         if hasattr(obj, 'character_count'):
             return obj.character_count
-        # 否则查询数据库
-        return obj.characters.count()
+        # 否则按批统计（同一请求内所有 IP 合并为一次查询）
+        return get_loader(self.context, CharacterCountLoader).load(obj.id)
 
 
 class IPDetailSerializer(serializers.ModelSerializer):
@@ -42,6 +50,7 @@ class IPDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = IP
         fields = ("id", "name", "subject_type", "order", "keywords")
+        list_serializer_class = BatchListSerializer
 
     def create(self, validated_data):
         """创建IP时同时创建关键词"""
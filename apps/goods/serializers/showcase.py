@@ -3,6 +3,8 @@
 """
 from rest_framework import serializers
 
+from core.loaders import BatchListSerializer, get_loader
+from ..loaders import PreviewPhotoLoader, main_photo_url
 from ..models import Goods, Showcase, ShowcaseGoods
 from ..utils import compress_image
 from .goods import GoodsListSerializer
@@ -32,6 +34,15 @@ class ShowcaseGoodsSerializer(serializers.ModelSerializer):
             "updated_at",
         )
         read_only_fields = ("id", "created_at", "updated_at")
+        list_serializer_class = BatchListSerializer
+
+
+class ShowcaseGoodsRowSerializer(serializers.ModelSerializer):
+    """展柜谷子关联的自身字段（侧载响应中 goods 由 apps/goods/compound.py 生成）"""
+
+    class Meta:
+        model = ShowcaseGoods
+        fields = ("id", "order", "notes", "created_at", "updated_at")
 
 
 class ShowcaseListSerializer(serializers.ModelSerializer):
@@ -53,15 +64,33 @@ class ShowcaseListSerializer(serializers.ModelSerializer):
             "created_at",
         )
         read_only_fields = ("id", "created_at")
+        list_serializer_class = BatchListSerializer
+
+    @staticmethod
+    def _has_prefetched_goods(obj):
+        return "showcase_goods" in getattr(obj, "_prefetched_objects_cache", {})
+
+    def prime_preview_photos(self, instances):
+        get_loader(self.context, PreviewPhotoLoader).prime(
+            obj.pk for obj in instances if not self._has_prefetched_goods(obj)
+        )
 
     def get_preview_photos(self, obj):
         """
         返回该展柜下前四个谷子的主图地址（与 Goods.main_photo 输出风格保持一致）。
-        依赖视图层的 prefetch_related，避免 N+1。
+        视图已 prefetch 展柜谷子时直接使用，否则整批展柜合并为一次查询（PreviewPhotoLoader）。
         """
         request = self.context.get("request")
         photos = []
 
+        if not self._has_prefetched_goods(obj):
+            for name in get_loader(self.context, PreviewPhotoLoader).load(obj.pk):
+                url = main_photo_url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                photos.append(url)
+            return photos
+
         # obj.showcase_goods 来自 related_name="showcase_goods"
         for sg in obj.showcase_goods.all()[:4]:
             goods = getattr(sg, "goods", None)
@@ -8,6 +8,10 @@ import random
 from collections import defaultdict
 from datetime import timedelta
 
+from core import closure
+
+from .models import CategoryClosure
+
 
 class GoodsSimilarityCalculator:
     """
@@ -31,6 +35,9 @@ class GoodsSimilarityCalculator:
         'purchase_proximity': 6,
     }
 
+    # 上界与阈值比较时的浮点误差余量
+    BOUND_EPSILON = 1e-9
+
     def __init__(self, category_tree_cache=None):
         """
         初始化相似度计算器
@@ -210,6 +217,47 @@ class GoodsSimilarityCalculator:
 
         return 0.0
 
+    def unrelated_upper_bound(self, goods):
+        """
+        与 goods 的 IP、主题、角色、品类、父级品类均不相同的谷子，相似度的上界
+
+        作品类型相同（IP 9.9 分）、主题不同（3 分）、角色不重叠（0 分）、祖父级品类相同（5.4 分）、
+        单价与入手日期最接近时的得分之和；goods 没有作品类型 / 主题 / 单价 / 入手日期时相应取更低的上界。
+        """
+        return self.upper_bound_for(
+            bool(getattr(goods.ip, 'subject_type', None)),
+            bool(goods.theme_id),
+            goods.price is not None,
+            goods.purchase_date is not None,
+        )
+
+    def upper_bound_for(self, has_subject_type, has_theme, has_price, has_purchase_date):
+        """unrelated_upper_bound 的取值只取决于 goods 的这四项是否为空。"""
+        bound = self.WEIGHTS['ip_match'] * 0.33 if has_subject_type else 0.0
+        bound += self.WEIGHTS['theme_match'] * 0.2 if has_theme else 0.0
+        bound += self.WEIGHTS['category_hierarchy'] * 0.3
+        bound += self.WEIGHTS['price_range'] if has_price else self.WEIGHTS['price_range'] * 0.5
+        bound += (
+            self.WEIGHTS['purchase_proximity'] if has_purchase_date
+            else self.WEIGHTS['purchase_proximity'] * 0.43
+        )
+        return bound
+
+    def can_prune(self, seed, min_similarity):
+        """上界严格低于阈值（留出浮点误差余量）时，与种子无共同 IP / 主题 / 角色 / 品类 / 父级品类的谷子可直接跳过。"""
+        return self.unrelated_upper_bound(seed) + self.BOUND_EPSILON < min_similarity
+
+    def prime_category_cache(self, category_ids):
+        """
+        批量预热品类祖先缓存（一次闭包表查询），避免逐个品类查询祖先链
+
+        Args:
+            category_ids: 品类ID可迭代对象
+        """
+        missing = {cid for cid in category_ids if cid is not None} - set(self.category_tree_cache)
+        if missing:
+            self.category_tree_cache.update(closure.ancestor_map(CategoryClosure, missing))
+
     def _get_category_ancestors(self, category):
         """
         获取品类的祖先ID列表（从根到当前）
@@ -223,13 +271,7 @@ class GoodsSimilarityCalculator:
         if category.id in self.category_tree_cache:
             return self.category_tree_cache[category.id]
 
-        ancestors = []
-        current = category
-        while current:
-            ancestors.append(current.id)
-            current = current.parent
-
-        ancestors.reverse()  # 根在前
+        ancestors = closure.ancestor_ids(CategoryClosure, category.id)
         self.category_tree_cache[category.id] = ancestors
         return ancestors
 
@@ -413,6 +455,59 @@ class SeedSelector:
         return seeds
 
 
+class CandidateIndex:
+    """
+    相似度分组的候选倒排索引（每次分组计算构建一次）
+
+    倒排表：IP → 谷子、主题 → 谷子、角色 → 谷子、品类 → 谷子、父级品类 → 谷子，
+    每个倒排表中的位置按 all_goods 的顺序排列。种子只需与其倒排表的并集计算相似度：
+    不在并集中的谷子与种子 IP、主题、角色、品类、父级品类均不相同，其分数不超过
+    GoodsSimilarityCalculator.unrelated_upper_bound(seed)；该上界低于 min_similarity 时，
+    这些谷子必然达不到阈值，剪枝后与逐个计算的结果完全一致，否则该种子退回与全部谷子计算。
+    """
+
+    def __init__(self, calculator, all_goods):
+        """
+        Args:
+            calculator: GoodsSimilarityCalculator实例（提供权重与品类祖先缓存）
+            all_goods: 所有谷子列表
+        """
+        self.calculator = calculator
+        calculator.prime_category_cache({good.category_id for good in all_goods})
+
+        self.postings = defaultdict(list)
+        for position, good in enumerate(all_goods):
+            for key in self._keys(good):
+                self.postings[key].append(position)
+
+    def _parent_id(self, good):
+        # 祖先链从根到自身，倒数第二个为父级（与逐对计算中「第 1 层」的比较一致）
+        ancestors = self.calculator.category_tree_cache.get(good.category_id, [])
+        return ancestors[-2] if len(ancestors) >= 2 else None
+
+    def _keys(self, good):
+        yield ('ip', good.ip_id)
+        if good.theme_id:
+            yield ('theme', good.theme_id)
+        for character in good.characters.all():
+            yield ('character', character.id)
+        yield ('category', good.category_id)
+        parent_id = self._parent_id(good)
+        if parent_id is not None:
+            yield ('parent', parent_id)
+
+    def candidates(self, seed, min_similarity):
+        """
+        可能达到阈值的谷子位置（升序，即 all_goods 中的顺序）；上界不足以剪枝时返回 None（需与全部谷子计算）。
+        """
+        if not self.calculator.can_prune(seed, min_similarity):
+            return None
+        positions = set()
+        for key in self._keys(seed):
+            positions.update(self.postings.get(key, ()))
+        return sorted(positions)
+
+
 class SimilarityGroupBuilder:
     """
     构建相似谷子分组
@@ -420,14 +515,16 @@ class SimilarityGroupBuilder:
     围绕种子谷子构建分组，并强制执行多样性规则
     """
 
-    def __init__(self, calculator):
+    def __init__(self, calculator, blocking=True):
         """
         初始化分组构建器
 
         Args:
             calculator: GoodsSimilarityCalculator实例
+            blocking: 是否先用 CandidateIndex 缩小每个种子的候选范围（结果与逐个计算相同）
         """
         self.calculator = calculator
+        self.blocking = blocking
 
     def build_groups(self, seeds, all_goods, group_size=5, min_similarity=40):
         """
@@ -442,8 +539,26 @@ class SimilarityGroupBuilder:
         Returns:
             list[list[Goods]]: 分组列表，每个分组是一个谷子列表
         """
+        groups, used_ids = self._seed_groups(seeds, all_goods, group_size, min_similarity)
+
+        # 添加剩余未分组的谷子作为单独的"组"
+        remaining = [g for g in all_goods if g.id not in used_ids]
+        random.shuffle(remaining)
+        for good in remaining:
+            groups.append([good])
+
+        return groups
+
+    def _seed_groups(self, seeds, all_goods, group_size, min_similarity):
+        """
+        依次围绕每个种子取相似度最高的谷子成组
+
+        Returns:
+            tuple: (分组列表, 已分组的谷子ID集合)
+        """
         groups = []
         used_ids = set()
+        index = CandidateIndex(self.calculator, all_goods) if self.blocking else None
 
         for seed in seeds:
             if seed.id in used_ids:
@@ -452,9 +567,11 @@ class SimilarityGroupBuilder:
             group = [seed]
             used_ids.add(seed.id)
 
-            # 计算与剩余谷子的相似度
+            # 计算与剩余谷子的相似度（只计算倒排表并集中的谷子，顺序与 all_goods 一致）
+            positions = index.candidates(seed, min_similarity) if index else None
+            pool = all_goods if positions is None else [all_goods[position] for position in positions]
             candidates = []
-            for good in all_goods:
+            for good in pool:
                 if good.id in used_ids:
                     continue
                 score = self.calculator.calculate_similarity(seed, good)
@@ -469,13 +586,7 @@ class SimilarityGroupBuilder:
 
             groups.append(group)
 
-        # 添加剩余未分组的谷子作为单独的"组"
-        remaining = [g for g in all_goods if g.id not in used_ids]
-        random.shuffle(remaining)
-        for good in remaining:
-            groups.append([good])
-
-        return groups
+        return groups, used_ids
 
     def interleave_groups(self, groups):
         """
@@ -0,0 +1,406 @@
+"""
+相似随机（/api/goods/similar-random/）分组时的相似度计算引擎。
+
+- python：GoodsSimilarityCalculator.calculate_similarity 逐对计算（每个种子 × 每件谷子一次调用，
+  每次重新收集角色集合、转换单价、查找品类祖先）；
+- vectorized（默认）：把整批谷子一次编码为 NumPy 列数组 —— IP、作品类型、主题、按层的品类祖先、
+  单价、入手日期序号与角色关联矩阵，所有种子对所有谷子的分数作为一次矩阵运算得出；
+  未安装 NumPy 或 settings.GOODS_SIMILARITY_ENGINE = "python" 时使用 python 引擎。
+
+两种引擎使用同一份 WEIGHTS 与分档，各维度按与 calculate_similarity 相同的顺序累加，
+分数逐位相同（见 tests），分组结果也相同（同分时保持谷子的原有顺序）。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Goods
+from .similarity import SimilarityGroupBuilder
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+ENGINE_VECTORIZED = "vectorized"
+ENGINE_PYTHON = "python"
+
+# 相似度特征缓存的保留时间（秒）：键中含数据版本号，过期只用于回收不再使用的条目
+FEATURE_CACHE_TTL = 3600
+
+# 编码中表示「无」的取值（IP 作品类型用 0，与逐对计算中「作品类型为空不算相同」一致）
+MISSING = -1
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def engine() -> str:
+    """当前使用的引擎：settings.GOODS_SIMILARITY_ENGINE（默认 vectorized），未安装 NumPy 时退回 python。"""
+    configured = getattr(settings, "GOODS_SIMILARITY_ENGINE", ENGINE_VECTORIZED)
+    if configured == ENGINE_VECTORIZED and np is None:
+        return ENGINE_PYTHON
+    return configured
+
+
+def _codes(values, mapping: dict) -> list:
+    """把 ID 映射为连续整数，None 为 MISSING。"""
+    return [MISSING if value is None else mapping.setdefault(value, len(mapping)) for value in values]
+
+
+class SimilarityItem(NamedTuple):
+    """
+    相似度分组所需的谷子字段（不含模型实例，可缓存）
+
+    SeedSelector / interleave_groups 只用到 id、ip_id、category_id、created_at，可直接代替谷子实例。
+    """
+
+    id: object
+    ip_id: int
+    subject_type: int | None
+    theme_id: int | None
+    category_id: int
+    price: Decimal | None
+    purchase_date: date | None
+    created_at: datetime
+    character_ids: tuple
+
+
+# load_items() 读取的谷子列（顺序与 SimilarityItem 一致，角色另查）
+ITEM_COLUMNS = (
+    "id",
+    "ip_id",
+    "ip__subject_type",
+    "theme_id",
+    "category_id",
+    "price",
+    "purchase_date",
+    "created_at",
+)
+
+
+def items_from_goods(goods_list) -> list:
+    """由谷子实例（需已 select_related('ip') 并 prefetch_related('characters')）得到 SimilarityItem 列表。"""
+    return [
+        SimilarityItem(
+            good.id,
+            good.ip_id,
+            getattr(good.ip, "subject_type", None),
+            good.theme_id,
+            good.category_id,
+            good.price,
+            good.purchase_date,
+            good.created_at,
+            tuple(character.id for character in good.characters.all()),
+        )
+        for good in goods_list
+    ]
+
+
+def load_items(qs) -> list:
+    """筛选结果读成 SimilarityItem 列表（谷子列一次查询 + 角色关联一次查询），顺序与 qs 相同，不构造模型实例。"""
+    characters = defaultdict(list)
+    pairs = Goods.characters.through.objects.filter(goods_id__in=qs.order_by().values("pk"))
+    for goods_id, character_id in pairs.order_by().values_list("goods_id", "character_id"):
+        characters[goods_id].append(character_id)
+    return [
+        SimilarityItem(*values, tuple(characters.get(values[0], ())))
+        for values in qs.values_list(*ITEM_COLUMNS)
+    ]
+
+
+class GoodsFeatures:
+    """
+    一批谷子的相似度特征（列数组，第 i 行对应 items[i]）
+
+    - ip / theme / category：ID 编码为整数，主题为空时为 MISSING；subject_type 为空时为 0；
+    - category_levels：(n, L)，第 l 列为从品类自身往上第 l 层的祖先（第 0 列为自身），不足的层为 MISSING；
+    - price / has_price、purchase / has_purchase：单价（float64）与入手日期序号（date.toordinal）；
+    - characters：(n, m) 角色关联矩阵（float32，m 为这批谷子涉及的角色数），character_counts 为每行角色数。
+
+    编码完成后不再依赖数据库（品类祖先已展开为按层的列），可整体缓存；
+    缓存时只保存角色关联的 (行, 列) 对，读取时再还原为矩阵。
+    """
+
+    def __init__(self, items, category_ancestors: dict):
+        """
+        Args:
+            items: SimilarityItem 列表
+            category_ancestors: {品类ID: [根ID, ..., 品类ID]}，同 GoodsSimilarityCalculator.category_tree_cache
+        """
+        self.items = list(items)
+        self.ids = [item.id for item in self.items]
+        self.index = {goods_id: row for row, goods_id in enumerate(self.ids)}
+        size = len(self.items)
+
+        self.ip = np.array(_codes([item.ip_id for item in self.items], {}), dtype=np.int64)
+        self.subject_type = np.array([item.subject_type or 0 for item in self.items], dtype=np.int64)
+        # 与逐对计算一致：主题 ID 为假值时视为没有主题
+        self.theme = np.array(_codes([item.theme_id or None for item in self.items], {}), dtype=np.int64)
+
+        category_codes = {}
+        self.category = np.array(
+            _codes([item.category_id for item in self.items], category_codes), dtype=np.int64
+        )
+        chains = [list(reversed(category_ancestors.get(item.category_id, []))) for item in self.items]
+        depth = max((len(chain) for chain in chains), default=0)
+        self.category_levels = np.full((size, depth), MISSING, dtype=np.int64)
+        for row, chain in enumerate(chains):
+            self.category_levels[row, :len(chain)] = _codes(chain, category_codes)
+
+        self.has_price = np.array([item.price is not None for item in self.items], dtype=bool)
+        self.price = np.array(
+            [float(item.price) if item.price is not None else 0.0 for item in self.items], dtype=np.float64
+        )
+        self.has_purchase = np.array([item.purchase_date is not None for item in self.items], dtype=bool)
+        self.purchase = np.array(
+            [item.purchase_date.toordinal() if item.purchase_date is not None else 0 for item in self.items],
+            dtype=np.int64,
+        )
+
+        character_codes = {}
+        incidence = [
+            (row, character_codes.setdefault(character_id, len(character_codes)))
+            for row, item in enumerate(self.items)
+            for character_id in item.character_ids
+        ]
+        self.character_shape = (size, len(character_codes))
+        self.character_rows = np.array([row for row, _ in incidence], dtype=np.int64)
+        self.character_columns = np.array([column for _, column in incidence], dtype=np.int64)
+        self._build_characters()
+
+    @classmethod
+    def from_goods(cls, goods_list, category_ancestors: dict) -> "GoodsFeatures":
+        return cls(items_from_goods(goods_list), category_ancestors)
+
+    def _build_characters(self):
+        self.characters = np.zeros(self.character_shape, dtype=np.float32)
+        self.characters[self.character_rows, self.character_columns] = 1.0
+        self.character_counts = self.characters.sum(axis=1, dtype=np.float64)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["characters"], state["character_counts"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_characters()
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SimilarityMatrix:
+    """按 GoodsSimilarityCalculator 的权重与分档，批量计算种子 × 谷子的相似度矩阵。"""
+
+    def __init__(self, weights: dict):
+        self.weights = weights
+
+    def scores(self, features: GoodsFeatures, seed_rows, columns=None) -> "np.ndarray":
+        """
+        Args:
+            features: 谷子特征
+            seed_rows: 种子在 features 中的行号
+            columns: 只计算这些行号的谷子（默认全部）
+
+        Returns:
+            np.ndarray: (种子数, 谷子数) 的 float64 分数矩阵，与逐对 calculate_similarity 的结果相同
+        """
+        seed_rows = np.asarray(seed_rows, dtype=np.int64)
+        columns = np.arange(len(features)) if columns is None else np.asarray(columns, dtype=np.int64)
+        pair = (seed_rows, columns)
+        score = np.zeros((len(seed_rows), len(columns)), dtype=np.float64)
+        # 累加顺序与 calculate_similarity 相同（浮点加法不满足结合律）
+        score += self._ip_match(features, pair)
+        score += self._character_overlap(features, pair)
+        score += self._category_hierarchy(features, pair)
+        score += self._theme_match(features, pair)
+        score += self._price_range(features, pair)
+        score += self._purchase_proximity(features, pair)
+        return score
+
+    @staticmethod
+    def _pair(column, pair):
+        """(种子列, 谷子行) 两个可广播的视图。"""
+        seed_rows, columns = pair
+        return column[seed_rows][:, None], column[columns][None, :]
+
+    def _ip_match(self, f, pair):
+        weight = self.weights['ip_match']
+        ip_a, ip_b = self._pair(f.ip, pair)
+        subject_a, subject_b = self._pair(f.subject_type, pair)
+        same_subject = (subject_a == subject_b) & (subject_a != 0)
+        return np.where(ip_a == ip_b, weight, np.where(same_subject, weight * 0.33, 0.0))
+
+    def _character_overlap(self, f, pair):
+        seed_rows, columns = pair
+        shared = (f.characters[seed_rows] @ f.characters[columns].T).astype(np.float64)
+        count_a, count_b = self._pair(f.character_counts, pair)
+        union = count_a + count_b - shared
+        ratio = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+        return ratio * self.weights['character_overlap']
+
+    def _category_hierarchy(self, f, pair):
+        weight = self.weights['category_hierarchy']
+        category_a, category_b = self._pair(f.category, pair)
+        result = np.zeros((len(pair[0]), len(pair[1])), dtype=np.float64)
+        # 从最高层往下覆盖：最终取最近一层共同祖先（第 1 层为父级，第 2 层为祖父级，更高层同按根品类计）
+        for level in range(f.category_levels.shape[1] - 1, 0, -1):
+            level_a, level_b = self._pair(f.category_levels[:, level], pair)
+            factor = 0.6 if level == 1 else 0.3 if level == 2 else 0.15
+            result = np.where((level_a == level_b) & (level_a != MISSING), weight * factor, result)
+        return np.where(category_a == category_b, weight, result)
+
+    def _theme_match(self, f, pair):
+        weight = self.weights['theme_match']
+        theme_a, theme_b = self._pair(f.theme, pair)
+        both = (theme_a != MISSING) & (theme_b != MISSING)
+        return np.where(both, np.where(theme_a == theme_b, weight, weight * 0.2), 0.0)
+
+    def _price_range(self, f, pair):
+        weight = self.weights['price_range']
+        price_a, price_b = self._pair(f.price, pair)
+        has_a, has_b = self._pair(f.has_price, pair)
+        average = (price_a + price_b) / 2
+        difference = np.abs(price_a - price_b)
+        diff_pct = np.divide(
+            difference, average, out=np.zeros(np.broadcast(difference, average).shape), where=average > 0
+        )
+        both = has_a & has_b
+        return np.select(
+            [
+                ~has_a & ~has_b,
+                both & (diff_pct <= 0.1),
+                both & (diff_pct <= 0.25),
+                both & (diff_pct <= 0.5),
+                both & (diff_pct <= 1.0),
+            ],
+            [weight * 0.5, weight, weight * 0.625, weight * 0.375, weight * 0.125],
+            0.0,
+        )
+
+    def _purchase_proximity(self, f, pair):
+        weight = self.weights['purchase_proximity']
+        day_a, day_b = self._pair(f.purchase, pair)
+        has_a, has_b = self._pair(f.has_purchase, pair)
+        diff_days = np.abs(day_a - day_b)
+        both = has_a & has_b
+        return np.select(
+            [
+                ~has_a & ~has_b,
+                both & (diff_days <= 30),
+                both & (diff_days <= 90),
+                both & (diff_days <= 180),
+                both & (diff_days <= 365),
+            ],
+            [weight * 0.43, weight, weight * 0.71, weight * 0.43, weight * 0.14],
+            0.0,
+        )
+
+
+class VectorizedGroupBuilder(SimilarityGroupBuilder):
+    """
+    分组规则与 SimilarityGroupBuilder 相同，相似度由 SimilarityMatrix 一次算出全部种子的分数。
+
+    启用 blocking 时只计算各种子倒排表并集中的谷子（见 similarity.CandidateIndex）：并集之外的谷子
+    与任一种子的分数都低于阈值，不影响分组结果。
+    种子须来自 all_goods；权重与品类祖先缓存取自传入的 GoodsSimilarityCalculator。
+    传入已编码（或缓存）的 features 时，all_goods 须为 features.items（或与之同序的谷子），不再编码也不查询品类祖先。
+    """
+
+    def __init__(self, calculator, blocking=True, features: GoodsFeatures | None = None):
+        super().__init__(calculator, blocking=blocking)
+        self.features = features
+
+    def _can_prune(self, features, row, min_similarity):
+        """同 GoodsSimilarityCalculator.can_prune，取值来自特征列。"""
+        bound = self.calculator.upper_bound_for(
+            bool(features.subject_type[row]),
+            features.theme[row] != MISSING,
+            bool(features.has_price[row]),
+            bool(features.has_purchase[row]),
+        )
+        return bound + self.calculator.BOUND_EPSILON < min_similarity
+
+    def _columns(self, features, seed_rows, min_similarity):
+        """
+        需要计算的谷子行号（升序）：各种子倒排表（IP / 主题 / 角色 / 品类 / 父级品类）并集，
+        与 CandidateIndex 相同，但直接在特征列上求出；有种子的上界不足以剪枝时为全部。
+        """
+        if not self.blocking or not all(self._can_prune(features, row, min_similarity) for row in seed_rows):
+            return np.arange(len(features))
+        themes = features.theme[seed_rows]
+        mask = (
+            np.isin(features.ip, features.ip[seed_rows])
+            | np.isin(features.theme, themes[themes != MISSING])
+            | np.isin(features.category, features.category[seed_rows])
+        )
+        seed_characters = features.characters[seed_rows].any(axis=0)
+        if seed_characters.any():
+            mask |= features.characters[:, seed_characters].any(axis=1)
+        if features.category_levels.shape[1] > 1:
+            parents = features.category_levels[seed_rows, 1]
+            mask |= np.isin(features.category_levels[:, 1], parents[parents != MISSING])
+        return np.flatnonzero(mask)
+
+    def _seed_groups(self, seeds, all_goods, group_size, min_similarity):
+        features = self.features
+        if features is None:
+            self.calculator.prime_category_cache({good.category_id for good in all_goods})
+            features = GoodsFeatures.from_goods(all_goods, self.calculator.category_tree_cache)
+        seed_rows = np.array([features.index[seed.id] for seed in seeds], dtype=np.int64)
+        columns = self._columns(features, seed_rows, min_similarity)
+        matrix = SimilarityMatrix(self.calculator.WEIGHTS).scores(features, seed_rows, columns)
+
+        groups = []
+        used = np.zeros(len(features), dtype=bool)
+        for seed, scores in zip(seeds, matrix):
+            row = features.index[seed.id]
+            if used[row]:
+                continue
+            used[row] = True
+
+            candidates = np.flatnonzero(~used[columns] & (scores >= min_similarity))
+            # 稳定排序：同分时保持 all_goods 中的顺序（columns 为升序），与逐对计算的 list.sort(reverse=True) 一致
+            chosen = columns[candidates[np.argsort(-scores[candidates], kind="stable")][:group_size - 1]]
+            used[chosen] = True
+            groups.append([seed, *(all_goods[index] for index in chosen)])
+
+        used_ids = {features.ids[index] for index in np.flatnonzero(used)}
+        return groups, used_ids
+
+
+def features_for_queryset(qs, calculator) -> GoodsFeatures:
+    """读取筛选结果并编码（两次查询 + 一次品类祖先查询），不构造谷子实例。"""
+    items = load_items(qs)
+    calculator.prime_category_cache({item.category_id for item in items})
+    return GoodsFeatures(items, calculator.category_tree_cache)
+
+
+def cached_features(qs, calculator, key: str | None) -> GoodsFeatures:
+    """
+    相似度特征缓存：key 须包含数据版本号与筛选条件（见 GoodsViewSet._get_similarity_features_key），
+    数据变化即换键、无需主动失效；key 为 None 时不缓存。
+    """
+    if key is None:
+        return features_for_queryset(qs, calculator)
+    features = cache.get(key)
+    if features is None:
+        features = features_for_queryset(qs, calculator)
+        cache.set(key, features, timeout=getattr(settings, "GOODS_SIMILARITY_FEATURE_TTL", FEATURE_CACHE_TTL))
+    return features
+
+
+def group_builder(calculator, engine_name: str | None = None, blocking: bool = True) -> SimilarityGroupBuilder:
+    """按引擎返回分组构建器。"""
+    if (engine_name or engine()) == ENGINE_VECTORIZED:
+        return VectorizedGroupBuilder(calculator, blocking=blocking)
+    return SimilarityGroupBuilder(calculator, blocking=blocking)
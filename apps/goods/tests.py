@@ -1,11 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
+from contextlib import contextmanager
 from datetime import date, timedelta
 from decimal import Decimal
 
 from apps.users.models import User, Role
-from .models import Goods, IP, Character, Category, Theme
+from unittest import skipUnless
+from django.core.cache import cache
+
+from .models import Goods, GoodsCard, GoodsGroupRecency, GoodsNeighbor, GoodsSearchDocument, IP, IPKeyword, Character, Category, CategoryClosure, SearchKey, Showcase, Theme
+from . import cards, neighbors, recency, search, similarity_engine, stats_engine, textkeys
 from .similarity import GoodsSimilarityCalculator, SeedSelector, SimilarityGroupBuilder
 
 
@@ -138,6 +143,180 @@ class SimilarityAlgorithmTestCase(TestCase):
         self.assertLess(score, 40.0)
 
 
+@skipUnless(similarity_engine.numpy_available(), '需要 numpy')
+class VectorizedSimilarityTestCase(TestCase):
+    """测试向量化相似度引擎与逐对计算的结果一致"""
+
+    def setUp(self):
+        import random as _random
+
+        rng = _random.Random(7)
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='vector_user', password='testpass123', role=self.role)
+
+        ips = [
+            IP.objects.create(name='IP甲', subject_type=4),
+            IP.objects.create(name='IP乙', subject_type=4),
+            IP.objects.create(name='IP丙', subject_type=2),
+            IP.objects.create(name='IP丁'),
+        ]
+        characters = [Character.objects.create(ip=rng.choice(ips), name=f'角色{i}') for i in range(8)]
+
+        # 深浅不一的品类树：不同深度的叶子之间按「从叶子往上第 N 层」比较祖先
+        root = Category.objects.create(name='周边')
+        paper = Category.objects.create(name='纸制品', parent=root)
+        badge = Category.objects.create(name='吧唧', parent=root)
+        categories = [
+            root, paper, badge,
+            Category.objects.create(name='色纸', parent=paper),
+            Category.objects.create(name='明信片', parent=paper),
+            Category.objects.create(name='圆形吧唧', parent=badge),
+            Category.objects.create(name='异形吧唧', parent=Category.objects.create(name='特殊', parent=badge)),
+            Category.objects.create(name='小卡', parent=Category.objects.create(name='卡片', parent=paper)),
+            Category.objects.create(name='其他'),
+        ]
+        themes = [None, Theme.objects.create(user=self.user, name='夏日'), Theme.objects.create(user=self.user, name='新年')]
+        prices = [None, Decimal('0'), Decimal('9.90'), Decimal('10'), Decimal('11'), Decimal('12.5'), Decimal('15'), Decimal('30'), Decimal('80')]
+        dates = [None, date(2024, 1, 1), date(2024, 1, 31), date(2024, 2, 1), date(2024, 4, 1), date(2024, 7, 1), date(2024, 12, 31), date(2026, 1, 1)]
+
+        for i in range(60):
+            goods = Goods.objects.create(
+                user=self.user,
+                name=f'谷子{i}',
+                ip=rng.choice(ips),
+                category=rng.choice(categories),
+                theme=rng.choice(themes),
+                price=rng.choice(prices),
+                purchase_date=rng.choice(dates),
+            )
+            goods.characters.add(*rng.sample(characters, rng.randint(0, 3)))
+
+        self.goods_list = list(
+            Goods.objects.filter(user=self.user)
+            .select_related('ip', 'category', 'theme')
+            .prefetch_related('characters')
+        )
+
+    def test_scores_match_pairwise(self):
+        calculator = GoodsSimilarityCalculator()
+        calculator.prime_category_cache({g.category_id for g in self.goods_list})
+        features = similarity_engine.GoodsFeatures.from_goods(self.goods_list, calculator.category_tree_cache)
+        matrix = similarity_engine.SimilarityMatrix(calculator.WEIGHTS).scores(
+            features, range(len(self.goods_list))
+        )
+        for i, a in enumerate(self.goods_list):
+            for j, b in enumerate(self.goods_list):
+                # 逐位相同，而非近似相等
+                self.assertEqual(matrix[i, j], calculator.calculate_similarity(a, b), (a.name, b.name))
+
+    def test_groups_match_python_builder(self):
+        import random as _random
+
+        results = []
+        for name in (similarity_engine.ENGINE_PYTHON, similarity_engine.ENGINE_VECTORIZED):
+            _random.seed(11)
+            calculator = GoodsSimilarityCalculator()
+            calculator.prime_category_cache({g.category_id for g in self.goods_list})
+            seeds = SeedSelector().select_seeds(self.goods_list)
+            builder = similarity_engine.group_builder(calculator, engine_name=name)
+            groups = builder.build_groups(seeds, self.goods_list, min_similarity=30)
+            results.append([[good.id for good in group] for group in groups])
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(any(len(group) > 1 for group in results[1]))
+
+    def test_blocking_matches_exhaustive(self):
+        """倒排索引剪枝后的分组与逐个计算相同；阈值低于上界时该种子退回全量计算"""
+        import random as _random
+
+        for name in (similarity_engine.ENGINE_PYTHON, similarity_engine.ENGINE_VECTORIZED):
+            for min_similarity in (40, 30, 20):
+                results = []
+                for blocking in (False, True):
+                    _random.seed(5)
+                    calculator = GoodsSimilarityCalculator()
+                    seeds = SeedSelector().select_seeds(self.goods_list, count=8)
+                    builder = similarity_engine.group_builder(calculator, engine_name=name, blocking=blocking)
+                    groups = builder.build_groups(seeds, self.goods_list, min_similarity=min_similarity)
+                    results.append([[good.id for good in group] for group in groups])
+                self.assertEqual(results[0], results[1], (name, min_similarity))
+
+    def test_candidate_index_upper_bound(self):
+        """被剪掉的谷子分数不超过 unrelated_upper_bound，且阈值 40 时确实缩小了候选范围"""
+        from .similarity import CandidateIndex
+
+        calculator = GoodsSimilarityCalculator()
+        index = CandidateIndex(calculator, self.goods_list)
+        pruned = 0
+        for seed in self.goods_list:
+            positions = index.candidates(seed, 40)
+            self.assertIsNotNone(positions)
+            self.assertLess(calculator.unrelated_upper_bound(seed), 40)
+            kept = set(positions)
+            for position, good in enumerate(self.goods_list):
+                if position not in kept:
+                    pruned += 1
+                    self.assertLessEqual(calculator.calculate_similarity(seed, good), calculator.unrelated_upper_bound(seed))
+        self.assertGreater(pruned, 0)
+        # 阈值不高于上界时不剪枝
+        self.assertIsNone(index.candidates(self.goods_list[0], calculator.unrelated_upper_bound(self.goods_list[0])))
+
+    def test_load_items_matches_instances(self):
+        """按列读取的 SimilarityItem 与由谷子实例得到的一致，编码后的特征可序列化缓存"""
+        import pickle
+
+        def normalized(items):
+            return [item._replace(character_ids=tuple(sorted(item.character_ids))) for item in items]
+
+        qs = Goods.objects.filter(user=self.user)
+        self.assertEqual(
+            normalized(similarity_engine.load_items(qs)),
+            normalized(similarity_engine.items_from_goods(self.goods_list)),
+        )
+
+        calculator = GoodsSimilarityCalculator()
+        features = similarity_engine.features_for_queryset(qs, calculator)
+        restored = pickle.loads(pickle.dumps(features))
+        matrix = similarity_engine.SimilarityMatrix(calculator.WEIGHTS)
+        rows = range(len(features))
+        self.assertTrue((matrix.scores(features, rows) == matrix.scores(restored, rows)).all())
+
+    def test_feature_cache_skips_goods_queries(self):
+        """重算排序时命中特征缓存，不再读取谷子与角色关联；数据变化后换键重新读取"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # 本用例请求较多，避免限流计数影响其它用例
+        cache.clear()
+        self.addCleanup(cache.clear)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        def request():
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get('/api/goods/similar-random/?refresh=1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.json()['results']), 18)
+            return len(ctx)
+
+        cold = request()
+        warm = request()
+        # 谷子列、角色关联、品类祖先三次查询
+        self.assertEqual(cold - warm, 3)
+
+        Goods.objects.create(
+            user=self.user, name='新谷子', ip=self.goods_list[0].ip, category=self.goods_list[0].category
+        )
+        self.assertEqual(request(), cold)
+
+    def test_engine_setting(self):
+        with self.settings(GOODS_SIMILARITY_ENGINE='python'):
+            self.assertEqual(similarity_engine.engine(), similarity_engine.ENGINE_PYTHON)
+        self.assertIsInstance(
+            similarity_engine.group_builder(GoodsSimilarityCalculator()),
+            similarity_engine.VectorizedGroupBuilder,
+        )
+
+
 class SeedSelectorTestCase(TestCase):
     """测试种子选择器"""
 
@@ -256,6 +435,414 @@ class SimilarRandomEndpointTestCase(TestCase):
             self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_404_NOT_FOUND])
 
 
+@override_settings(GOODS_SIMILAR_NEIGHBORS=5)
+class GoodsNeighborTestCase(TestCase):
+    """测试谷子近邻表的增量维护与相似谷子接口"""
+
+    def setUp(self):
+        import random as _random
+
+        rng = _random.Random(11)
+        self.client = APIClient()
+        self.role = Role.objects.create(name='近邻测试角色')
+        self.user = User.objects.create(username='neighbor_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='neighbor_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+
+        self.ips = [IP.objects.create(name=f'近邻IP{i}', subject_type=i % 3 or None) for i in range(4)]
+        self.characters = [Character.objects.create(ip=rng.choice(self.ips), name=f'近邻角色{i}') for i in range(6)]
+        root = Category.objects.create(name='近邻周边')
+        parent = Category.objects.create(name='近邻吧唧', parent=root)
+        self.categories = [root, parent, Category.objects.create(name='近邻圆吧', parent=parent), Category.objects.create(name='近邻其他')]
+        self.themes = [None, Theme.objects.create(user=self.user, name='近邻夏日')]
+        prices = [None, Decimal('10'), Decimal('12'), Decimal('30')]
+        dates = [None, date(2024, 1, 1), date(2024, 3, 1), date(2025, 1, 1)]
+
+        self.goods = []
+        for i in range(24):
+            goods = Goods.objects.create(
+                user=self.user,
+                name=f'近邻谷子{i}',
+                ip=rng.choice(self.ips),
+                category=rng.choice(self.categories),
+                theme=rng.choice(self.themes),
+                price=rng.choice(prices),
+                purchase_date=rng.choice(dates),
+            )
+            goods.characters.add(*rng.sample(self.characters, rng.randint(0, 2)))
+            self.goods.append(goods)
+        Goods.objects.create(user=self.other, name='他人谷子', ip=self.ips[0], category=self.categories[0])
+
+        # 刷新在事务提交后提交到后台：先收集起来，由测试手动执行（测试事务中的数据对其他线程不可见）
+        from core import revalidate
+
+        self.pending = []
+        original = revalidate.submit
+        revalidate.submit = self.pending.append
+        self.addCleanup(setattr, revalidate, 'submit', original)
+        self.addCleanup(self.reset_queue)
+        neighbors.rebuild()
+
+    @staticmethod
+    def reset_queue():
+        neighbors._pending = {'goods': set(), 'lists': set()}
+        neighbors._scheduled = False
+
+    @contextmanager
+    def committed(self):
+        """块内的写入视为已提交，并执行提交后调度的刷新任务"""
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        while self.pending:
+            self.pending.pop(0)()
+
+    def expected(self, user=None):
+        """逐对 calculate_similarity 得到的近邻列表：{谷子ID: [(近邻ID, 分数), ...]}"""
+        goods_list = list(
+            Goods.objects.filter(user=user or self.user)
+            .select_related('ip', 'category', 'theme')
+            .prefetch_related('characters')
+        )
+        calculator = GoodsSimilarityCalculator()
+        result = {}
+        for a in goods_list:
+            scored = [(b.id, calculator.calculate_similarity(a, b)) for b in goods_list if b.id != a.id]
+            scored = sorted((item for item in scored if item[1] > 0), key=lambda item: (-item[1], item[0]))
+            result[a.id] = scored[:5]
+        return result
+
+    def stored(self, user=None):
+        result = {goods_id: [] for goods_id in Goods.objects.filter(user=user or self.user).values_list('id', flat=True)}
+        for goods_id, neighbor_id, score in GoodsNeighbor.objects.filter(
+            goods__user=user or self.user
+        ).order_by('goods_id', 'rank').values_list('goods_id', 'neighbor_id', 'score'):
+            result[goods_id].append((neighbor_id, score))
+        return result
+
+    def test_incremental_matches_pairwise(self):
+        self.assertEqual(self.stored(), self.expected())
+        target = self.goods[0]
+
+        with self.committed():
+            target.ip = self.ips[3]
+            target.price = Decimal('12')
+            target.save()
+        self.assertEqual(self.stored(), self.expected())
+
+        with self.committed():
+            Goods.objects.get(pk=self.goods[1].pk).characters.set(self.characters[:2])
+            self.characters[2].goods.add(self.goods[2], self.goods[3])
+        self.assertEqual(self.stored(), self.expected())
+
+        with self.committed():
+            self.goods[4].category = self.categories[2]
+            self.goods[4].save(update_fields=['category'])
+            self.goods[5].delete()
+            self.themes[1].delete()
+            self.characters[3].delete()
+        self.assertEqual(self.stored(), self.expected())
+
+        # 换了所属用户：原用户中含有它的列表补位，新用户中参与计算
+        with self.committed():
+            self.goods[6].user = self.other
+            self.goods[6].save()
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(self.stored(self.other), self.expected(self.other))
+
+    def test_only_affected_lists_rewritten(self):
+        before = dict(GoodsNeighbor.objects.values_list('pk', 'goods_id'))
+        target = self.goods[0]
+        with self.committed():
+            target.price = Decimal('31')
+            target.save()
+        rewritten = {goods_id for pk, goods_id in before.items() if not GoodsNeighbor.objects.filter(pk=pk).exists()}
+        self.assertIn(target.id, rewritten)
+        self.assertLess(len(rewritten), len(self.goods))
+
+        # 与相似度无关的字段变化不触发重算
+        before = set(GoodsNeighbor.objects.values_list('pk', flat=True))
+        with self.committed():
+            target.name = '改名'
+            target.status = 'sold'
+            target.save()
+        self.assertEqual(set(GoodsNeighbor.objects.values_list('pk', flat=True)), before)
+
+    def test_deferred_until_commit_and_coalesced(self):
+        """提交前不计算、回滚不计算；同一事务内字段保存与角色变更合并为一次刷新"""
+        from django.db import transaction
+        from unittest import mock
+
+        target = self.goods[0]
+        with mock.patch.object(neighbors, 'refresh', wraps=neighbors.refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                target.price = Decimal('31')
+                target.save()
+                target.characters.set(self.characters[4:])
+                self.assertEqual(self.pending, [])
+            self.assertEqual(len(self.pending), 1)
+            self.pending.pop()()
+            refresh.assert_called_once()
+            self.assertEqual(self.stored(), self.expected())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    target.price = Decimal('1')
+                    target.save()
+                    raise RuntimeError
+            self.assertEqual(self.pending, [])
+
+    def test_similar_etag_changes_after_refresh(self):
+        """后台刷新完成后 /similar/ 的 ETag 随之变化，刷新前取得的旧列表不会再得到 304"""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        target = self.goods[0]
+        url = f'/api/goods/{target.id}/similar/'
+        with self.captureOnCommitCallbacks(execute=True):
+            target.ip = self.ips[3]
+            target.price = Decimal('12')
+            target.save()
+        # 写入已提交、刷新尚未执行：取得旧列表与写入后的 ETag
+        before = self.client.get(url)
+        self.assertEqual(before.status_code, status.HTTP_200_OK)
+
+        while self.pending:
+            self.pending.pop(0)()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], before['ETag'])
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [str(goods_id) for goods_id, _ in self.expected()[target.id]],
+        )
+
+    def test_failed_refresh_retried_then_kept(self):
+        """刷新失败时重试；重试仍失败的谷子不丢弃，由下一次调度一并刷新"""
+        from unittest import mock
+
+        target = self.goods[0]
+        original = neighbors.refresh
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError('database is locked')
+            return original(*args)
+
+        with mock.patch.object(neighbors, 'RETRY_DELAYS', (0,)), mock.patch.object(neighbors, 'refresh', flaky):
+            with self.assertLogs('apps.goods.neighbors', 'WARNING'), self.committed():
+                target.price = Decimal('31')
+                target.save()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.stored(), self.expected())
+
+        with mock.patch.object(neighbors, 'RETRY_DELAYS', (0,)), \
+                mock.patch.object(neighbors, 'refresh', side_effect=RuntimeError):
+            with self.assertLogs('apps.goods.neighbors', 'ERROR'), self.committed():
+                target.ip = self.ips[3]
+                target.save()
+        self.assertIn(target.id, neighbors._pending['goods'])
+
+        with self.committed():
+            self.goods[1].price = Decimal('30')
+            self.goods[1].save()
+        self.assertEqual(neighbors._pending, {'goods': set(), 'lists': set()})
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_catalog_changes(self):
+        """IP 作品类型变化、品类移动后刷新受影响谷子的近邻列表"""
+        with self.committed():
+            self.ips[1].subject_type = 2
+            self.ips[1].save()
+        self.assertEqual(self.stored(), self.expected())
+
+        with self.committed(), override_settings(GOODS_SIMILARITY_ENGINE=similarity_engine.ENGINE_PYTHON):
+            self.categories[1].parent = self.categories[3]
+            self.categories[1].save()
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_unrelated_goods_not_loaded(self):
+        """只读取与变化谷子有共同 IP / 主题 / 角色 / 品类 / 父级品类的谷子，无关谷子不参与计算"""
+        from unittest import mock
+
+        user = User.objects.create(username='neighbor_blocks', password='testpass123', role=self.role)
+        clusters = []
+        for name in ('A', 'B'):
+            ip = IP.objects.create(name=f'分块IP{name}')
+            category = Category.objects.create(name=f'分块品类{name}')
+            clusters.append([
+                Goods.objects.create(user=user, name=f'{name}{i}', ip=ip, category=category, price=Decimal('10'))
+                for i in range(8)
+            ])
+        neighbors.rebuild([user.id])
+
+        loaded = []
+        original = neighbors.Collection.__init__
+
+        def spy(collection, *args, **kwargs):
+            original(collection, *args, **kwargs)
+            loaded.append(set(collection.ids))
+
+        with mock.patch.object(neighbors.Collection, '__init__', spy), self.committed():
+            clusters[0][0].price = Decimal('12')
+            clusters[0][0].save()
+        self.assertTrue(loaded)
+        self.assertFalse(any(ids & {goods.id for goods in clusters[1]} for ids in loaded))
+        self.assertEqual(self.stored(user), self.expected(user))
+
+    def test_rebuild_and_python_engine(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        GoodsNeighbor.objects.all().delete()
+        call_command('rebuild_goods_neighbors', stdout=StringIO())
+        self.assertEqual(self.stored(), self.expected())
+        with override_settings(GOODS_SIMILARITY_ENGINE=similarity_engine.ENGINE_PYTHON):
+            self.assertEqual(neighbors.rebuild([self.user.id]), len(self.goods))
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_similar_endpoint(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        target = self.goods[0]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/goods/{target.id}/similar/', {'k': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        expected = self.expected()[target.id][:3]
+        self.assertEqual((data['k'], data['count']), (3, len(expected)))
+        self.assertEqual([item['id'] for item in data['results']], [str(goods_id) for goods_id, _ in expected])
+        self.assertEqual([item['score'] for item in data['results']], [round(score, 2) for _, score in expected])
+        self.assertIn('characters', data['results'][0])
+        # 相似谷子为一次按索引读取的查询
+        self.assertEqual(len([q for q in ctx.captured_queries if 'goods_goodsneighbor' in q['sql']]), 1)
+
+        # k 超过保存的数量时按上限返回
+        self.assertEqual(self.client.get(f'/api/goods/{target.id}/similar/', {'k': 100}).json()['k'], 5)
+
+        other_goods = Goods.objects.get(user=self.other)
+        response = self.client.get(f'/api/goods/{other_goods.id}/similar/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SimilarRandomSessionTestCase(TestCase):
+    """测试相似随机按排序会话翻页"""
+
+    def setUp(self):
+        # 本用例请求较多，避免限流计数影响其它用例
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.role = Role.objects.create(name='会话测试角色')
+        self.user = User.objects.create(username='session_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='session_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='会话测试IP', subject_type=4)
+        self.cat = Category.objects.create(name='会话测试品类')
+        for i in range(45):
+            Goods.objects.create(user=self.user, name=f'会话谷子{i}', ip=self.ip, category=self.cat)
+
+    def _get(self, **params):
+        response = self.client.get('/api/goods/similar-random/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    def test_pages_follow_stored_ordering(self):
+        first = self._get()
+        self.assertTrue(first['session'])
+        self.assertEqual((first['count'], first['page'], first['next'], first['previous']), (45, 1, 2, None))
+        self.assertEqual(len(first['results']), 18)
+
+        # 第一页之后新增的谷子不影响同一会话的后续页：翻页不重算排序
+        Goods.objects.create(user=self.user, name='新增谷子', ip=self.ip, category=self.cat)
+        second = self._get(page=2, session=first['session'])
+        third = self._get(page=3, session=first['session'])
+        self.assertEqual((second['count'], second['next'], second['previous']), (45, 3, 1))
+        self.assertEqual((len(third['results']), third['next']), (9, None))
+
+        ids = [item['id'] for page in (first, second, third) for item in page['results']]
+        self.assertEqual(len(set(ids)), 45)
+        self.assertEqual(set(ids), {str(pk) for pk in Goods.objects.exclude(name='新增谷子').values_list('id', flat=True)})
+
+        # 窗口内再次请求第一页复用同一会话；refresh=1 重新计算并换新会话
+        self.assertEqual(self._get()['session'], first['session'])
+        refreshed = self._get(refresh=1)
+        self.assertNotEqual(refreshed['session'], first['session'])
+        self.assertEqual(refreshed['count'], 46)
+
+    def test_sessions_per_filter(self):
+        """同一时间窗口内不同筛选条件（如不同角色）各自计算、各自的会话"""
+        char_a = Character.objects.create(ip=self.ip, name='会话角色A')
+        char_b = Character.objects.create(ip=self.ip, name='会话角色B')
+        goods = list(Goods.objects.filter(user=self.user).order_by('name'))
+        # 每个角色超过 18 件才会建立会话
+        char_a.goods.add(*goods[:25])
+        char_b.goods.add(*goods[25:45])
+
+        unfiltered = self._get()
+        first = self._get(character=char_a.id)
+        second = self._get(character=char_b.id)
+        self.assertEqual(len({unfiltered['session'], first['session'], second['session']}), 3)
+        self.assertEqual((first['count'], len(first['results']), first['next']), (25, 18, 2))
+        self.assertEqual((second['count'], len(second['results']), second['next']), (20, 18, 2))
+        last = self._get(character=char_b.id, page=2, session=second['session'])
+        self.assertEqual(
+            {item['id'] for item in second['results'] + last['results']}, {str(good.id) for good in goods[25:45]}
+        )
+        # 同一筛选条件仍复用会话
+        self.assertEqual(self._get(character=char_a.id)['session'], first['session'])
+
+    def test_session_page_skips_count(self):
+        session = self._get()['session']
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._get(page=2, session=session)
+        # 不再对筛选结果计数（序列化器中角色数量等统计不在此列）
+        self.assertFalse([
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT COUNT(') and 'FROM "goods_goods"' in q['sql']
+        ])
+
+    def test_page_size(self):
+        first = self._get(page_size=10)
+        self.assertEqual((len(first['results']), first['page_size'], first['next']), (10, 10, 2))
+        last = self._get(page=5, page_size=10, session=first['session'])
+        self.assertEqual((len(last['results']), last['next']), (5, None))
+
+    def test_invalid_session_and_page(self):
+        session = self._get()['session']
+        self.assertEqual(
+            self.client.get('/api/goods/similar-random/', {'page': 2, 'session': 'missing'}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(
+            self.client.get('/api/goods/similar-random/', {'page': 4, 'session': session}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(
+            self.client.get('/api/goods/similar-random/', {'page': 'x'}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+        # 会话只对创建它的用户有效
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(
+            self.client.get('/api/goods/similar-random/', {'page': 2, 'session': session}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_page_without_session_starts_new_one(self):
+        second = self._get(page=2)
+        self.assertTrue(second['session'])
+        self.assertEqual((second['page'], len(second['results'])), (2, 18))
+        first = self._get(page=1, session=second['session'])
+        self.assertFalse({item['id'] for item in first['results']} & {item['id'] for item in second['results']})
+
+
 class GoodsDraftFlowTestCase(TestCase):
     """测试谷子草稿保存与发布流程"""
 
@@ -353,3 +940,1578 @@ class GoodsDraftFlowTestCase(TestCase):
         data = response.json()
         self.assertIn("character_ids", data)
 
+
+
+class CategoryClosureTestCase(TestCase):
+    """测试品类闭包表的维护与树形筛选"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='closure_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='闭包测试IP', subject_type=4)
+        self.root = Category.objects.create(name='周边')
+        self.badge = Category.objects.create(name='吧唧', parent=self.root)
+        self.round_badge = Category.objects.create(name='圆形吧唧', parent=self.badge)
+        self.other = Category.objects.create(name='纸制品')
+
+        self.deep_goods = Goods.objects.create(
+            user=self.user, name='58mm吧唧', ip=self.ip, category=self.round_badge
+        )
+        self.other_goods = Goods.objects.create(
+            user=self.user, name='色纸', ip=self.ip, category=self.other
+        )
+
+    def _descendants(self, category):
+        return set(
+            CategoryClosure.objects.filter(ancestor=category).values_list('descendant_id', flat=True)
+        )
+
+    def test_closure_rows_on_create(self):
+        """新建品类自动生成祖先链"""
+        self.assertEqual(
+            self._descendants(self.root),
+            {self.root.id, self.badge.id, self.round_badge.id},
+        )
+        depth = CategoryClosure.objects.get(ancestor=self.root, descendant=self.round_badge).depth
+        self.assertEqual(depth, 2)
+
+    def test_move_subtree(self):
+        """移动父节点后整棵子树跟随迁移"""
+        self.badge.parent = self.other
+        self.badge.save()
+        self.assertEqual(self._descendants(self.root), {self.root.id})
+        self.assertEqual(
+            self._descendants(self.other),
+            {self.other.id, self.badge.id, self.round_badge.id},
+        )
+
+    def test_filter_category_tree_single_query(self):
+        """树形品类筛选包含所有层级的子品类"""
+        response = self.client.get(f'/api/goods/?category={self.root.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in response.json()['results']]
+        self.assertEqual(ids, [str(self.deep_goods.id)])
+
+        from .views.goods import GoodsFilter
+        with self.assertNumQueries(1):
+            qs = GoodsFilter({'category': self.root.id}, queryset=Goods.objects.all()).qs
+            list(qs.values_list('id', flat=True))
+
+
+class GoodsKeysetPaginationTestCase(TestCase):
+    """测试谷子列表游标分页"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='cursor_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='游标测试IP', subject_type=4)
+        self.cat = Category.objects.create(name='游标测试品类')
+        # 部分谷子 order 相同，验证并列时依靠 created_at / id 保持稳定
+        for i in range(25):
+            Goods.objects.create(
+                user=self.user,
+                name=f'谷子{i}',
+                ip=self.ip,
+                category=self.cat,
+                order=(i % 5) * 1000,
+            )
+
+    def _walk(self, url):
+        ids, pages = [], 0
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            ids.extend(item['id'] for item in data['results'])
+            pages += 1
+            if not data['next']:
+                return ids, pages, data
+            response = self.client.get(f"/api/goods/?cursor={data['next']}&page_size=10")
+
+    def test_cursor_matches_page_number_order(self):
+        """游标分页不重不漏，且顺序与页码分页一致"""
+        ids, pages, _ = self._walk('/api/goods/?pagination=cursor&page_size=10')
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+
+        expected = []
+        for page in (1, 2, 3):
+            data = self.client.get(f'/api/goods/?page={page}&page_size=10').json()
+            expected.extend(item['id'] for item in data['results'])
+        self.assertEqual(ids, expected)
+
+    def test_count_only_on_request(self):
+        """默认不计算总数"""
+        data = self.client.get('/api/goods/?pagination=cursor').json()
+        self.assertIsNone(data['count'])
+        data = self.client.get('/api/goods/?pagination=cursor&with_count=true').json()
+        self.assertEqual(data['count'], 25)
+
+    def test_ordering_created_at(self):
+        """按创建时间排序的游标翻页"""
+        ids, _, _ = self._walk('/api/goods/?pagination=cursor&ordering=created_at&page_size=10')
+        expected = [
+            str(pk) for pk in Goods.objects.order_by('created_at', 'id').values_list('id', flat=True)
+        ]
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_and_group_by(self):
+        """无效游标返回 404，group_by 不支持游标分页"""
+        response = self.client.get('/api/goods/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/goods/?pagination=cursor&group_by=ip')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GoodsSearchIndexTestCase(TestCase):
+    """测试谷子搜索文档 / FTS5 索引的增量维护与检索"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='search_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='崩坏：星穹铁道', subject_type=4)
+        IPKeyword.objects.create(ip=self.ip, value='HSR')
+        self.other_ip = IP.objects.create(name='原神', subject_type=4)
+        self.cat = Category.objects.create(name='吧唧')
+        self.firefly = Character.objects.create(ip=self.ip, name='流萤')
+        self.march = Character.objects.create(ip=self.ip, name='三月七')
+
+        self.badge = Goods.objects.create(
+            user=self.user, name='流萤生日吧唧', ip=self.ip, category=self.cat
+        )
+        self.badge.characters.set([self.firefly, self.march])
+        self.shikishi = Goods.objects.create(
+            user=self.user, name='璃月色纸', ip=self.other_ip, category=self.cat
+        )
+
+    def _search(self, term):
+        response = self.client.get('/api/goods/', {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_document_maintained(self):
+        """谷子 / 关键词 / 角色变化后文档同步更新"""
+        document = GoodsSearchDocument.objects.get(goods=self.badge)
+        self.assertIn('hsr', document.ip_text)
+        self.assertIn('三月七', document.character_text)
+
+        IPKeyword.objects.create(ip=self.ip, value='崩铁')
+        self.march.delete()
+        document.refresh_from_db()
+        self.assertIn('崩铁', document.ip_text)
+        self.assertNotIn('三月七', document.character_text)
+
+    def test_search_matches_all_fields(self):
+        """名称 / IP 名 / 关键词 / 角色名，长词与短词都能命中"""
+        badge_id = str(self.badge.id)
+        self.assertEqual(self._search('星穹铁道'), [badge_id])
+        self.assertEqual(self._search('hsr'), [badge_id])
+        self.assertEqual(self._search('流萤'), [badge_id])
+        self.assertEqual(self._search('三月七 吧唧'), [badge_id])
+        self.assertEqual(self._search('色纸'), [str(self.shikishi.id)])
+        self.assertEqual(self._search('不存在的词'), [])
+
+    def test_rename_reindexes(self):
+        """重命名谷子 / IP 后旧词不再命中"""
+        self.badge.name = '流萤立牌'
+        self.badge.save()
+        self.assertEqual(self._search('生日吧唧'), [])
+        self.ip.name = '崩坏星穹铁道'
+        self.ip.save()
+        self.assertEqual(self._search('崩坏星穹'), [str(self.badge.id)])
+
+    def test_fts_single_query_without_distinct(self):
+        """检索只 JOIN 搜索文档，不依赖多值 JOIN + distinct"""
+        qs = search.apply_search(Goods.objects.all(), ['星穹铁道', '流萤'])
+        self.assertNotIn('DISTINCT', str(qs.query))
+        if search.fts_available():
+            self.assertIn('MATCH', str(qs.query))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(qs.values_list('id', flat=True)), [self.badge.id])
+
+
+class SearchKeyTestCase(TestCase):
+    """测试归一化搜索键（子串 / 拼音 / 首字母 / 繁简）"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='searchkey_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='崩坏：星穹铁道', subject_type=4)
+        IPKeyword.objects.create(ip=self.ip, value='HSR')
+        self.other_ip = IP.objects.create(name='原神', subject_type=4)
+        self.firefly = Character.objects.create(ip=self.ip, name='流萤')
+        self.zhongli = Character.objects.create(ip=self.other_ip, name='钟离')
+        self.cat = Category.objects.create(name='吧唧')
+        self.goods = Goods.objects.create(
+            user=self.user, name='生日吧唧', ip=self.ip, category=self.cat
+        )
+        self.goods.characters.set([self.firefly])
+
+    def _ids(self, url, term):
+        response = self.client.get(url, {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        items = data['results'] if isinstance(data, dict) else data
+        return [item['id'] for item in items]
+
+    def test_keys_maintained(self):
+        """IP 关键词增删后搜索键同步"""
+        keyword = IPKeyword.objects.create(ip=self.ip, value='崩铁')
+        self.assertTrue(SearchKey.objects.filter(ip=self.ip, key='崩铁').exists())
+        keyword.delete()
+        self.assertFalse(SearchKey.objects.filter(ip=self.ip, key='崩铁').exists())
+        self.assertTrue(SearchKey.objects.filter(ip=self.ip, key='hsr').exists())
+
+    def test_ip_and_character_substring_search(self):
+        """IP / 角色搜索支持子串与大小写无关，角色可按所属 IP 关键词搜索"""
+        self.assertEqual(self._ids('/api/ips/', '星穹'), [self.ip.id])
+        self.assertEqual(self._ids('/api/ips/', 'hsr'), [self.ip.id])
+        self.assertEqual(self._ids('/api/ips/', '崩坏：星穹'), [self.ip.id])
+        self.assertEqual(self._ids('/api/characters/', '萤'), [self.firefly.id])
+        self.assertEqual(self._ids('/api/characters/', 'HSR'), [self.firefly.id])
+
+    def test_prefix_lookup_is_range_query(self):
+        """前缀查询使用范围条件而非 LIKE 扫描"""
+        qs = search.SearchKeyFilter.token_condition(IP, '星穹')
+        sql = str(IP.objects.filter(qs).query)
+        self.assertNotIn('LIKE', sql)
+        self.assertIn('>=', sql)
+
+    @skipUnless(textkeys.PINYIN_ENABLED, 'pypinyin 未安装')
+    def test_pinyin_and_initials(self):
+        """全拼 / 首字母 / 音节片段都能命中"""
+        for term in ('liuying', 'ly', 'ying'):
+            self.assertEqual(self._ids('/api/characters/', term), [self.firefly.id])
+            self.assertEqual(self._ids('/api/goods/', term), [str(self.goods.id)])
+        self.assertEqual(self._ids('/api/goods/', 'shengri'), [str(self.goods.id)])
+        self.assertEqual(self._ids('/api/ips/', 'yuanshen'), [self.other_ip.id])
+
+    @skipUnless(textkeys.FOLDING_ENABLED, 'zhconv 未安装')
+    def test_traditional_folding(self):
+        """繁体输入命中简体数据"""
+        self.assertEqual(self._ids('/api/ips/', '崩壞'), [self.ip.id])
+        self.assertEqual(self._ids('/api/goods/', '崩壞'), [str(self.goods.id)])
+        self.assertEqual(self._ids('/api/characters/', '鍾離'), [self.zhongli.id])
+
+
+class GoodsCardTestCase(TestCase):
+    """测试谷子列表卡片读模型"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='card_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='卡片测试IP', subject_type=4)
+        IPKeyword.objects.create(ip=self.ip, value='卡片')
+        self.cat = Category.objects.create(name='吧唧')
+        self.theme = Theme.objects.create(name='夏日', user=self.user)
+        self.node = StorageNode.objects.create(name='书架', user=self.user)
+        self.chars = [
+            Character.objects.create(ip=self.ip, name=f'角色{i}', avatar=f'characters/{i}.jpg')
+            for i in range(3)
+        ]
+        for i in range(12):
+            goods = Goods.objects.create(
+                user=self.user, name=f'谷子{i}', ip=self.ip, category=self.cat,
+                theme=self.theme, location=self.node, order=i,
+            )
+            goods.characters.set(self.chars[: i % 3 + 1])
+
+    def _serializer_results(self, response):
+        """直接用 GoodsListSerializer 序列化同一页，作为对照"""
+        from .serializers import GoodsListSerializer
+
+        ids = [item['id'] for item in response.json()['results']]
+        qs = Goods.objects.filter(id__in=ids).select_related(
+            'ip', 'category', 'location', 'theme', 'user'
+        ).prefetch_related('characters__ip')
+        by_id = {str(goods.id): goods for goods in qs}
+        return GoodsListSerializer(
+            [by_id[i] for i in ids], many=True, context={'request': response.wsgi_request}
+        ).data
+
+    def test_cards_match_serializer(self):
+        """卡片渲染结果与 GoodsListSerializer 完全一致"""
+        response = self.client.get('/api/goods/')
+        self.assertEqual(response.json()['results'], self._serializer_results(response))
+        self.assertEqual(GoodsCard.objects.count(), 12)
+
+    def test_constant_queries_with_warm_cards(self):
+        """卡片就绪后，列表查询次数与每页数量无关"""
+        cards.rebuild_all()
+        with self.assertNumQueries(4):  # 版本号（ETag）+ count + 本页谷子 + 本页卡片
+            self.client.get('/api/goods/?page_size=4')
+        with self.assertNumQueries(4):
+            self.client.get('/api/goods/?page_size=12')
+
+    def test_invalidation(self):
+        """关联对象变化后卡片随之更新"""
+        self.client.get('/api/goods/')
+        self.ip.name = '卡片测试IP改名'
+        self.ip.save()
+        IPKeyword.objects.create(ip=self.ip, value='新关键词')
+        Character.objects.create(ip=self.ip, name='新角色')
+        self.theme.name = '冬日'
+        self.theme.save()
+        Goods.objects.filter(user=self.user).update(location=None)
+
+        response = self.client.get('/api/goods/')
+        results = response.json()['results']
+        self.assertEqual(results, self._serializer_results(response))
+        first = results[0]
+        self.assertEqual(first['ip']['name'], '卡片测试IP改名')
+        self.assertEqual(first['ip']['character_count'], 4)
+        self.assertEqual(first['theme']['name'], '冬日')
+        self.assertIsNone(first['location_path'])
+
+
+
+class CompoundFormatTestCase(TestCase):
+    """测试 ?format=compound 侧载响应"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='compound_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.ip = IP.objects.create(name='侧载测试IP', subject_type=4)
+        IPKeyword.objects.create(ip=self.ip, value='侧载')
+        other_ip = IP.objects.create(name='客串IP', subject_type=4)
+        self.cat = Category.objects.create(name='吧唧')
+        self.theme = Theme.objects.create(name='夏日', user=self.user)
+        self.node = StorageNode.objects.create(name='书架', user=self.user)
+        self.chars = [
+            Character.objects.create(ip=self.ip, name=f'角色{i}', avatar=f'characters/{i}.jpg')
+            for i in range(3)
+        ]
+        self.chars.append(Character.objects.create(ip=other_ip, name='客串角色'))
+        for i in range(12):
+            goods = Goods.objects.create(
+                user=self.user, name=f'谷子{i}', ip=self.ip, category=self.cat,
+                theme=self.theme, location=self.node, order=i,
+            )
+            goods.characters.set(self.chars[: i % 4 + 1])
+
+    def test_rows_carry_ids_and_included_once(self):
+        """行内只有外键 ID，被引用对象在 included 中各出现一次，内容与嵌套格式一致"""
+        nested = self.client.get('/api/goods/').json()['results']
+        response = self.client.get('/api/goods/?format=compound')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 12)
+
+        first = data['results'][0]
+        self.assertEqual(first['ip'], self.ip.id)
+        self.assertEqual(first['location'], self.node.id)
+        self.assertNotIn('location_path', first)
+
+        included = data['included']
+        self.assertEqual(set(included['ip']), {str(self.ip.id), str(self.chars[3].ip_id)})
+        self.assertEqual(len(included['character']), 4)
+        self.assertEqual(included['location'][str(self.node.id)]['name'], '书架')
+        self.assertEqual(included['user'][str(self.user.id)]['username'], 'compound_user')
+
+        # 按 ID 还原后与嵌套格式一致
+        for row, item in zip(data['results'], nested):
+            self.assertEqual(included['ip'][str(row['ip'])], item['ip'])
+            self.assertEqual(included['category'][str(row['category'])], item['category'])
+            self.assertEqual(included['theme'][str(row['theme'])], item['theme'])
+            self.assertEqual(
+                [included['character'][str(c)]['name'] for c in row['characters']],
+                [c['name'] for c in item['characters']],
+            )
+            self.assertEqual(row['order'], item['order'])
+
+    def test_constant_queries(self):
+        """查询次数与每页数量无关"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        counts = []
+        for page_size in (2, 12):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(f'/api/goods/?format=compound&page_size={page_size}')
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_showcase_and_location(self):
+        """展柜谷子与位置谷子接口同样支持侧载格式"""
+        from .models import Showcase, ShowcaseGoods
+
+        showcase = Showcase.objects.create(user=self.user, name='我的展柜')
+        for i, goods in enumerate(Goods.objects.all()[:3]):
+            ShowcaseGoods.objects.create(showcase=showcase, goods=goods, order=i)
+
+        data = self.client.get(f'/api/showcases/{showcase.id}/goods/?format=compound').json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'][0]['goods']['ip'], self.ip.id)
+        self.assertIn(str(self.ip.id), data['included']['ip'])
+
+        data = self.client.get(f'/api/location/nodes/{self.node.id}/goods/?format=compound').json()
+        self.assertEqual(len(data['results']), 12)
+        self.assertEqual(list(data['included']['location']), [str(self.node.id)])
+
+
+class BatchLoaderTestCase(TestCase):
+    """测试序列化器批量加载：不依赖视图的 prefetch，查询次数与对象数量无关"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='loader_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.node = StorageNode.objects.create(name='书架', user=self.user)
+        self.cat = Category.objects.create(name='吧唧')
+        for i in range(8):
+            ip = IP.objects.create(name=f'加载器IP{i}', subject_type=4)
+            IPKeyword.objects.create(ip=ip, value=f'关键词{i}')
+            character = Character.objects.create(ip=ip, name=f'角色{i}')
+            goods = Goods.objects.create(
+                user=self.user, name=f'谷子{i}', ip=ip, category=self.cat,
+                location=self.node, order=i, main_photo=f'goods/main/{i}.jpg',
+            )
+            goods.characters.set([character])
+
+    def _count_queries(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return len(ctx)
+
+    def test_goods_serializer_without_prefetch(self):
+        """GoodsListSerializer 直接序列化裸查询集，查询次数不随数量增长，结果与预取时一致"""
+        from .serializers import GoodsListSerializer
+
+        def serialize(limit):
+            return GoodsListSerializer(
+                Goods.objects.order_by('order')[:limit], many=True, context={'request': None}
+            ).data
+
+        self.assertEqual(
+            self._count_queries(lambda: serialize(2)),
+            self._count_queries(lambda: serialize(8)),
+        )
+
+        prefetched = Goods.objects.order_by('order').select_related(
+            'ip', 'category', 'location', 'theme', 'user'
+        ).prefetch_related('ip__keywords', 'characters__ip__keywords')
+        expected = GoodsListSerializer(prefetched, many=True, context={'request': None}).data
+        data = serialize(8)
+        self.assertEqual(data, expected)
+        self.assertEqual(data[0]['ip']['character_count'], 1)
+        self.assertEqual(data[0]['location_path'], '书架')
+        self.assertEqual(data[0]['user']['username'], 'loader_user')
+
+    def test_showcase_list_preview_photos(self):
+        """展柜列表的预览图按批加载：取展柜内排序前四个谷子的主图"""
+        from .models import Showcase, ShowcaseGoods
+
+        goods = list(Goods.objects.order_by('order'))
+        for index in range(3):
+            showcase = Showcase.objects.create(user=self.user, name=f'展柜{index}', order=index)
+            for position, item in enumerate(reversed(goods)):
+                ShowcaseGoods.objects.create(showcase=showcase, goods=item, order=position)
+
+        single = self._count_queries(lambda: self.client.get('/api/showcases/private/?page_size=1'))
+        full = self._count_queries(lambda: self.client.get('/api/showcases/private/?page_size=3'))
+        self.assertEqual(single, full)
+
+        results = self.client.get('/api/showcases/private/').json()['results']
+        photos = results[0]['preview_photos']
+        self.assertEqual(len(photos), 4)
+        self.assertTrue(photos[0].endswith('/goods/main/7.jpg'))
+        self.assertTrue(photos[3].endswith('/goods/main/4.jpg'))
+
+
+class GoodsQueryPlanTestCase(TestCase):
+    """测试 GoodsViewSet 按动作推导的查询计划"""
+
+    def _plan(self, action):
+        from .views import GoodsViewSet
+
+        planner = GoodsViewSet.query_planners.get(action, GoodsViewSet.default_query_planner)
+        return planner.plan(Goods).describe()
+
+    def test_plan_per_action(self):
+        """记录各动作的计划：列表不 JOIN / 不读 notes，聚合与排序只读所需列，图片动作不预取附加图片"""
+        self.assertEqual(self._plan('list'), {
+            'select_related': [],
+            'prefetch_related': [],
+            'only': [
+                'id', 'name', 'main_photo', 'status', 'quantity', 'is_official', 'order',
+                'user', 'ip', 'category', 'theme', 'location', 'created_at', 'updated_at',
+            ],
+        })
+        self.assertEqual(self._plan('stats'), {
+            'select_related': [], 'prefetch_related': [], 'only': None,
+        })
+        self.assertEqual(self._plan('move'), {
+            'select_related': ['user'], 'prefetch_related': [], 'only': ['id', 'user', 'order'],
+        })
+
+        retrieve = self._plan('retrieve')
+        self.assertEqual(retrieve['select_related'], ['user', 'ip', 'category', 'theme', 'location'])
+        self.assertEqual(retrieve['prefetch_related'], [
+            'ip__keywords', 'characters', 'characters__ip', 'characters__ip__keywords',
+            'additional_photos',
+        ])
+        self.assertIn('notes', retrieve['only'])
+
+        similar = self._plan('similar_random')
+        self.assertNotIn('additional_photos', similar['prefetch_related'])
+        self.assertNotIn('notes', similar['only'])
+        self.assertIn('price', similar['only'])
+
+        upload = self._plan('upload_additional_photos')
+        self.assertNotIn('additional_photos', upload['prefetch_related'])
+        self.assertIsNone(upload['only'])
+
+    def test_list_and_detail_queries(self):
+        """列表查询不读取 notes；详情字段完整"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = APIClient()
+        role = Role.objects.create(name='测试角色')
+        user = User.objects.create(username='plan_user', password='testpass123', role=role)
+        client.force_authenticate(user=user)
+        ip = IP.objects.create(name='计划IP', subject_type=4)
+        category = Category.objects.create(name='吧唧')
+        goods = Goods.objects.create(
+            user=user, name='计划谷子', ip=ip, category=category, notes='很长的备注' * 100
+        )
+        goods.characters.set([Character.objects.create(ip=ip, name='计划角色')])
+
+        cards.rebuild_all()
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/api/goods/')
+        goods_sql = [q['sql'] for q in ctx.captured_queries if 'FROM "goods_goods"' in q['sql']]
+        self.assertTrue(goods_sql)
+        self.assertFalse(any('"notes"' in sql for sql in goods_sql))
+
+        response = client.get(f'/api/goods/{goods.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['notes'], '很长的备注' * 100)
+        self.assertEqual(data['user']['username'], 'plan_user')
+        self.assertEqual(data['characters'][0]['ip']['character_count'], 1)
+
+
+class SparseFieldsetTestCase(TestCase):
+    """测试 ?fields= / ?expand= 按需字段"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(
+            username='sparse_user',
+            password='testpass123',
+            role=self.role
+        )
+        self.client.force_authenticate(user=self.user)
+        self.ip = IP.objects.create(name='字段IP', subject_type=4)
+        self.cat = Category.objects.create(name='吧唧')
+        self.chars = [Character.objects.create(ip=self.ip, name=f'角色{i}') for i in range(2)]
+        for i in range(5):
+            goods = Goods.objects.create(
+                user=self.user, name=f'谷子{i}', ip=self.ip, category=self.cat, order=i,
+                notes='备注',
+            )
+            goods.characters.set(self.chars)
+        self.goods = Goods.objects.order_by('order').first()
+
+    def test_thin_list_has_no_joins(self):
+        """只要网格字段时，输出与 SQL 都只涉及这些列"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/goods/?fields=id,name,main_photo,status')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(set(results[0]), {'id', 'name', 'main_photo', 'status'})
+        self.assertEqual(len(ctx), 3)  # 版本号（ETag）+ count + 本页
+        page_sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', page_sql)
+        self.assertNotIn('"notes"', page_sql)
+
+    def test_collapse_and_expand(self):
+        """fields 中的嵌套字段默认折叠为 ID，expand 返回完整对象"""
+        first = self.client.get('/api/goods/?fields=name,ip,characters').json()['results'][0]
+        self.assertEqual(first['ip'], self.ip.id)
+        self.assertEqual(sorted(first['characters']), sorted(c.id for c in self.chars))
+
+        first = self.client.get('/api/goods/?fields=name&expand=ip').json()['results'][0]
+        self.assertEqual(set(first), {'id', 'name', 'ip'})
+        self.assertEqual(first['ip']['name'], '字段IP')
+
+        detail = self.client.get(f'/api/goods/{self.goods.id}/?fields=name,notes').json()
+        self.assertEqual(detail, {'id': str(self.goods.id), 'name': '谷子0', 'notes': '备注'})
+
+    def test_invalid_fields(self):
+        response = self.client.get('/api/goods/?fields=name,unknown')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/goods/?expand=name')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_showcase_goods(self):
+        from .models import Showcase, ShowcaseGoods
+
+        showcase = Showcase.objects.create(user=self.user, name='展柜')
+        ShowcaseGoods.objects.create(showcase=showcase, goods=self.goods, order=0)
+        data = self.client.get(f'/api/showcases/{showcase.id}/goods/?fields=name,category').json()
+        self.assertEqual(data[0]['goods'], {'id': str(self.goods.id), 'name': '谷子0', 'category': self.cat.id})
+        self.assertIn('notes', data[0])
+
+
+class GroupRecencyTestCase(TestCase):
+    """测试分组最近活动表的维护与 ?group_by= 排序"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='recency_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='recency_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        self.cat = Category.objects.create(name='吧唧')
+        self.ip_a = IP.objects.create(name='分组IP-A', subject_type=4)
+        self.ip_b = IP.objects.create(name='分组IP-B', subject_type=4)
+        self.char = Character.objects.create(ip=self.ip_a, name='分组角色')
+
+    def _latest(self, user, dimension, object_id):
+        row = GoodsGroupRecency.objects.filter(
+            user=user, dimension=dimension, dimension_id=object_id
+        ).first()
+        return row.latest_created_at if row else None
+
+    def test_table_follows_goods_changes(self):
+        """新建、改 IP、增删角色、删除谷子后表内容与实际数据一致"""
+        first = Goods.objects.create(user=self.user, name='A1', ip=self.ip_a, category=self.cat)
+        second = Goods.objects.create(user=self.user, name='A2', ip=self.ip_a, category=self.cat)
+        self.assertEqual(self._latest(self.user, 'ip', self.ip_a.id), second.created_at)
+        self.assertEqual(self._latest(self.user, 'category', self.cat.id), second.created_at)
+        # 其他用户的谷子不影响本用户的分组
+        Goods.objects.create(user=self.other, name='O1', ip=self.ip_a, category=self.cat)
+        self.assertEqual(self._latest(self.user, 'ip', self.ip_a.id), second.created_at)
+
+        second.ip = self.ip_b
+        second.save()
+        self.assertEqual(self._latest(self.user, 'ip', self.ip_a.id), first.created_at)
+        self.assertEqual(self._latest(self.user, 'ip', self.ip_b.id), second.created_at)
+
+        first.characters.add(self.char)
+        self.assertEqual(self._latest(self.user, 'character', self.char.id), first.created_at)
+        first.characters.clear()
+        self.assertIsNone(self._latest(self.user, 'character', self.char.id))
+        self.char.goods.add(second)
+        self.assertEqual(self._latest(self.user, 'character', self.char.id), second.created_at)
+
+        second.delete()
+        self.assertIsNone(self._latest(self.user, 'ip', self.ip_b.id))
+        self.assertIsNone(self._latest(self.user, 'character', self.char.id))
+
+        # 与全量重建结果一致
+        snapshot = set(GoodsGroupRecency.objects.values_list(
+            'user_id', 'dimension', 'dimension_id', 'latest_created_at'
+        ))
+        recency.rebuild()
+        self.assertEqual(snapshot, set(GoodsGroupRecency.objects.values_list(
+            'user_id', 'dimension', 'dimension_id', 'latest_created_at'
+        )))
+
+    def test_group_by_clusters_groups_without_self_join(self):
+        """group_by 按分组最近活动聚集，SQL 不再自连接 / DISTINCT"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        Goods.objects.create(user=self.user, name='A1', ip=self.ip_a, category=self.cat)
+        Goods.objects.create(user=self.user, name='B1', ip=self.ip_b, category=self.cat)
+        Goods.objects.create(user=self.user, name='A2', ip=self.ip_a, category=self.cat)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/goods/?group_by=ip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in response.json()['results']]
+        self.assertEqual(names, ['A2', 'A1', 'B1'])
+        page_sql = next(q['sql'] for q in ctx.captured_queries if 'goodsgrouprecency' in q['sql'])
+        self.assertNotIn('DISTINCT', page_sql)
+        self.assertNotIn('GROUP BY', page_sql)
+
+        response = self.client.get('/api/goods/?group_by=character')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class GroupSectionsTestCase(TestCase):
+    """测试 ?group_by=...&layout=sections 分段分组列表"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='sections_user', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        self.cat = Category.objects.create(name='吧唧')
+        self.ip_a = IP.objects.create(name='分段IP-A', subject_type=4)
+        self.ip_b = IP.objects.create(name='分段IP-B', subject_type=4)
+        self.char = Character.objects.create(ip=self.ip_a, name='分段角色')
+        for i in range(5):
+            goods = Goods.objects.create(user=self.user, name=f'A{i}', ip=self.ip_a, category=self.cat)
+            if i % 2 == 0:
+                goods.characters.add(self.char)
+        Goods.objects.create(user=self.user, name='B0', ip=self.ip_b, category=self.cat)
+
+    def test_headers_counts_and_first_items(self):
+        """分组头带数量，按最新谷子倒序，每组只返回前 section_size 件"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        cards.rebuild_all()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/goods/?group_by=ip&layout=sections&section_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        first, second = data['results']
+        self.assertEqual(first['group'], {'id': self.ip_b.id, 'name': '分段IP-B'})
+        self.assertEqual(first['count'], 1)
+        self.assertIsNone(first['next'])
+        self.assertEqual(second['count'], 5)
+        self.assertEqual([item['name'] for item in second['results']], ['A4', 'A3'])
+        self.assertIsNotNone(second['next'])
+        # 版本号（ETag）+ 分组头一次聚合 + 分组内容一次窗口查询 + 本页谷子 + 卡片，与分组数量无关
+        self.assertEqual(sum('GROUP BY' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(len(ctx), 5)
+
+    def test_load_more_with_section_cursor(self):
+        """用分组的 next 游标继续加载同一分组，直至取完"""
+        response = self.client.get('/api/goods/?group_by=ip&layout=sections&section_size=2')
+        section = response.json()['results'][1]
+        names = [item['name'] for item in section['results']]
+        cursor = section['next']
+        while cursor:
+            response = self.client.get(
+                f'/api/goods/?group_by=ip&section={self.ip_a.id}&cursor={cursor}&page_size=2'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names += [item['name'] for item in response.json()['results']]
+            cursor = response.json()['next']
+        self.assertEqual(names, ['A4', 'A3', 'A2', 'A1', 'A0'])
+
+    def test_character_sections_include_ungrouped(self):
+        """按角色分段时，没有角色的谷子归入 group 为 null 的分组"""
+        response = self.client.get('/api/goods/?group_by=character&layout=sections')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {
+            (item['group'] or {}).get('id'): item['count'] for item in response.json()['results']
+        }
+        self.assertEqual(counts, {self.char.id: 3, None: 3})
+
+        response = self.client.get('/api/goods/?group_by=character&section=none')
+        self.assertEqual(
+            [item['name'] for item in response.json()['results']], ['B0', 'A3', 'A1']
+        )
+
+
+class CollectionVersionTestCase(TestCase):
+    """测试数据版本号与读接口的 ETag / 304"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='etag_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='etag_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        # 本用例请求较多，避免限流计数影响其它用例
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.cat = Category.objects.create(name='吧唧')
+        self.ip = IP.objects.create(name='版本IP', subject_type=4)
+        Goods.objects.create(user=self.user, name='谷子', ip=self.ip, category=self.cat)
+
+    def _etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_not_modified_without_querying(self):
+        """If-None-Match 命中时只查询一次版本号即返回 304"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for url in ('/api/goods/', '/api/goods/stats/', '/api/categories/tree/', '/api/location/tree/'):
+            etag = self._etag(url)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(len(ctx), 1, url)
+
+    def test_writes_change_etag(self):
+        """本人的写入与公共目录写入都会改变 ETag，其他用户的写入不会"""
+        url = '/api/goods/'
+        etag = self._etag(url)
+        self.assertNotEqual(self._etag(url + '?page_size=5'), etag)
+
+        Goods.objects.create(user=self.other, name='别人的谷子', ip=self.ip, category=self.cat)
+        self.assertEqual(self._etag(url), etag)
+
+        goods = Goods.objects.create(user=self.user, name='新谷子', ip=self.ip, category=self.cat)
+        etag_after_create = self._etag(url)
+        self.assertNotEqual(etag_after_create, etag)
+
+        character = Character.objects.create(ip=self.ip, name='版本角色')
+        etag_after_catalog = self._etag(url)
+        self.assertNotEqual(etag_after_catalog, etag_after_create)
+
+        goods.characters.add(character)
+        self.assertNotEqual(self._etag(url), etag_after_catalog)
+
+    def test_version_bump_rolls_back_with_write(self):
+        """写入回滚时版本号一并回滚"""
+        from django.db import transaction
+        from core import versions
+
+        key = versions.user_key(self.user.id)
+        before = versions.current([key])[key]
+        try:
+            with transaction.atomic():
+                Goods.objects.create(user=self.user, name='回滚', ip=self.ip, category=self.cat)
+                self.assertEqual(versions.current([key])[key], before + 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(versions.current([key])[key], before)
+
+
+class ResponseCacheTestCase(TestCase):
+    """测试按数据版本号缓存的读接口响应"""
+
+    def setUp(self):
+        from django.core.cache import caches
+        from core import response_cache
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='cache_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='cache_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        for alias in ('default', response_cache.CACHE_ALIAS):
+            caches[alias].clear()
+            self.addCleanup(caches[alias].clear)
+        self.cat = Category.objects.create(name='吧唧')
+        self.ip = IP.objects.create(name='缓存IP', subject_type=4)
+        self.goods = Goods.objects.create(user=self.user, name='谷子', ip=self.ip, category=self.cat)
+
+    def test_hit_after_miss_and_canonical_params(self):
+        """等价请求（参数顺序不同）命中缓存，只查询版本号"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core import response_cache
+
+        response_cache.reset_stats()
+        first = self.client.get('/api/goods/?page_size=5&ip=%d' % self.ip.id)
+        self.assertEqual(first['X-Response-Cache'], 'miss')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/goods/?ip=%d&page_size=5' % self.ip.id)
+        self.assertEqual(second['X-Response-Cache'], 'hit')
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        stats = response_cache.stats()['GoodsViewSet.list']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        bypass = self.client.get('/api/goods/?page_size=5&ip=%d' % self.ip.id, HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(bypass['X-Response-Cache'], 'bypass')
+
+    def test_writes_produce_fresh_entries(self):
+        """写入后版本号变化，读到新数据；详情与公共目录接口同理"""
+        url = f'/api/goods/{self.goods.id}/'
+        self.assertEqual(self.client.get(url).json()['name'], '谷子')
+        self.assertEqual(self.client.get(url)['X-Response-Cache'], 'hit')
+        self.goods.name = '改名谷子'
+        self.goods.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Response-Cache'], 'miss')
+        self.assertEqual(response.json()['name'], '改名谷子')
+
+        names = lambda: [ip['name'] for ip in self.client.get('/api/ips/').json()]
+        self.assertIn('缓存IP', names())
+        IP.objects.create(name='新IP', subject_type=4)
+        self.assertIn('新IP', names())
+
+    def test_showcase_visibility_change(self):
+        """公开展柜转为私有后，其他用户不会读到缓存的详情"""
+        showcase = Showcase.objects.create(user=self.user, name='展柜', is_public=True)
+        viewer = APIClient()
+        viewer.force_authenticate(user=self.other)
+        url = f'/api/showcases/{showcase.id}/'
+        self.assertEqual(viewer.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(viewer.get(url)['X-Response-Cache'], 'hit')
+        showcase.is_public = False
+        showcase.save()
+        self.assertEqual(viewer.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StatsRollupTestCase(TestCase):
+    """测试统计汇总表的增量维护与 /api/goods/stats/ 汇总读取"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='rollup_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='rollup_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.cat_a = Category.objects.create(name='吧唧')
+        self.cat_b = Category.objects.create(name='立牌')
+        self.ip_a = IP.objects.create(name='汇总IP-A', subject_type=4)
+        self.ip_b = IP.objects.create(name='汇总IP-B', subject_type=1)
+        self.char_a = Character.objects.create(ip=self.ip_a, name='角色A')
+        self.char_b = Character.objects.create(ip=self.ip_a, name='角色B')
+        self.node = StorageNode.objects.create(name='书架', user=self.user)
+
+        self.g1 = Goods.objects.create(
+            user=self.user, name='G1', ip=self.ip_a, category=self.cat_a, quantity=2,
+            price=Decimal('12.50'), purchase_date=date(2024, 1, 3), location=self.node,
+        )
+        self.g1.characters.add(self.char_a, self.char_b)
+        self.g2 = Goods.objects.create(
+            user=self.user, name='G2', ip=self.ip_a, category=self.cat_b, status='sold',
+            purchase_date=date(2024, 2, 14), is_official=False, main_photo='goods/main/g2.jpg',
+        )
+        self.g2.characters.add(self.char_a)
+        self.g3 = Goods.objects.create(
+            user=self.user, name='G3', ip=self.ip_b, category=self.cat_a, quantity=3, price=Decimal('5.00'),
+        )
+        Goods.objects.create(user=self.other, name='O1', ip=self.ip_a, category=self.cat_a)
+
+    def _rows(self, user=None):
+        from .models import GoodsStatsRollup
+
+        return set(GoodsStatsRollup.objects.filter(user=user or self.user).values_list(
+            'dimension', 'key', 'goods_count', 'quantity_sum', 'value_sum'
+        ))
+
+    def _normalized(self, payload):
+        import json
+
+        payload = json.loads(json.dumps(payload))
+        # 计算时间每次不同，不参与比较
+        payload['meta'].pop('computed_at')
+        for name, items in payload['distributions'].items():
+            payload['distributions'][name] = sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+        return payload
+
+    def _assert_matches_live(self, params=''):
+        fast = self.client.get(f'/api/goods/stats/?{params}', HTTP_X_RESPONSE_CACHE='bypass')
+        # 额外的空参数使请求走实时聚合路径
+        live = self.client.get(f'/api/goods/stats/?{params}&purchase_start=', HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._normalized(fast.json()), self._normalized(live.json()))
+
+    def test_payload_matches_live_aggregation(self):
+        """汇总表组装的统计数据与实时聚合一致（各趋势粒度）"""
+        from . import rollups
+
+        Goods.objects.filter(pk=self.g3.pk).update(created_at=self.g3.created_at - timedelta(days=40))
+        rollups.rebuild([self.user.id])
+        for params in ('', 'group_by=week', 'group_by=day&top=1'):
+            self._assert_matches_live(params)
+
+    def test_rollups_follow_writes(self):
+        """改字段、增删角色、删除角色 / 位置 / 谷子、改作品类型后与全量重建一致"""
+        from apps.location.models import StorageNode
+        from . import rollups
+
+        self.g2.status = 'in_cabinet'
+        self.g2.price = Decimal('3.30')
+        self.g2.save()
+        self.g3.characters.add(self.char_b)
+        self.char_a.goods.remove(self.g1)
+        self.g2.characters.clear()
+        self.ip_b.subject_type = 2
+        self.ip_b.save()
+        self.char_b.delete()
+        self.node.delete()
+        self.assertFalse(StorageNode.objects.exists())
+        self.g1.delete()
+
+        incremental = self._rows()
+        other = self._rows(self.other)
+        rollups.rebuild()
+        self.assertEqual(incremental, self._rows())
+        self.assertEqual(other, self._rows(self.other))
+        self._assert_matches_live()
+
+    def test_unconverted_attribute_values(self):
+        """以字符串传入的单价 / 日期 / 数量按字段类型换算后计入汇总"""
+        from . import rollups
+
+        Goods.objects.create(
+            user=self.user, name='G4', ip=self.ip_b, category=self.cat_b,
+            quantity='2', price='1.25', purchase_date='2024-03-01',
+        )
+        incremental = self._rows()
+        rollups.rebuild([self.user.id])
+        self.assertEqual(incremental, self._rows())
+
+    def test_delta_creates_and_removes_rows(self):
+        """新键先补零值行再累加，累加后为空的行（含刚补的零值行）被删除"""
+        from . import rollups
+        from .models import GoodsStatsRollup
+
+        delta = rollups.Delta()
+        delta.changes[(self.user.id, 'category', 'new')] = [2, 5, Decimal('7.00')]
+        delta.changes[(self.user.id, 'category', 'gone')] = [-1, -1, Decimal('0')]
+        delta.apply()
+        self.assertEqual(
+            list(GoodsStatsRollup.objects.filter(user=self.user, key__in=['new', 'gone']).values_list(
+                'key', 'goods_count', 'quantity_sum', 'value_sum'
+            )),
+            [('new', 2, 5, Decimal('7.00'))],
+        )
+
+        delta = rollups.Delta()
+        delta.changes[(self.user.id, 'category', 'new')] = [-2, -5, Decimal('-7.00')]
+        delta.apply()
+        self.assertFalse(GoodsStatsRollup.objects.filter(user=self.user, key='new').exists())
+
+    def test_storage_node_destroy_endpoint(self):
+        """收纳位置删除接口批量置空谷子位置后，汇总同步更新"""
+        response = self.client.delete(f'/api/location/nodes/{self.node.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIn(('has_location', '0', 3, 6, Decimal('40.00')), self._rows())
+        self._assert_matches_live()
+
+    def test_fast_path_query_count(self):
+        """无筛选统计只读取汇总行与 TopN 名称，不再扫描谷子表"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/goods/stats/', HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['overview']['goods_count'], 3)
+        self.assertFalse(any('"goods_goods"' in q['sql'] for q in ctx.captured_queries))
+        # 版本号 + 汇总行 + 品类 / IP / 位置 / 角色名称
+        self.assertEqual(len(ctx), 6)
+
+
+@skipUnless(stats_engine.numpy_available(), '需要 numpy')
+class StatsEngineTestCase(TestCase):
+    """测试统计的列式引擎与逐项 SQL 聚合结果一致"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='engine_user', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        cat_a = Category.objects.create(name='吧唧')
+        cat_b = Category.objects.create(name='立牌')
+        self.ip_a = IP.objects.create(name='引擎IP-A', subject_type=4)
+        ip_b = IP.objects.create(name='引擎IP-B')
+        char_a = Character.objects.create(ip=self.ip_a, name='角色A')
+        char_b = Character.objects.create(ip=self.ip_a, name='角色B')
+        node = StorageNode.objects.create(name='书架', user=self.user)
+
+        specs = [
+            (self.ip_a, cat_a, node, 'in_cabinet', 2, Decimal('0.29'), date(2024, 1, 3), [char_a, char_b]),
+            (self.ip_a, cat_a, None, 'in_cabinet', 1, None, date(2024, 1, 28), [char_a]),
+            (self.ip_a, cat_b, node, 'sold', 3, Decimal('19.99'), date(2024, 3, 9), [char_a]),
+            (ip_b, cat_a, None, 'draft', 1, Decimal('5.00'), None, []),
+        ]
+        for ip, category, location, state, quantity, price, purchased, characters in specs:
+            goods = Goods.objects.create(
+                user=self.user, name='谷子', ip=ip, category=category, location=location,
+                status=state, quantity=quantity, price=price, purchase_date=purchased,
+            )
+            goods.characters.set(characters)
+        self.qs = Goods.objects.filter(user=self.user)
+
+    def _normalized(self, payload):
+        import json
+
+        payload = json.loads(json.dumps(payload, default=float), parse_float=lambda value: round(float(value), 2))
+        payload.get('meta', {}).pop('computed_at', None)
+        for name, items in payload['distributions'].items():
+            payload['distributions'][name] = sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+        return payload
+
+    def test_matches_sql_engine(self):
+        """各种筛选与趋势粒度下两种引擎的结果一致"""
+        querysets = [
+            self.qs,
+            self.qs.filter(status__in=['in_cabinet', 'draft']),
+            self.qs.filter(purchase_date__gte=date(2024, 1, 10)),
+            self.qs.filter(ip=self.ip_a).distinct(),
+            self.qs.none(),
+        ]
+        for qs in querysets:
+            for group_by in ('month', 'week', 'day'):
+                self.assertEqual(
+                    self._normalized(stats_engine.columnar_payload(qs, 10, group_by)),
+                    self._normalized(stats_engine.sql_payload(qs, 10, group_by)),
+                )
+
+    def test_filtered_request_uses_columnar_engine(self):
+        """带筛选的统计请求走列式引擎，查询次数少于逐项聚合"""
+        from django.db import connection
+        from django.test import override_settings
+        from django.test.utils import CaptureQueriesContext
+
+        url = f'/api/goods/stats/?ip={self.ip_a.id}'
+        with CaptureQueriesContext(connection) as columnar:
+            response = self.client.get(url, HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(response.json()['overview']['goods_count'], 3)
+        with override_settings(GOODS_STATS_ENGINE=stats_engine.ENGINE_SQL):
+            with CaptureQueriesContext(connection) as sql:
+                legacy = self.client.get(url, HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(self._normalized(response.json()), self._normalized(legacy.json()))
+        self.assertLess(len(columnar), len(sql))
+
+    def test_character_filter_matches_sql_engine(self):
+        """按角色筛选时两种引擎的角色分布都只包含筛选的角色"""
+        from django.test import override_settings
+
+        char_a = Character.objects.get(name='角色A', ip=self.ip_a)
+        url = f'/api/goods/stats/?character={char_a.id}'
+        response = self.client.get(url, HTTP_X_RESPONSE_CACHE='bypass')
+        with override_settings(GOODS_STATS_ENGINE=stats_engine.ENGINE_SQL):
+            legacy = self.client.get(url, HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(self._normalized(response.json()), self._normalized(legacy.json()))
+        self.assertEqual([item['characters__id'] for item in response.json()['distributions']['character_top']], [char_a.id])
+
+
+class StatsRevalidateTestCase(TestCase):
+    """测试带筛选统计的过期先返回、后台重算"""
+
+    def setUp(self):
+        from django.core.cache import caches
+        from core import response_cache, revalidate
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='swr_user', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        for alias in ('default', response_cache.CACHE_ALIAS):
+            caches[alias].clear()
+            self.addCleanup(caches[alias].clear)
+        self.cat = Category.objects.create(name='吧唧')
+        self.ip = IP.objects.create(name='看板IP', subject_type=4)
+        Goods.objects.create(user=self.user, name='谷子1', ip=self.ip, category=self.cat)
+        self.url = f'/api/goods/stats/?ip={self.ip.id}'
+
+        # 后台任务先收集起来，由测试手动执行（测试事务中的数据对其他线程不可见）
+        self.pending = []
+        original = revalidate.submit
+        revalidate.submit = self.pending.append
+        self.addCleanup(setattr, revalidate, 'submit', original)
+
+    def _count(self, response):
+        return response.json()['overview']['goods_count']
+
+    def test_stale_payload_then_background_refresh(self):
+        """数据变化后先返回旧结果并只提交一次重算，重算完成后返回新结果"""
+        first = self.client.get(self.url)
+        self.assertEqual(self._count(first), 1)
+        self.assertFalse(first.json()['meta']['stale'])
+
+        Goods.objects.create(user=self.user, name='谷子2', ip=self.ip, category=self.cat)
+        stale = self.client.get(self.url)
+        self.assertEqual(self._count(stale), 1)
+        self.assertTrue(stale.json()['meta']['stale'])
+        self.assertEqual(stale.json()['meta']['computed_at'], first.json()['meta']['computed_at'])
+        self.assertIn('Age', stale)
+        self.assertNotIn('ETag', stale)
+        # single-flight：重算执行前的其他请求不会再提交
+        self.client.get(self.url)
+        self.assertEqual(len(self.pending), 1)
+
+        self.pending.pop()()
+        fresh = self.client.get(self.url)
+        self.assertEqual(self._count(fresh), 2)
+        self.assertFalse(fresh.json()['meta']['stale'])
+        self.assertIn('ETag', fresh)
+
+    def test_bypass_computes_synchronously(self):
+        """X-Response-Cache: bypass 时不读旧结果"""
+        self.client.get(self.url)
+        Goods.objects.create(user=self.user, name='谷子2', ip=self.ip, category=self.cat)
+        response = self.client.get(self.url, HTTP_X_RESPONSE_CACHE='bypass')
+        self.assertEqual(self._count(response), 2)
+        self.assertFalse(response.json()['meta']['stale'])
+        self.assertEqual(self.pending, [])
+
+
+class GoodsExportTestCase(TestCase):
+    """测试 /api/goods/export/ 流式导出"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='export_user', password='testpass123', role=self.role)
+        self.other = User.objects.create(username='export_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        # 本用例请求较多，避免限流计数影响其它用例
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ip = IP.objects.create(name='导出IP, "甲"', subject_type=4)
+        self.cat = Category.objects.create(name='吧唧')
+        self.chars = [Character.objects.create(ip=self.ip, name=f'角色{i}') for i in range(3)]
+        for i in range(7):
+            goods = Goods.objects.create(
+                user=self.user, name=f'谷子{i}', ip=self.ip, category=self.cat, order=i,
+                price=Decimal('12.50'), status='sold' if i % 2 else 'in_cabinet', notes='第一行\n第二行',
+            )
+            goods.characters.set(self.chars[: i % 3 + 1])
+        Goods.objects.create(user=self.other, name='他人谷子', ip=self.ip, category=self.cat)
+
+    def _get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        """CSV：带表头与 BOM，字段正确转义，角色以 | 分隔，只包含自己的谷子"""
+        import csv
+        import io
+
+        response, body = self._get('/api/goods/export/?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="goods-', response['Content-Disposition'])
+        self.assertTrue(body.startswith('\ufeff'))
+        rows = list(csv.DictReader(io.StringIO(body[1:])))
+        self.assertEqual([row['name'] for row in rows], [f'谷子{i}' for i in range(7)])
+        self.assertEqual(rows[0]['ip'], '导出IP, "甲"')
+        self.assertEqual(rows[0]['category'], '吧唧')
+        self.assertEqual(rows[0]['notes'], '第一行\n第二行')
+        self.assertEqual(rows[0]['price'], '12.50')
+        self.assertEqual(rows[0]['theme'], '')
+        self.assertEqual(rows[2]['characters'], '角色0|角色1|角色2')
+        self.assertEqual(rows[2]['character_ids'], '|'.join(str(c.id) for c in self.chars))
+
+    def test_ndjson_honors_filters(self):
+        """NDJSON：每行一个对象；筛选参数与列表一致"""
+        import json
+
+        url = f'/api/goods/export/?format=ndjson&status=sold&character={self.chars[2].id}'
+        response, body = self._get(url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        items = [json.loads(line) for line in body.splitlines()]
+        listed = self.client.get(f'/api/goods/?status=sold&character={self.chars[2].id}').json()['results']
+        self.assertEqual([item['id'] for item in items], [item['id'] for item in listed])
+        self.assertEqual(items[0]['characters'], [{'id': c.id, 'name': c.name} for c in self.chars])
+        detail = self.client.get(f"/api/goods/{items[0]['id']}/").json()
+        self.assertEqual(items[0]['created_at'], detail['created_at'])
+
+        # 也可以用 Accept 头协商格式
+        response, body = self._get('/api/goods/export/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(body.splitlines()), 7)
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/goods/export/?ip=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queries_per_chunk(self):
+        """每块只有一次角色查询：查询次数随块数增长，与谷子数量无关"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import export
+
+        queryset = Goods.objects.filter(user=self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(export.rows(queryset, chunk_size=3))
+        self.assertEqual(len(rows), 7)
+        # 行查询 + 3 块各一次角色查询
+        self.assertEqual(len(ctx), 1 + 3)
+
+
+class GoodsImportTestCase(TestCase):
+    """测试 /api/goods/import/ 与 import_goods 批量导入"""
+
+    def setUp(self):
+        from apps.location.models import StorageNode
+
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='import_user', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        # 本用例请求较多，避免限流计数影响其它用例
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ip = IP.objects.create(name='导入IP', subject_type=4)
+        self.other_ip = IP.objects.create(name='另一IP', subject_type=1)
+        self.cat_root = Category.objects.create(name='周边', path_name='周边')
+        self.cat = Category.objects.create(name='吧唧', parent=self.cat_root, path_name='周边/吧唧')
+        self.char_a = Character.objects.create(ip=self.ip, name='角色A')
+        self.char_b = Character.objects.create(ip=self.ip, name='角色B')
+        # 与角色A同名、属于另一 IP 的角色：按本行 IP 消歧
+        Character.objects.create(ip=self.other_ip, name='角色A')
+        self.theme = Theme.objects.create(name='夏日', user=self.user)
+        self.node = StorageNode.objects.create(name='书架', user=self.user)
+        self.existing = Goods.objects.create(
+            user=self.user, name='已有谷子', ip=self.ip, category=self.cat,
+            price=Decimal('10.00'), purchase_date=date(2024, 1, 1), order=0,
+        )
+        self.existing.characters.add(self.char_a)
+
+    def _upload(self, content, name='goods.csv', **data):
+        import io
+
+        upload = io.BytesIO(content.encode('utf-8'))
+        upload.name = name
+        return self.client.post('/api/goods/import/', {'file': upload, **data}, format='multipart')
+
+    CSV_HEADER = 'name,ip,category,characters,quantity,price,purchase_date,status,theme,location\n'
+
+    def test_csv_import(self):
+        """名称批量解析，新谷子按文件顺序排在最前，派生数据与逐条新建一致"""
+        from . import rollups
+        from .models import GoodsStatsRollup
+
+        etag = self.client.get('/api/goods/')['ETag']
+        content = self.CSV_HEADER + (
+            '新谷子1,导入IP,周边/吧唧,角色A|角色B,2,12.5,2024-03-01,in_cabinet,夏日,书架\n'
+            '新谷子2,导入IP,吧唧,角色A,,,,,,\n'
+        )
+        response = self._upload(content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual((report['total'], report['created'], report['failed']), (2, 2, 0))
+
+        names = [item['name'] for item in self.client.get('/api/goods/').json()['results']]
+        self.assertEqual(names, ['新谷子1', '新谷子2', '已有谷子'])
+        first = Goods.objects.get(name='新谷子1')
+        self.assertEqual(set(first.characters.all()), {self.char_a, self.char_b})
+        self.assertEqual((first.quantity, first.price, first.theme, first.location), (2, Decimal('12.50'), self.theme, self.node))
+        self.assertNotEqual(self.client.get('/api/goods/')['ETag'], etag)
+
+        # 搜索文档、分组最近活动、统计汇总随导入维护
+        self.assertEqual(self.client.get('/api/goods/?search=新谷子').json()['count'], 2)
+        self.assertTrue(GoodsGroupRecency.objects.filter(
+            user=self.user, dimension=GoodsGroupRecency.DIMENSION_CHARACTER, dimension_id=self.char_b.id
+        ).exists())
+        incremental = set(GoodsStatsRollup.objects.values_list('dimension', 'key', 'goods_count', 'quantity_sum', 'value_sum'))
+        rollups.rebuild([self.user.id])
+        self.assertEqual(incremental, set(GoodsStatsRollup.objects.values_list('dimension', 'key', 'goods_count', 'quantity_sum', 'value_sum')))
+
+    def test_errors_and_duplicates(self):
+        """逐行报告错误与重复；有错误的行不影响其他行"""
+        content = self.CSV_HEADER + (
+            '已有谷子,导入IP,吧唧,角色A,1,10,2024-01-01,,,\n'   # 与已有谷子重复
+            '缺IP,,吧唧,角色B,,,,,,\n'
+            '坏数量,导入IP,吧唧,角色A,abc,,,,,\n'
+            '未知角色,导入IP,吧唧,不存在的角色,,,,,,\n'
+            '草稿,导入IP,吧唧,,,,,draft,,\n'
+            '文件内重复,导入IP,吧唧,角色B,,,,,,\n'
+            '文件内重复,导入IP,吧唧,角色B,3,,,,,\n'
+        )
+        report = self._upload(content).json()
+        self.assertEqual((report['created'], report['skipped'], report['failed']), (2, 2, 3))
+        self.assertEqual(set(report['errors'][0]['errors']), {'ip'})
+        self.assertEqual(set(report['errors'][1]['errors']), {'quantity'})
+        self.assertEqual([item['row'] for item in report['errors']], [2, 3, 4])
+        self.assertEqual(report['duplicates'][0]['candidates'], [str(self.existing.id)])
+        self.assertEqual(report['duplicates'][1]['duplicate_of_row'], 6)
+        self.assertEqual(Goods.objects.filter(user=self.user).count(), 3)
+
+        # merge：重复行的数量累加到已有谷子 / 文件内先出现的行
+        report = self._upload(
+            self.CSV_HEADER + '已有谷子,导入IP,吧唧,角色A,2,10,2024-01-01,,,\n'
+            '合并,导入IP,吧唧,角色A,1,,,,,\n合并,导入IP,吧唧,角色A,4,,,,,\n',
+            on_duplicate='merge',
+        ).json()
+        self.assertEqual((report['created'], report['merged']), (1, 2))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.quantity, 3)
+        self.assertEqual(Goods.objects.get(name='合并').quantity, 5)
+
+    def test_dry_run_and_ndjson_round_trip(self):
+        """dry_run 不写入；导出的 NDJSON 可导入到另一个用户名下"""
+        export = b''.join(self.client.get('/api/goods/export/?format=ndjson').streaming_content).decode('utf-8')
+        report = self._upload(export, name='goods.ndjson', dry_run='true').json()
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['skipped'], 1)
+        self.assertEqual(Goods.objects.count(), 1)
+
+        other = User.objects.create(username='import_other', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=other)
+        report = self._upload(export, name='goods.ndjson').json()
+        self.assertEqual(report['created'], 1, report)
+        copied = Goods.objects.get(user=other)
+        self.assertEqual((copied.name, copied.price, copied.category), ('已有谷子', Decimal('10.00'), self.cat))
+        self.assertEqual(list(copied.characters.all()), [self.char_a])
+
+    def test_queries_independent_of_rows(self):
+        """查询次数与行数无关"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def run(count, prefix):
+            content = self.CSV_HEADER + ''.join(
+                f'{prefix}{i},导入IP,吧唧,角色A|角色B,,,,,夏日,书架\n' for i in range(count)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._upload(content).json()['created'], count)
+            return len(ctx)
+
+        self.assertEqual(run(3, '少'), run(30, '多'))
+
+    def test_command(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write(self.CSV_HEADER + '命令导入,导入IP,吧唧,角色A,,,,,,\n')
+        self.addCleanup(os.unlink, handle.name)
+        out = StringIO()
+        call_command('import_goods', handle.name, '--user', 'import_user', stdout=out)
+        self.assertIn('新建 1', out.getvalue())
+        self.assertTrue(Goods.objects.filter(user=self.user, name='命令导入').exists())
+
+
+class DuplicateFingerprintTestCase(TestCase):
+    """测试重复检测指纹的维护与新建时的重复检测"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='fingerprint_user', password='testpass123', role=self.role)
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ip = IP.objects.create(name='指纹IP', subject_type=4)
+        self.cat = Category.objects.create(name='吧唧')
+        self.char_a = Character.objects.create(ip=self.ip, name='角色A')
+        self.char_b = Character.objects.create(ip=self.ip, name='角色B')
+        self.goods = Goods.objects.create(
+            user=self.user, name='流萤 吧唧', ip=self.ip, category=self.cat,
+            price=Decimal('35.00'), purchase_date=date(2024, 3, 1),
+        )
+        self.goods.characters.add(self.char_a, self.char_b)
+
+    def _assert_consistent(self):
+        from . import fingerprint
+
+        stored = dict(Goods.objects.values_list('id', 'duplicate_fingerprint'))
+        self.assertEqual(fingerprint.rebuild(), 0)
+        self.assertEqual(stored, dict(Goods.objects.values_list('id', 'duplicate_fingerprint')))
+
+    def _payload(self, **overrides):
+        payload = {
+            'name': '流萤 吧唧', 'ip_id': self.ip.id, 'category_id': self.cat.id,
+            'character_ids': [self.char_b.id, self.char_a.id], 'price': '35', 'purchase_date': '2024-03-01',
+        }
+        payload.update(overrides)
+        return payload
+
+    def test_fingerprint_follows_changes(self):
+        """改字段、部分字段保存、增删角色（含从角色一侧）、删除角色后与全量重算一致"""
+        self._assert_consistent()
+        before = Goods.objects.get(pk=self.goods.pk).duplicate_fingerprint
+        self.goods.price = '40'
+        self.goods.save()
+        self._assert_consistent()
+        self.goods.name = '流萤 色纸'
+        self.goods.save(update_fields=['name'])
+        self._assert_consistent()
+        self.goods.characters.remove(self.char_b)
+        self._assert_consistent()
+        self.char_a.goods.clear()
+        self._assert_consistent()
+        self.char_b.goods.add(self.goods)
+        self.char_b.delete()
+        self._assert_consistent()
+        self.assertNotEqual(Goods.objects.get(pk=self.goods.pk).duplicate_fingerprint, before)
+
+    def test_create_detects_duplicates(self):
+        """角色顺序、全角空格 / 大小写与单价写法不同仍判定为重复；角色集合不同则不重复"""
+        response = self.client.post(
+            '/api/goods/', self._payload(name=' 流萤　吧唧 ', price='35.0'), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['candidates'][0]['id'], str(self.goods.id))
+
+        response = self.client.post('/api/goods/', self._payload(character_ids=[self.char_a.id]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self._assert_consistent()
+
+        response = self.client.post('/api/goods/', self._payload(merge_strategy='merge'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quantity, 2)
+
+    def test_lookup_is_single_query(self):
+        from .views.goods import GoodsViewSet
+
+        validated = {
+            'ip': self.ip, 'name': '流萤 吧唧', 'purchase_date': date(2024, 3, 1),
+            'price': Decimal('35.00'), 'characters': [self.char_a, self.char_b],
+        }
+        with self.assertNumQueries(1):
+            candidates = GoodsViewSet()._find_duplicate_candidates(self.user, validated)
+        self.assertEqual(candidates, [self.goods])
@@ -0,0 +1,94 @@
+"""
+搜索键（SearchKey）的文本归一化与生成，纯函数，不依赖模型（迁移中也可直接使用）。
+
+- fold_text：NFKC（全角转半角）+ 小写 + 繁体转简体（需 zhconv）。
+- search_keys：把一段文本拆成词，为每个词生成「后缀键」——原文按字、全拼按音节、首字母按字，
+  这样「包含子串 / 拼音片段」就变成对索引列的前缀（范围）查询，例如：
+  流萤 -> 流萤 / 萤 / liuying / ying / ly / y；用户输入 lx、liuy、崩壞 都能命中。
+
+pypinyin / zhconv 为可选依赖：未安装时分别跳过拼音键与繁简折叠，原文后缀键不受影响。
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pragma: no cover - 可选依赖
+    lazy_pinyin = None
+
+try:
+    import zhconv
+except ImportError:  # pragma: no cover - 可选依赖
+    zhconv = None
+
+# 单个键的最大长度（与 SearchKey.key 的 max_length 一致）
+MAX_KEY_LENGTH = 100
+
+# 每个词最多生成的后缀数量，防止超长名称写入过多行
+MAX_SUFFIXES = 32
+
+# 拆词：除字母 / 数字 / 汉字以外的字符（空格、标点、冒号等）都视为分隔符
+_SPLIT_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# 纯小写字母，可能是拼音 / 首字母输入
+_PINYIN_LIKE_RE = re.compile(r"^[a-z]+$")
+
+# 范围查询上界：UTF-8 下大于任何合法字符
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+PINYIN_ENABLED = lazy_pinyin is not None
+FOLDING_ENABLED = zhconv is not None
+
+
+def fold_text(text) -> str:
+    """归一化：全角转半角、小写、繁体转简体。"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    if zhconv is not None:
+        text = zhconv.convert(text, "zh-hans")
+    return text
+
+
+def tokenize(text) -> list:
+    """归一化后按非字母数字字符切分，去掉空串。"""
+    return [token for token in _SPLIT_RE.split(fold_text(text)) if token]
+
+
+def is_pinyin_like(token: str) -> bool:
+    return bool(_PINYIN_LIKE_RE.match(token))
+
+
+def _unit_variants(token: str, raw: bool, pinyin: bool) -> list:
+    """返回词的若干「单元序列」：原文按字切，全拼按音节切，首字母按字切。"""
+    variants = []
+    if raw:
+        variants.append(list(token))
+    if pinyin and lazy_pinyin is not None:
+        syllables = [s for s in lazy_pinyin(token, style=Style.NORMAL) if s]
+        if syllables and "".join(syllables) != token:
+            variants.append(syllables)
+            variants.append([s[0] for s in syllables])
+    return variants
+
+
+def search_keys(text, raw: bool = True, pinyin: bool = True) -> set:
+    """
+    为文本生成全部搜索键（已去重）。
+
+    raw: 是否生成原文后缀键（谷子名称已有 FTS 覆盖，可只生成拼音键）。
+    pinyin: 是否生成全拼 / 首字母后缀键（需 pypinyin）。
+    """
+    keys = set()
+    for token in tokenize(text):
+        for units in _unit_variants(token, raw, pinyin):
+            for start in range(min(len(units), MAX_SUFFIXES)):
+                keys.add("".join(units[start:])[:MAX_KEY_LENGTH])
+    return keys
+
+
+def query_tokens(term) -> list:
+    """把用户输入的一个搜索词归一化为若干前缀（与 search_keys 使用相同的切分规则）。"""
+    return [token[:MAX_KEY_LENGTH] for token in tokenize(term)]
@@ -2,7 +2,7 @@
 Goods app views module.
 导出所有视图类和函数，保持向后兼容。
 """
-from .goods import GoodsFilter, GoodsPagination, GoodsViewSet
+from .goods import GoodsFilter, GoodsKeysetPagination, GoodsPagination, GoodsViewSet
 from .ip import IPViewSet
 from .character import CharacterViewSet
 from .category import CategoryViewSet
@@ -19,6 +19,7 @@ __all__ = [
     "GoodsViewSet",
     "GoodsFilter",
     "GoodsPagination",
+    "GoodsKeysetPagination",
     "IPViewSet",
     "CharacterViewSet",
     "CategoryViewSet",
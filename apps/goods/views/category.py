@@ -7,14 +7,16 @@ from rest_framework import filters as drf_filters, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from ..models import Category, Goods
+from ..models import Category, CategoryClosure, Goods
 from ..serializers import (
     CategoryBatchUpdateOrderSerializer,
     CategoryDetailSerializer,
     CategorySimpleSerializer,
     CategoryTreeSerializer,
 )
+from core import closure
 from core.permissions import IsAdminOrReadOnly
+from core.versions import CATALOG_SCOPE, conditional_by_version
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -54,16 +56,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
     
     def get_all_descendants(self, category):
         """
-        递归获取品类的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
+        获取品类的所有后代节点（包括子节点、子节点的子节点等）
+        返回包含该节点及其所有后代的列表，走闭包表一次查询完成
         """
-        descendants = [category]
-        children = category.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
+        return list(
+            Category.objects.filter(
+                id__in=closure.descendant_ids(CategoryClosure, category.id)
+            )
+        )
     
     @action(detail=False, methods=["get"], url_path="tree")
+    @conditional_by_version(CATALOG_SCOPE, cache=True)
     def tree(self, request):
         """
         获取品类树一次性下发接口
@@ -135,16 +138,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         """
         删除品类时：
-        1. 递归获取所有子节点（包括子节点的子节点）
+        1. 通过闭包表获取所有子节点（包括子节点的子节点）
         2. 检查是否有商品关联到这些品类（包括子节点）
         3. 如果有商品关联，返回错误
         4. 删除根节点（由于 CASCADE，删除父节点会自动删除所有子节点）
         """
         instance = self.get_object()
         
-        # 获取所有要删除的节点（包括当前节点及其所有后代）
-        nodes_to_delete = self.get_all_descendants(instance)
-        node_ids = [node.id for node in nodes_to_delete]
+        # 要删除的节点（当前节点及其所有后代），以闭包子查询表示
+        node_ids = closure.descendant_ids(CategoryClosure, instance.id)
         
         # 检查是否有商品关联到这些品类
         goods_count = Goods.objects.filter(category_id__in=node_ids).count()
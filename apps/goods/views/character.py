@@ -2,9 +2,10 @@
 角色（Character）相关的视图
 """
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters as drf_filters, viewsets
+from rest_framework import viewsets
 
 from ..models import Character
+from ..search import SearchKeyFilter
 from ..serializers import CharacterSimpleSerializer
 from core.permissions import IsAdminOrReadOnly
 
@@ -23,7 +24,8 @@ class CharacterViewSet(viewsets.ModelViewSet):
 
     queryset = Character.objects.all().select_related("ip").order_by("created_at")
     serializer_class = CharacterSimpleSerializer
-    filter_backends = (DjangoFilterBackend, drf_filters.SearchFilter)
+    # ?search= 走 SearchKey 索引前缀查询（支持拼音 / 首字母 / 繁简），search_fields 仅用于接口文档
+    filter_backends = (DjangoFilterBackend, SearchKeyFilter)
     search_fields = ("name", "ip__name", "ip__keywords__value")
     filterset_fields = {
         "ip": ["exact"],
@@ -1,10 +1,10 @@
 """
 谷子（Goods）相关的视图和过滤器
 """
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Count, DateField, DecimalField, ExpressionWrapper, F, Max, Min, Q, Sum, Value
-from django.db.models.functions import Cast, Coalesce, TruncDate, TruncMonth, TruncWeek
-from django.db import connection
+from django.db.models import F, Min, Q
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import OpenApiResponse, extend_schema
 from django_filters import (
     BaseInFilter,
@@ -15,30 +15,57 @@ from django_filters import (
     NumberFilter,
 )
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters as drf_filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework.throttling import ScopedRateThrottle
 
+import base64
+import csv
 import datetime
 import hashlib
+import json
 import random
-from decimal import Decimal
+import secrets
 
 from django.core.cache import cache
 
-from ..models import Category, Character, Goods, GuziImage
-from apps.location.models import StorageNode
+from ..models import CategoryClosure, Character, Goods, GuziImage
+from apps.location.models import StorageNodeClosure
+from apps.users.models import User
 from ..serializers import (
     GoodsDetailSerializer,
     GoodsDuplicateCandidateSerializer,
     GoodsListSerializer,
     GoodsMoveSerializer,
+    GoodsRowSerializer,
 )
 from ..utils import compress_image
-from ..similarity import GoodsSimilarityCalculator, SeedSelector, SimilarityGroupBuilder
+from ..similarity import GoodsSimilarityCalculator, SeedSelector
+from ..search import GoodsSearchFilter
+from .. import (
+    cards,
+    compound,
+    export,
+    fingerprint,
+    importer,
+    neighbors,
+    recency,
+    rollups,
+    sections,
+    similarity_engine,
+    stats_engine,
+)
+from core import closure, revalidate, versions
+from core.planner import QueryPlanner, planner_for
+from core.renderers import CSVRenderer, CompoundJSONRenderer, NDJSONRenderer, wants_compound
+from core.sparse import parse_fieldset, sparse_serializer
+from core.versions import CATALOG_SCOPE, USER_SCOPE, conditional_by_version
 from core.permissions import IsOwnerOnly, is_admin
 
 
@@ -98,6 +125,144 @@ class GoodsPagination(PageNumberPagination):
         return self.page.previous_page_number()
 
 
+class GoodsKeysetPagination(BasePagination):
+    """
+    谷子列表游标（keyset）分页，按需启用：?pagination=cursor 或携带 ?cursor=<token>。
+
+    以全序排序键的最后一行取值作为不透明游标，下一页用 WHERE (排序键) > (游标值) 直接定位，
+    不做 OFFSET 扫描，默认也不执行 COUNT(*)，第 1 页与第 500 页代价相同。
+    返回格式：
+    {
+        "count": 总数（仅 ?with_count=true 时计算，否则为 null）,
+        "page_size": 每页数量,
+        "ordering": 排序键,
+        "next": 下一页游标（如果没有则为null）,
+        "results": [...]
+    }
+    """
+    page_size = 18
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+
+    # 可选排序键 -> 全序字段（末位必须是唯一列，保证翻页稳定不重不漏）
+    ORDERINGS = {
+        "order": ("order", "-created_at", "id"),  # 与 move 接口一致的默认全序
+        "-created_at": ("-created_at", "-id"),
+        "created_at": ("created_at", "id"),
+        "-updated_at": ("-updated_at", "-id"),
+    }
+    default_ordering = "order"
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        params = request.query_params
+        return params.get("pagination") == "cursor" or cls.cursor_query_param in params
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering_key(self, request, payload=None) -> str:
+        # 未显式指定 ordering 时沿用游标内记录的排序键，直接回传 next 即可翻页
+        key = (
+            request.query_params.get(self.ordering_query_param)
+            or (payload or {}).get("o")
+            or self.default_ordering
+        )
+        if key not in self.ORDERINGS:
+            raise ValidationError(
+                {"ordering": f"可选值：{', '.join(self.ORDERINGS)}"}
+            )
+        return key
+
+    def encode_cursor(self, ordering_key, obj) -> str:
+        values = []
+        for field in self.ORDERINGS[ordering_key]:
+            value = getattr(obj, field.lstrip("-"))
+            values.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        raw = json.dumps({"o": ordering_key, "v": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def load_cursor(token) -> dict:
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        except Exception:
+            raise NotFound("无效的游标")
+        if not isinstance(payload, dict):
+            raise NotFound("无效的游标")
+        return payload
+
+    def decode_cursor(self, payload, ordering_key) -> list:
+        try:
+            if payload["o"] != ordering_key:
+                raise ValueError("ordering mismatch")
+            fields = self.ORDERINGS[ordering_key]
+            if len(payload["v"]) != len(fields):
+                raise ValueError("length mismatch")
+            return [
+                Goods._meta.get_field(field.lstrip("-")).to_python(raw)
+                for field, raw in zip(fields, payload["v"])
+            ]
+        except Exception:
+            raise NotFound("无效的游标")
+
+    @staticmethod
+    def keyset_filter(fields, values) -> Q:
+        """构造字典序「严格位于游标之后」的条件：(a > x) OR (a = x AND b > y) OR ..."""
+        condition = Q()
+        equal_prefix = Q()
+        for field, value in zip(fields, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal_prefix & Q(**{f"{name}__{lookup}": value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        token = request.query_params.get(self.cursor_query_param)
+        payload = self.load_cursor(token) if token else None
+        self.ordering_key = self.get_ordering_key(request, payload)
+        fields = self.ORDERINGS[self.ordering_key]
+
+        queryset = queryset.order_by(*fields)
+        with_count = request.query_params.get("with_count", "").lower() in ("1", "true")
+        self.count = queryset.count() if with_count else None
+
+        if payload is not None:
+            queryset = queryset.filter(
+                self.keyset_filter(fields, self.decode_cursor(payload, self.ordering_key))
+            )
+
+        # 多取一行用于判断是否还有下一页
+        rows = list(queryset[: self.page_size_value + 1])
+        has_next = len(rows) > self.page_size_value
+        rows = rows[: self.page_size_value]
+        self.next_cursor = (
+            self.encode_cursor(self.ordering_key, rows[-1]) if has_next and rows else None
+        )
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "page_size": self.page_size_value,
+            "ordering": self.ordering_key,
+            "next": self.next_cursor,
+            "results": data,
+        })
+
+
 class GoodsFilter(FilterSet):
     """谷子过滤集，正确处理多对多字段characters"""
     
@@ -134,73 +299,43 @@ class GoodsFilter(FilterSet):
             "character",
         ]
 
-    def _get_category_descendant_ids(self, category: Category) -> list[int]:
+    def _get_category_descendant_ids(self, category_id):
         """
         获取指定品类的所有后代品类ID（包含自身）。
-        由于品类层级通常不深，这里用递归即可。
+        走闭包表，返回惰性子查询，无论树多深都只有一次索引查询。
         """
-        ids: list[int] = []
-
-        def dfs(node: Category):
-            ids.append(node.id)
-            for child in node.children.all():
-                dfs(child)
+        return closure.descendant_ids(CategoryClosure, category_id)
 
-        # 预加载 children，避免递归过程中 N+1
-        category = Category.objects.prefetch_related("children").get(pk=category.pk)
-        dfs(category)
-        return ids
-
-    def _get_location_descendant_ids(self, node: StorageNode) -> list[int]:
+    def _get_location_descendant_ids(self, node_id):
         """
         获取指定物理位置节点的所有后代节点 ID（包含自身）。
-        与品类类似，同样采用自关联树结构。
+        走收纳闭包表，非管理员按 (user, ancestor) 索引限定在本人的收纳树内。
         """
-        ids: list[int] = []
-
-        def dfs(n: StorageNode):
-            ids.append(n.id)
-            for child in n.children.all():
-                dfs(child)
-
-        # 预加载 children，避免递归过程中 N+1
-        node = StorageNode.objects.prefetch_related("children").get(pk=node.pk)
-        dfs(node)
+        ids = closure.descendant_ids(StorageNodeClosure, node_id)
+        req_user = getattr(self, "request", None) and getattr(self.request, "user", None)
+        if req_user is not None and not is_admin(req_user):
+            ids = ids.filter(user=req_user)
         return ids
 
     def filter_category_tree(self, queryset, name, value):
         """
         树形品类筛选：
         - ?category=<id>：返回该品类及其所有子品类下的谷子
+        - 品类不存在时闭包子查询为空，自然返回空结果
         """
         if not value:
             return queryset
-        try:
-            category = Category.objects.get(pk=value)
-        except Category.DoesNotExist:
-            return queryset.none()
-
-        ids = self._get_category_descendant_ids(category)
-        return queryset.filter(category_id__in=ids)
+        return queryset.filter(category_id__in=self._get_category_descendant_ids(value))
 
     def filter_location_tree(self, queryset, name, value):
         """
         树形位置筛选：
         - ?location=<id>：返回该位置及其所有子节点下的谷子
+        - 节点不存在或不属于当前用户时闭包子查询为空，自然返回空结果
         """
         if not value:
             return queryset
-        try:
-            node_qs = StorageNode.objects.all()
-            req_user = getattr(self, "request", None) and getattr(self.request, "user", None)
-            if req_user is not None and not is_admin(req_user):
-                node_qs = node_qs.filter(user=req_user)
-            node = node_qs.get(pk=value)
-        except StorageNode.DoesNotExist:
-            return queryset.none()
-
-        ids = self._get_location_descendant_ids(node)
-        return queryset.filter(location_id__in=ids)
+        return queryset.filter(location_id__in=self._get_location_descendant_ids(value))
 
 
 class GoodsViewSet(viewsets.ModelViewSet):
@@ -220,22 +355,41 @@ class GoodsViewSet(viewsets.ModelViewSet):
 
     # 列表接口瘦身：只返回必要字段；详情接口使用完整序列化器
     def get_serializer_class(self):
-        if self.action == "list":
-            return GoodsListSerializer
-        return GoodsDetailSerializer
+        # 相似随机的响应格式与列表相同（查询计划也按列表序列化器生成）
+        serializer_class = (
+            GoodsListSerializer if self.action in ("list", "similar_random") else GoodsDetailSerializer
+        )
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            return sparse_serializer(serializer_class, *fieldset)
+        return serializer_class
+
+    # 支持 ?fields= / ?expand= 的动作，及其除序列化器字段外还需读取的列（权限校验 / 游标排序）
+    SPARSE_COLUMNS = {
+        "list": ("user", "order", "created_at", "updated_at"),
+        "retrieve": ("user",),
+    }
+
+    def get_fieldset(self):
+        """?fields= / ?expand=（见 core/sparse.py）；侧载格式下忽略。"""
+        if self.action not in self.SPARSE_COLUMNS or wants_compound(self.request):
+            return None
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = parse_fieldset(self.request)
+        return self._fieldset
 
     # 过滤 & 搜索
     filter_backends = (
         DjangoFilterBackend,
-        drf_filters.SearchFilter,
+        GoodsSearchFilter,
     )
 
     # 使用自定义FilterSet来正确处理多对多字段characters
     filterset_class = GoodsFilter
 
-    # 轻量搜索：
-    # - 对 Goods.name 走索引（已在模型上 db_index=True）
-    # - 同时支持按 IP 名称 / 多关键词(IPKeyword) 搜索
+    # 搜索：?search= 走 GoodsSearchDocument / FTS5 索引（见 apps/goods/search.py），
+    # 覆盖谷子名称 / IP 名称 / 多关键词(IPKeyword) / 角色名。
+    # search_fields 保留为原 SearchFilter 的等价字段集合，供基准对比（bench_goods_search）使用。
     search_fields = (
         "name",
         "ip__name",
@@ -250,19 +404,79 @@ class GoodsViewSet(viewsets.ModelViewSet):
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = "goods_search"
     parser_classes = (MultiPartParser, FormParser, JSONParser)
+    # ?format=compound：列表改为侧载结构（见 apps/goods/compound.py）
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CompoundJSONRenderer]
 
     # 稀疏排序步长（避免频繁重排）
     ORDER_STEP = 1000
 
+    # 各动作的查询计划（见 core/planner.py）：由渲染所用的序列化器推导 JOIN / 预取 / 读取列，
+    # 未列出的动作使用 default_query_planner（完整详情）。
+    query_planners = {
+        # 嵌套部分来自预构建卡片，只读行上的标量列、卡片签名外键列与游标排序列
+        "list": QueryPlanner(
+            GoodsRowSerializer,
+            columns=("user", "ip", "category", "theme", "location", "created_at", "updated_at"),
+        ),
+        "retrieve": QueryPlanner(GoodsDetailSerializer),
+        "update": QueryPlanner(GoodsDetailSerializer, full_row=True),
+        "partial_update": QueryPlanner(GoodsDetailSerializer, full_row=True),
+        "destroy": QueryPlanner(full_row=True),
+        # 只做聚合
+        "stats": QueryPlanner(),
+        # 导出以主键子查询重新起步，按需读取列
+        "export": QueryPlanner(),
+        # 相似度计算额外用到单价、入手日期与创建时间
+        "similar_random": QueryPlanner(
+            GoodsListSerializer, columns=("price", "purchase_date", "created_at")
+        ),
+        "move": QueryPlanner(columns=("order",), relations=("user",)),
+        # 只做权限校验，相似谷子按列表计划另行读取
+        "similar": QueryPlanner(columns=("user",)),
+        # 图片动作会修改附加图片后再渲染详情，不能预取（否则返回旧数据）
+        "upload_main_photo": QueryPlanner(
+            GoodsDetailSerializer, full_row=True, skip=("additional_photos",)
+        ),
+        "upload_additional_photos": QueryPlanner(
+            GoodsDetailSerializer, full_row=True, skip=("additional_photos",)
+        ),
+        "delete_additional_photo": QueryPlanner(
+            GoodsDetailSerializer, full_row=True, skip=("additional_photos",)
+        ),
+        "delete_additional_photos": QueryPlanner(
+            GoodsDetailSerializer, full_row=True, skip=("additional_photos",)
+        ),
+    }
+    default_query_planner = QueryPlanner(GoodsDetailSerializer, full_row=True)
+
+    @property
+    def paginator(self):
+        """
+        列表接口按需切换为游标分页（?pagination=cursor 或 ?cursor=...），其余保持页码分页。
+        """
+        if not hasattr(self, "_paginator"):
+            if self.action == "list" and GoodsKeysetPagination.is_requested(self.request):
+                self._paginator = GoodsKeysetPagination()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_query_plan(self):
+        if self.get_fieldset() is not None:
+            planner = planner_for(self.get_serializer_class(), self.SPARSE_COLUMNS[self.action])
+        else:
+            planner = self.query_planners.get(self.action, self.default_query_planner)
+        return planner.plan(Goods)
+
     def get_queryset(self):
         """
-        使用 select_related / prefetch_related 彻底解决 N+1 查询问题。
+        按动作的查询计划加载（select_related / prefetch_related / only），
+        既避免 N+1，也不为用不到的关联和大字段（如 notes）付出代价。
+        列表接口读取预构建的卡片（见 apps/goods/cards.py），只需谷子行本身，不再 JOIN / prefetch。
         """
-        qs = (
-            Goods.objects.all()
-            .select_related("ip", "category", "location", "theme", "user")
-            .prefetch_related("characters__ip", "additional_photos")
-        )
+        qs = self.get_query_plan().apply(Goods.objects.all())
         user = getattr(self.request, "user", None)
         if not user or not getattr(user, "id", None):
             return qs.none()
@@ -270,17 +484,19 @@ class GoodsViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(user=user)
 
+    @conditional_by_version(USER_SCOPE, CATALOG_SCOPE, cache=True)
     def list(self, request, *args, **kwargs):
         """
         重写list方法以支持group_by参数进行分组显示。
         支持按 ip（IP作品）、character（角色）、category（品类）、theme（主题）分组。
-        使用group_by时，返回格式与普通列表相同，只是谷子按分组字段排序并聚集在一起。
+        使用group_by时，返回格式与普通列表相同，只是谷子按分组字段排序并聚集在一起；
+        ?layout=sections 时改为分段返回（分组头 + 每组前 N 件 + 每组游标），?section= 加载某一分组的更多谷子。
         """
         group_by = request.query_params.get('group_by', None)
 
-        # 如果没有group_by参数，使用默认的列表行为
+        # 如果没有group_by参数，使用默认的列表行为（卡片渲染）
         if not group_by:
-            return super().list(request, *args, **kwargs)
+            return self._list_response(self.filter_queryset(self.get_queryset()))
 
         # 验证group_by参数
         valid_group_fields = ['ip', 'character', 'category', 'theme']
@@ -289,78 +505,134 @@ class GoodsViewSet(viewsets.ModelViewSet):
                 {"detail": f"Invalid group_by value. Must be one of: {', '.join(valid_group_fields)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        # 获取过滤后的queryset，并按分组字段排序
+        # 获取过滤后的queryset
         queryset = self.filter_queryset(self.get_queryset())
 
-        # 根据group_by参数对queryset进行排序
-        if group_by == 'ip':
-            # 按IP下最新谷子的时间倒序，使最近有新谷子的IP排在前面
-            queryset = queryset.annotate(
-                ip_latest=Max('ip__goods__created_at')
-            ).order_by('-ip_latest', '-created_at')
-        elif group_by == 'character':
-            # 按角色分组比较特殊，因为是多对多关系
-            # 按角色下最新谷子的时间倒序
-            queryset = queryset.annotate(
-                character_latest=Max('characters__goods__created_at')
-            ).order_by('-character_latest', '-created_at').distinct()
-        elif group_by == 'category':
-            # 按品类下最新谷子的时间倒序
-            queryset = queryset.annotate(
-                category_latest=Max('category__goods__created_at')
-            ).order_by('-category_latest', '-created_at')
-        elif group_by == 'theme':
-            # 按主题下最新谷子的时间倒序，使最近有新谷子的主题排在前面
-            queryset = queryset.annotate(
-                theme_latest=Max('theme__goods__created_at')
-            ).order_by('-theme_latest', '-created_at')
+        section = request.query_params.get(sections.SECTION_PARAM)
+        if section is not None:
+            # 分段模式下加载某一分组的更多谷子：按创建时间倒序，可配合分组返回的 next 游标翻页
+            queryset = queryset.filter(
+                sections.section_filter(group_by, sections.parse_section(section))
+            )
+            return self._list_response(queryset.order_by(*sections.SECTION_ORDERING))
+
+        if isinstance(self.paginator, GoodsKeysetPagination):
+            return Response(
+                {"detail": "group_by 暂不支持游标分页，请使用 page 参数"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if sections.wants_sections(request):
+            return self._sections_response(queryset, group_by)
+
+        # 按分组最近活动倒序（来自预计算的 GoodsGroupRecency，按唯一索引逐行查找，无需自连接聚合），
+        # 使最近有新谷子的分组排在前面；同一分组的谷子聚集在一起，组内按创建时间倒序
+        queryset = recency.order_by_group(queryset, group_by)
 
         # 使用标准分页器对排序后的queryset进行分页
+        return self._list_response(queryset)
+
+    @conditional_by_version(USER_SCOPE, CATALOG_SCOPE, cache=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def _sections_response(self, queryset, group_by):
+        """
+        分段分组列表（?layout=sections，见 apps/goods/sections.py）：分页针对分组，
+        每个分组返回谷子数量、最新的 section_size 件谷子与加载更多用的 next 游标。
+        """
+        section_size = sections.get_section_size(self.request)
+        all_headers = sections.headers(queryset, group_by)
+        page = self.paginate_queryset(all_headers)
+        headers = all_headers if page is None else page
+        group_ids = [header["group"]["id"] if header["group"] else None for header in headers]
+        item_ids = sections.first_items(queryset, group_by, group_ids, section_size)
+
+        loaded = {
+            goods.pk: goods
+            for goods in self.get_queryset().filter(
+                pk__in=[goods_id for ids in item_ids.values() for goods_id in ids]
+            )
+        }
+        goods_by_group = {
+            group_id: [loaded[goods_id] for goods_id in ids if goods_id in loaded]
+            for group_id, ids in item_ids.items()
+        }
+        ordered = [goods for group_id in group_ids for goods in goods_by_group[group_id]]
+
+        included = None
+        if self.get_fieldset() is not None:
+            rows = self.get_serializer(ordered, many=True).data
+        elif wants_compound(self.request):
+            rows, included = compound.build(ordered, self.request)
+        else:
+            rows = cards.render(ordered, self.request)
+
+        cursor = GoodsKeysetPagination()
+        results = []
+        offset = 0
+        for header, group_id in zip(headers, group_ids):
+            items = goods_by_group[group_id]
+            has_more = header["count"] > len(items)
+            results.append({
+                **header,
+                "results": rows[offset:offset + len(items)],
+                "next": cursor.encode_cursor("-created_at", items[-1]) if has_more and items else None,
+            })
+            offset += len(items)
+
+        if page is None:
+            data = {"results": results}
+            if included is not None:
+                data["included"] = included
+            return Response(data)
+        response = self.get_paginated_response(results)
+        if included is not None:
+            response.data["included"] = included
+        return response
+
+    def _list_response(self, queryset):
+        """
+        分页并用预构建的列表卡片渲染（输出与 GoodsListSerializer 一致）。
+        ?format=compound 时行内只保留外键 ID，被引用对象放在与 results 同级的 included 中。
+        """
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
+        if self.get_fieldset() is not None:
+            # 按需字段：直接用裁剪后的序列化器渲染（卡片只覆盖完整输出）
+            serializer = self.get_serializer(queryset if page is None else page, many=True)
+            if page is None:
+                return Response(serializer.data)
             return self.get_paginated_response(serializer.data)
 
+        if wants_compound(self.request):
+            rows, included = compound.build(queryset if page is None else page, self.request)
+            if page is None:
+                return Response({"results": rows, "included": included})
+            response = self.get_paginated_response(rows)
+            response.data["included"] = included
+            return response
+
+        if page is not None:
+            return self.get_paginated_response(cards.render(page, self.request))
+
         # 如果没有分页，直接返回所有数据
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(cards.render(queryset, self.request))
 
     def _find_duplicate_candidates(self, user, validated_data):
         """
         根据「用户 + IP + 名称 + 角色集合 + 入手日期 + 单价」查找可能重复的谷子，返回候选列表。
+        判定条件预先哈希为谷子行上的 duplicate_fingerprint（见 apps/goods/fingerprint.py），只需一次索引等值查询。
         """
         ip = validated_data.get("ip")
-        characters = validated_data.get("characters", [])
-        name = validated_data.get("name")
-        purchase_date = validated_data.get("purchase_date")
-        price = validated_data.get("price")
-
-        query = Goods.objects.filter(
-            user=user,
-            ip=ip,
-            name=name,
-            purchase_date=purchase_date,
-            price=price,
+        value = fingerprint.compute(
+            user.pk,
+            ip.pk if ip is not None else None,
+            validated_data.get("name"),
+            validated_data.get("purchase_date"),
+            validated_data.get("price"),
+            [character.pk for character in validated_data.get("characters", [])],
         )
-
-        if characters:
-            character_ids = sorted([c.id for c in characters])
-            query = query.annotate(character_count=Count("characters")).filter(
-                character_count=len(character_ids)
-            )
-            candidates = []
-            for candidate in query.prefetch_related("characters"):
-                candidate_ids = sorted([c.id for c in candidate.characters.all()])
-                if candidate_ids == character_ids:
-                    candidates.append(candidate)
-            return candidates
-
-        if query.exists():
-            first = query.first()
-            if first.characters.count() == 0:
-                return [first]
-        return []
+        return list(Goods.objects.filter(duplicate_fingerprint=value, user=user))
 
     @extend_schema(
         responses={
@@ -590,6 +862,8 @@ class GoodsViewSet(viewsets.ModelViewSet):
                     updates.append(obj)
             if updates:
                 Goods.objects.bulk_update(updates, ["order"])
+                # bulk_update 不触发信号，手动递增数据版本号
+                versions.bump_user(owner_user.id)
 
         def _compute_new_order(prev_obj, next_obj):
             if prev_obj and next_obj:
@@ -874,17 +1148,22 @@ class GoodsViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=["get"], url_path="stats")
+    @conditional_by_version(USER_SCOPE, CATALOG_SCOPE, cache=True)
     def stats(self, request):
         """
         统计图表数据接口（用于前端 dashboard / 图表展示）。
 
-        - 复用 list 的过滤/搜索能力（GoodsFilter + SearchFilter），包括：
+        - 复用 list 的过滤/搜索能力（GoodsFilter + GoodsSearchFilter），包括：
           ip / category(树形) / location(树形) / theme / status / status__in / is_official / character / search
         - 额外支持时间范围（purchase_date 为主）：
           ?purchase_start=YYYY-MM-DD&purchase_end=YYYY-MM-DD
           ?created_start=YYYY-MM-DD&created_end=YYYY-MM-DD
         - 支持 topN 与趋势粒度：
           ?top=10&group_by=month|week|day
+        - 只带 top / group_by 时（普通用户的全量统计）读取统计汇总表，结果与实时聚合一致；
+          其余请求由 stats_engine 计算（默认列式引擎：一次读取筛选结果的列数组，NumPy 一次算完）
+        - 数据变化后，带筛选的统计先返回上一次的结果（meta.stale=true，Age 头为结果年龄），后台重算；
+          meta.computed_at 为结果的计算时间
         """
 
         def _parse_int(val: str | None, default: int) -> int:
@@ -902,9 +1181,6 @@ class GoodsViewSet(viewsets.ModelViewSet):
             except Exception:
                 return None
 
-        def _choice_map(choices: tuple[tuple[object, str], ...]) -> dict[object, str]:
-            return {k: v for k, v in choices}
-
         top_n = _parse_int(request.query_params.get("top"), default=10)
         group_by = (request.query_params.get("group_by") or "month").lower().strip()
         if group_by not in ("month", "week", "day"):
@@ -915,6 +1191,21 @@ class GoodsViewSet(viewsets.ModelViewSet):
         created_start = _parse_date(request.query_params.get("created_start"))
         created_end = _parse_date(request.query_params.get("created_end"))
 
+        meta = {
+            "top": top_n,
+            "group_by": group_by,
+            "purchase_start": purchase_start.isoformat() if purchase_start else None,
+            "purchase_end": purchase_end.isoformat() if purchase_end else None,
+            "created_start": created_start.isoformat() if created_start else None,
+            "created_end": created_end.isoformat() if created_end else None,
+        }
+
+        if self._stats_from_rollups(request):
+            # 无筛选：直接读取增量维护的统计汇总表（apps/goods/rollups.py），代价与收藏规模无关
+            meta.update(computed_at=datetime.datetime.now(datetime.timezone.utc).isoformat(), stale=False)
+            payload = {"meta": meta, **rollups.stats_payload(request.user.id, top_n, group_by)}
+            return Response(payload, status=status.HTTP_200_OK)
+
         qs = self.filter_queryset(self.get_queryset())
 
         # 额外时间范围过滤（不影响其他维度）
@@ -927,199 +1218,146 @@ class GoodsViewSet(viewsets.ModelViewSet):
         if created_end:
             qs = qs.filter(created_at__date__lte=created_end)
 
-        zero = Value(Decimal("0.00"))
-        value_expr = ExpressionWrapper(
-            F("quantity") * Coalesce(F("price"), zero),
-            output_field=DecimalField(max_digits=20, decimal_places=2),
-        )
+        # 按角色筛选时角色分布只统计筛选的角色（取值已由 GoodsFilter 校验）
+        character_ids = [int(value) for value in request.query_params.getlist("character") if value]
 
-        # 概览卡片（overview）
-        overview = qs.aggregate(
-            goods_count=Count("id", distinct=True),
-            quantity_sum=Coalesce(Sum("quantity"), Value(0)),
-            # 估算总金额：quantity * price（price 为空按 0 计）
-            value_sum=Coalesce(Sum(value_expr), zero),
-            with_price_count=Count("id", filter=Q(price__isnull=False), distinct=True),
-            missing_price_count=Count("id", filter=Q(price__isnull=True), distinct=True),
-            with_purchase_date_count=Count(
-                "id", filter=Q(purchase_date__isnull=False), distinct=True
-            ),
-            missing_purchase_date_count=Count(
-                "id", filter=Q(purchase_date__isnull=True), distinct=True
-            ),
-            with_location_count=Count("id", filter=Q(location__isnull=False), distinct=True),
-            missing_location_count=Count(
-                "id", filter=Q(location__isnull=True), distinct=True
-            ),
-            with_main_photo_count=Count(
-                "id", filter=Q(main_photo__isnull=False), distinct=True
-            ),
-            missing_main_photo_count=Count(
-                "id", filter=Q(main_photo__isnull=True), distinct=True
-            ),
+        # 数据变化后先返回上一次的结果（meta.stale=true），后台重算（core/revalidate.py）
+        result = revalidate.serve(
+            "GoodsViewSet.stats",
+            request,
+            lambda: stats_engine.compute(qs, top_n, group_by, character_ids=character_ids),
+        )
+        meta.update(
+            computed_at=datetime.datetime.fromtimestamp(result.computed_at, tz=datetime.timezone.utc).isoformat(),
+            stale=result.stale,
         )
+        payload = {"meta": meta, **result.data}
 
-        status_label_map = _choice_map(Goods.STATUS_CHOICES)
-        subject_type_label_map = _choice_map(getattr(Goods.ip.field.related_model, "SUBJECT_TYPE_CHOICES", ()))  # type: ignore[attr-defined]
+        return revalidate.mark(Response(payload, status=status.HTTP_200_OK), result)
 
-        # 分布：状态 / 官非 / 品类 / IP / 位置
-        status_dist = list(
-            qs.values("status")
-            .annotate(goods_count=Count("id", distinct=True), quantity_sum=Sum("quantity"))
-            .order_by("-goods_count")
-        )
-        for item in status_dist:
-            item["label"] = status_label_map.get(item["status"], item["status"])
+    # 不影响统计范围的参数：只带这些参数时可以读取统计汇总表
+    STATS_ROLLUP_PARAMS = {"top", "group_by", api_settings.URL_FORMAT_OVERRIDE}
 
-        official_dist = list(
-            qs.values("is_official")
-            .annotate(goods_count=Count("id", distinct=True), quantity_sum=Sum("quantity"))
-            .order_by("-goods_count")
-        )
-        for item in official_dist:
-            item["label"] = "官谷" if item["is_official"] else "同人/非官谷"
-
-        category_top = list(
-            qs.values("category_id", "category__name", "category__path_name", "category__color_tag")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
-                value_sum=Coalesce(Sum(value_expr), zero),
-            )
-            .order_by("-goods_count")[:top_n]
+    def _stats_from_rollups(self, request) -> bool:
+        """普通用户查看自己的全部谷子时走汇总表；任何筛选参数或管理员（跨用户统计）走实时聚合。"""
+        user = request.user
+        if not getattr(user, "id", None) or is_admin(user):
+            return False
+        return set(request.query_params).issubset(self.STATS_ROLLUP_PARAMS)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[CSVRenderer, NDJSONRenderer],
+    )
+    def export(self, request):
+        """
+        导出谷子（?format=csv|ndjson，默认 csv；也可用 Accept: text/csv / application/x-ndjson 协商）。
+
+        - 与列表相同的筛选 / 搜索参数（GoodsFilter + GoodsSearchFilter），按列表默认顺序输出全部结果（不分页）；
+        - 分块读取、按块批量查询角色，流式输出（见 apps/goods/export.py），内存占用与收藏规模无关。
+        """
+        export_format = request.accepted_renderer.format
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export.lines(queryset, export_format),
+            content_type=export.CONTENT_TYPES[export_format],
         )
+        response["Content-Disposition"] = f'attachment; filename="{export.filename(export_format)}"'
+        return response
 
-        ip_top = list(
-            qs.values("ip_id", "ip__name", "ip__subject_type")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
-                value_sum=Coalesce(Sum(value_expr), zero),
-            )
-            .order_by("-goods_count")[:top_n]
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser, FormParser],
+        permission_classes=[IsAuthenticated],
+    )
+    def import_goods(self, request):
+        """
+        批量导入谷子（multipart/form-data，见 apps/goods/importer.py）。
+        字段：
+        - file（必填）：CSV 或 NDJSON 文件，UTF-8 编码，列与导出接口一致
+        - format（可选）：csv / ndjson，默认按文件扩展名判断（.ndjson / .jsonl 为 NDJSON，其余为 CSV）
+        - on_duplicate（可选）：skip（默认，跳过并报告）/ new（仍然新建）/ merge（候选唯一时累加数量）
+        - dry_run（可选）：true 时只校验并返回报告，不写入
+        - user_id（可选，仅管理员）：导入到指定用户名下
+
+        返回逐行的错误与重复报告；有错误的行不影响其他行导入。
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "请上传 file 文件"}, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = request.data.get("format") or (
+            importer.FORMAT_NDJSON
+            if upload.name.lower().endswith((".ndjson", ".jsonl"))
+            else importer.FORMAT_CSV
         )
-        for item in ip_top:
-            st = item.get("ip__subject_type")
-            item["subject_type_label"] = subject_type_label_map.get(st, None)
-
-        location_top = list(
-            qs.values("location_id", "location__name", "location__path_name")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
-                value_sum=Coalesce(Sum(value_expr), zero),
+        if import_format not in importer.FORMATS:
+            return Response(
+                {"detail": f"format 可选值：{', '.join(importer.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .order_by("-goods_count")[:top_n]
-        )
-
-        # 多对多：角色 TopN（按“包含该角色的商品数”计）
-        character_top = list(
-            qs.values("characters__id", "characters__name", "characters__ip__id", "characters__ip__name")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
-                value_sum=Coalesce(Sum(value_expr), zero),
+        on_duplicate = request.data.get("on_duplicate") or importer.ON_DUPLICATE_SKIP
+        if on_duplicate not in importer.ON_DUPLICATE_CHOICES:
+            return Response(
+                {"detail": f"on_duplicate 可选值：{', '.join(importer.ON_DUPLICATE_CHOICES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .order_by("-goods_count")[:top_n]
-        )
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
 
-        # IP 作品类型分布（适合饼图/堆叠柱状图）
-        ip_subject_type_dist = list(
-            qs.values("ip__subject_type")
-            .annotate(goods_count=Count("id", distinct=True), quantity_sum=Sum("quantity"))
-            .order_by("-goods_count")
-        )
-        for item in ip_subject_type_dist:
-            st = item.get("ip__subject_type")
-            item["label"] = subject_type_label_map.get(st, "未知")
+        owner = request.user
+        user_id = request.data.get("user_id")
+        if user_id:
+            if not is_admin(request.user):
+                return Response({"detail": "仅管理员可指定 user_id"}, status=status.HTTP_403_FORBIDDEN)
+            owner = User.objects.filter(pk=user_id).first() if str(user_id).isdigit() else None
+            if owner is None:
+                return Response({"detail": "user_id 对应的用户不存在"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 趋势：按 purchase_date（主）与 created_at（辅助）
-        # 对于 SQLite，当 group_by=day 时，使用 Cast 而不是 TruncDate，避免 django_datetime_cast_date 函数的问题
-        is_sqlite = connection.vendor == 'sqlite'
-        
-        if group_by == "month":
-            trunc_purchase = TruncMonth("purchase_date")
-            trunc_created = TruncMonth("created_at")
-        elif group_by == "week":
-            trunc_purchase = TruncWeek("purchase_date")
-            trunc_created = TruncWeek("created_at")
-        else:
-            # SQLite 的 TruncDate 使用 django_datetime_cast_date 函数，可能有 NULL 值处理问题
-            # 对于 DateField (purchase_date)，使用 Cast 来转换为日期类型，更安全
-            # 对于 DateTimeField (created_at)，仍然使用 TruncDate，因为它可能不会有问题
-            if is_sqlite:
-                trunc_purchase = Cast("purchase_date", DateField())
-                trunc_created = TruncDate("created_at")  # DateTimeField 使用 TruncDate
-            else:
-                trunc_purchase = TruncDate("purchase_date")
-                trunc_created = TruncDate("created_at")
-
-        # 先过滤掉 NULL 值，然后再进行 annotate，避免 SQLite 的 TruncDate 函数接收到 NULL 值
-        # 创建一个新的 queryset，显式移除默认排序，避免 SQLite 的 date() 函数接收到 NULL 值
-        # 使用 Goods.objects 而不是 qs，避免继承默认排序和复杂的 JOIN
-        # 显式调用 order_by() 来移除模型的默认排序
-        purchase_trend_qs = (
-            Goods.objects
-            .filter(purchase_date__isnull=False)
-            .filter(id__in=qs.values_list('id', flat=True))  # 应用之前的过滤条件
-            .order_by()  # 显式移除默认排序
-        )
-        
-        purchase_trend = list(
-            purchase_trend_qs
-            .annotate(bucket=trunc_purchase)
-            .values("bucket")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
-                value_sum=Coalesce(Sum(value_expr), zero),
+        try:
+            report = importer.import_records(
+                importer.read_records(upload, import_format), owner, on_duplicate, dry_run
             )
-            .order_by("bucket")
-        )
-        for item in purchase_trend:
-            # JSON 友好化：datetime/date -> ISO 字符串
-            b = item.get("bucket")
-            item["bucket"] = b.isoformat() if b else None
-
-        created_trend = list(
-            qs.annotate(bucket=trunc_created)
-            .values("bucket")
-            .annotate(
-                goods_count=Count("id", distinct=True),
-                quantity_sum=Sum("quantity"),
+        except (UnicodeDecodeError, csv.Error):
+            return Response(
+                {"detail": "无法解析文件，请确认为 UTF-8 编码的 CSV / NDJSON"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .order_by("bucket")
-        )
-        for item in created_trend:
-            b = item.get("bucket")
-            item["bucket"] = b.isoformat() if b else None
-
-        payload = {
-            "meta": {
-                "top": top_n,
-                "group_by": group_by,
-                "purchase_start": purchase_start.isoformat() if purchase_start else None,
-                "purchase_end": purchase_end.isoformat() if purchase_end else None,
-                "created_start": created_start.isoformat() if created_start else None,
-                "created_end": created_end.isoformat() if created_end else None,
-            },
-            "overview": overview,
-            "distributions": {
-                "status": status_dist,
-                "is_official": official_dist,
-                "ip_subject_type": ip_subject_type_dist,
-                "category_top": category_top,
-                "ip_top": ip_top,
-                "character_top": character_top,
-                "location_top": location_top,
-            },
-            "trends": {
-                "purchase_date": purchase_trend,
-                "created_at": created_trend,
-            },
-        }
+        return Response(report, status=status.HTTP_200_OK)
 
-        return Response(payload, status=status.HTTP_200_OK)
+    # 相似谷子默认返回数量（最大为近邻表保存的数量，见 neighbors.neighbor_count()）
+    SIMILAR_DEFAULT_K = 20
+
+    @action(detail=True, methods=["get"], url_path="similar")
+    @conditional_by_version(USER_SCOPE, CATALOG_SCOPE)
+    def similar(self, request, pk=None):
+        """
+        相似谷子（「更多类似」）：所属用户收藏中与该谷子最相似的前 k 件（?k=，默认 20）。
+
+        直接读取预先维护的近邻表（GoodsNeighbor，见 apps/goods/neighbors.py），
+        一次按 (goods, rank) 索引的查询取得相似谷子行，不在请求中计算相似度；
+        每项格式与列表接口相同，另含 score（相似度分数）。
+        """
+        goods = self.get_object()
+        try:
+            k = int(request.query_params.get("k") or self.SIMILAR_DEFAULT_K)
+        except ValueError:
+            k = self.SIMILAR_DEFAULT_K
+        k = max(1, min(k, neighbors.neighbor_count()))
+
+        similar = list(
+            self.query_planners["list"].plan(Goods).apply(Goods.objects.all())
+            .filter(neighbor_of__goods_id=goods.pk, neighbor_of__rank__lt=k)
+            .annotate(similarity=F("neighbor_of__score"), similarity_rank=F("neighbor_of__rank"))
+            .order_by("similarity_rank")
+        )
+        results = cards.render(similar, request)
+        for item, good in zip(results, similar):
+            item["score"] = round(good.similarity, 2)
+        return Response({"goods": str(goods.pk), "k": k, "count": len(results), "results": results})
 
     @action(detail=False, methods=["get"], url_path="similar-random")
     def similar_random(self, request):
@@ -1133,58 +1371,102 @@ class GoodsViewSet(viewsets.ModelViewSet):
         - 所有标准过滤器（ip, category, theme, status等）
         - seed_strategy: 种子选择策略（diverse/popular/recent，默认diverse）
         - refresh: 设置为1时跳过缓存强制重新计算（可选）
+        - page / page_size: 页码与每页数量（默认18，最大100）
+        - session: 第一页返回的排序会话，翻页时带上即可沿用同一份完整排序（可选）
 
-        注意：此接口只返回第一页（18个谷子），以降低后端压力。
-        响应格式与列表接口相同。
+        不带 session 时计算（或取时间窗口内缓存的）完整排序，并返回引用该排序的 session；
+        带 session 翻页时只按主键读取当页谷子，不计数、不重算。
+        响应格式与列表接口相同，另含 session 字段。
         """
         # 1. 获取过滤后的queryset并优化查询
         qs = self.filter_queryset(self.get_queryset())
-
-        # 获取总数
-        total_count = qs.count()
-
-        # 边界情况：谷子数量 ≤ 18，使用优化的小数据集推荐算法
-        if total_count <= 18:
-            ordered_goods = self._compute_small_dataset_ordering(qs)
-            serializer = self.get_serializer(ordered_goods, many=True)
-            return Response({
-                'count': len(ordered_goods),
-                'page': 1,
-                'page_size': 18,
-                'next': None,
-                'previous': None,
-                'results': serializer.data
-            })
-
-        # 2. 检查是否需要跳过缓存
-        refresh = request.query_params.get('refresh') == '1'
-
-        # 3. 检查缓存中的现有排序
-        cache_key = self._get_similarity_cache_key(request)
-        cached_ids = None if refresh else cache.get(cache_key)
-
-        if cached_ids:
-            # 使用缓存的排序，只取前18个
-            ordered_goods = self._order_by_ids(qs, cached_ids[:18])
+        page = self._get_similarity_page_number(request)
+        page_size = self.paginator.get_page_size(request)
+        session = request.query_params.get('session')
+
+        if session:
+            # 2a. 沿用会话中保存的完整排序
+            ordered_ids = self._load_similarity_session(request, session)
+            if ordered_ids is None:
+                raise NotFound("相似排序会话已过期，请重新获取第一页")
         else:
-            # 计算新的相似度排序
-            ordered_goods = self._compute_similarity_ordering(qs, request)
-            # 缓存完整的ID列表（5分钟TTL）
-            cache.set(cache_key, [str(g.id) for g in ordered_goods], timeout=300)
-            # 只返回前18个
-            ordered_goods = ordered_goods[:18]
-
-        # 4. 返回第一页数据（固定18个）
+            # 获取总数
+            total_count = qs.count()
+
+            # 边界情况：谷子数量 ≤ 18，使用优化的小数据集推荐算法
+            if total_count <= 18:
+                ordered_goods = self._compute_small_dataset_ordering(qs)
+                serializer = self.get_serializer(ordered_goods, many=True)
+                return Response({
+                    'count': len(ordered_goods),
+                    'page': 1,
+                    'page_size': 18,
+                    'next': None,
+                    'previous': None,
+                    'session': None,
+                    'results': serializer.data
+                })
+
+            # 2b. 检查是否需要跳过缓存
+            refresh = request.query_params.get('refresh') == '1'
+
+            # 3. 检查缓存中的现有排序（时间窗口内的请求共用同一个会话）
+            cache_key = self._get_similarity_cache_key(request)
+            session = None if refresh else cache.get(cache_key)
+            ordered_ids = self._load_similarity_session(request, session) if session else None
+
+            if ordered_ids is None:
+                # 计算新的相似度排序，完整的ID列表保存为会话（同一 2 分钟时间窗口内的第一页请求复用该会话，见 _get_similarity_cache_key）
+                ordered_ids = [str(g.id) for g in self._compute_similarity_ordering(qs, request)]
+                session = secrets.token_urlsafe(12)
+                cache.set(self._get_similarity_session_key(request, session), ordered_ids, timeout=self._similarity_session_ttl())
+                cache.set(cache_key, session, timeout=300)
+
+        # 4. 只读取并渲染当页谷子
+        start = (page - 1) * page_size
+        if page > 1 and start >= len(ordered_ids):
+            raise NotFound("无效的页码")
+        ordered_goods = self._order_by_ids(qs, ordered_ids[start:start + page_size])
+
         serializer = self.get_serializer(ordered_goods, many=True)
         return Response({
-            'count': total_count,
-            'page': 1,
-            'page_size': 18,
-            'next': 2 if total_count > 18 else None,
-            'previous': None,
+            'count': len(ordered_ids),
+            'page': page,
+            'page_size': page_size,
+            'next': page + 1 if start + page_size < len(ordered_ids) else None,
+            'previous': page - 1 if page > 1 else None,
+            'session': session,
             'results': serializer.data
         })
 
+    @staticmethod
+    def _get_similarity_page_number(request):
+        try:
+            page = int(request.query_params.get('page', 1))
+        except (TypeError, ValueError):
+            raise NotFound("无效的页码")
+        if page < 1:
+            raise NotFound("无效的页码")
+        return page
+
+    @staticmethod
+    def _similarity_session_ttl():
+        """排序会话的保留时间（秒），每次翻页顺延。"""
+        return getattr(settings, "GOODS_SIMILAR_SESSION_TTL", 1800)
+
+    @staticmethod
+    def _get_similarity_session_key(request, session):
+        # 键中包含用户ID：会话只对创建它的用户有效
+        return f"similar_session:{request.user.id}:{session}"
+
+    def _load_similarity_session(self, request, session):
+        """读取会话中的完整排序（ID列表）并顺延有效期；不存在或已过期时返回 None。"""
+        key = self._get_similarity_session_key(request, session)
+        ordered_ids = cache.get(key)
+        if ordered_ids is not None:
+            cache.touch(key, timeout=self._similarity_session_ttl())
+        return ordered_ids
+
     def _get_similarity_cache_key(self, request):
         """
         生成缓存键（用户ID + 过滤器哈希 + 时间窗口）
@@ -1197,16 +1479,13 @@ class GoodsViewSet(viewsets.ModelViewSet):
         """
         import time
         user_id = request.user.id
+        # 全部筛选参数都参与（与 _get_similarity_features_key 相同），只有翻页 / 会话参数除外
         filter_params = {
-            'ip': request.query_params.get('ip'),
-            'category': request.query_params.get('category'),
-            'status': request.query_params.get('status'),
-            'theme': request.query_params.get('theme'),
-            'search': request.query_params.get('search'),
-            'seed_strategy': request.query_params.get('seed_strategy', 'diverse'),
+            name: sorted(request.query_params.getlist(name))
+            for name in request.query_params
+            if name not in ('page', 'page_size', 'session', 'refresh')
         }
-        # 移除None值
-        filter_params = {k: v for k, v in filter_params.items() if v}
+        filter_params.setdefault('seed_strategy', ['diverse'])
 
         # 添加时间窗口（每2分钟一个窗口），让排序定期自动刷新
         time_window = int(time.time() // 120)  # 120秒 = 2分钟
@@ -1214,6 +1493,25 @@ class GoodsViewSet(viewsets.ModelViewSet):
         filter_hash = hashlib.md5(str(sorted(filter_params.items())).encode()).hexdigest()
         return f"similar_random:{user_id}:{filter_hash}"
 
+    def _get_similarity_features_key(self, request):
+        """
+        相似度特征的缓存键（用户 + 数据版本号 + 筛选条件）；无法用版本号描述时（如管理员）返回 None，不缓存。
+
+        数据版本号覆盖谷子本身与 IP 作品类型 / 品类树（公共目录），任何写入都会换键。
+        """
+        data_versions = versions.resolve(self, request, {}, (USER_SCOPE, CATALOG_SCOPE))
+        if data_versions is None:
+            return None
+        # 只影响排序、不影响筛选结果的参数不参与
+        params = sorted(
+            (name, value)
+            for name in request.query_params
+            if name not in ('seed_strategy', 'refresh', 'page', 'page_size')
+            for value in request.query_params.getlist(name)
+        )
+        raw = json.dumps([data_versions, params], ensure_ascii=False, separators=(',', ':'))
+        return f"similar_features:{request.user.id}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
     def _compute_similarity_ordering(self, qs, request):
         """
         计算基于相似度的排序
@@ -1223,21 +1521,29 @@ class GoodsViewSet(viewsets.ModelViewSet):
             request: HTTP请求对象
 
         Returns:
-            list: 排序后的谷子列表
+            list: 排序后的谷子列表（向量化引擎下为 SimilarityItem，只含ID等相似度字段）
         """
-        # 预加载所有关联数据
-        goods_list = list(
-            qs.select_related('ip', 'category', 'theme', 'location')
-              .prefetch_related('characters')
-        )
-
         # 获取种子策略
         seed_strategy = request.query_params.get('seed_strategy', 'diverse')
 
-        # 初始化组件
         calculator = GoodsSimilarityCalculator()
         selector = SeedSelector()
-        builder = SimilarityGroupBuilder(calculator)
+        if similarity_engine.engine() == similarity_engine.ENGINE_VECTORIZED:
+            # 默认用 NumPy 一次算出全部种子的相似度矩阵，分数与逐对计算相同（见 similarity_engine.py）；
+            # 编码后的特征按「数据版本号 + 筛选条件」缓存，时间窗口滚动后重算排序不再读取谷子
+            features = similarity_engine.cached_features(
+                qs, calculator, self._get_similarity_features_key(request)
+            )
+            goods_list = features.items
+            builder = similarity_engine.VectorizedGroupBuilder(calculator, features=features)
+        else:
+            # 预加载所有关联数据，一次性预热品类祖先链，避免逐个品类向上遍历
+            goods_list = list(
+                qs.select_related('ip', 'category', 'theme', 'location')
+                  .prefetch_related('characters')
+            )
+            calculator.prime_category_cache({g.category_id for g in goods_list})
+            builder = similarity_engine.group_builder(calculator)
 
         # 选择种子
         seeds = selector.select_seeds(goods_list, strategy=seed_strategy)
@@ -1353,8 +1659,8 @@ class GoodsViewSet(viewsets.ModelViewSet):
         # 创建ID到位置的映射
         id_to_position = {str(id_val): pos for pos, id_val in enumerate(id_list)}
 
-        # 获取谷子并按位置排序
-        goods_dict = {str(g.id): g for g in qs}
+        # 只读取需要的谷子，再按位置排序
+        goods_dict = {str(g.id): g for g in qs.filter(pk__in=id_list)}
         ordered_goods = []
         for id_val in id_list:
             if id_val in goods_dict:
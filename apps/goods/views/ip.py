@@ -4,12 +4,14 @@ IP作品相关的视图
 from django.db import transaction
 from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters as drf_filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from ..models import IP
+from ..search import SearchKeyFilter
 from core.permissions import IsAdminOrReadOnly
+from core.versions import CATALOG_SCOPE, conditional_by_version
 from ..serializers import (
     IPBatchUpdateOrderSerializer,
     IPDetailSerializer,
@@ -32,7 +34,8 @@ class IPViewSet(viewsets.ModelViewSet):
     - batch_update_order: 批量更新IP作品排序（用于拖拽排序等功能）
     """
 
-    filter_backends = (DjangoFilterBackend, drf_filters.SearchFilter)
+    # ?search= 走 SearchKey 索引前缀查询（支持拼音 / 首字母 / 繁简），search_fields 仅用于接口文档
+    filter_backends = (DjangoFilterBackend, SearchKeyFilter)
     search_fields = ("name", "keywords__value")
     filterset_fields = {
         "name": ["exact", "icontains"],
@@ -55,6 +58,11 @@ class IPViewSet(viewsets.ModelViewSet):
             return IPDetailSerializer
         return IPSimpleSerializer
 
+    @conditional_by_version(CATALOG_SCOPE, cache=True)
+    def list(self, request, *args, **kwargs):
+        # IP 列表只随公共目录变化，所有用户共享同一份缓存
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=["get"], url_path="characters")
     def characters(self, request, pk=None):
         """
@@ -10,18 +10,26 @@ from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from .. import compound
 from ..models import Goods, Showcase, ShowcaseGoods
+from ..serializers.goods import GoodsListSerializer
 from ..serializers.showcase import (
     AddGoodsToShowcaseSerializer,
     MoveGoodsInShowcaseSerializer,
     RemoveGoodsFromShowcaseSerializer,
     ShowcaseDetailSerializer,
+    ShowcaseGoodsRowSerializer,
     ShowcaseGoodsSerializer,
     ShowcaseListSerializer,
 )
 from ..utils import compress_image
+from core.planner import planner_for
+from core.renderers import CompoundJSONRenderer, wants_compound
+from core.sparse import parse_fieldset, sparse_serializer, with_nested
 from core.permissions import IsOwnerOrPublicReadOnly, is_admin
+from core.versions import CATALOG_SCOPE, OWNER_SCOPE, conditional_by_version
 
 
 class ShowcasePagination(PageNumberPagination):
@@ -65,17 +73,18 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
     pagination_class = ShowcasePagination
 
     def get_queryset(self):
-        """优化查询，避免 N+1 问题"""
-        qs = (
-            Showcase.objects.all()
-            .prefetch_related(
+        """
+        优化查询，避免 N+1 问题。
+        列表动作只需预览图，由 ShowcaseListSerializer 按批加载，不再预取全部展柜谷子。
+        """
+        qs = Showcase.objects.all()
+        if self.action not in ["list", "public_list", "private_list"]:
+            qs = qs.prefetch_related(
                 "showcase_goods__goods__ip",
                 "showcase_goods__goods__characters__ip",
                 "showcase_goods__goods__category",
                 "showcase_goods__goods__theme",
-            )
-            .select_related()
-        )
+            ).select_related()
         
         # 如果是公共列表动作，直接返回公开的展柜
         if self.action in ['public_list', 'public']:
@@ -98,6 +107,14 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(Q(user=user) | Q(is_public=True))
 
+    def get_version_owner_id(self, request, pk=None, **kwargs):
+        """展柜详情依赖展柜所属用户的数据（公开展柜可被其他用户查看）。"""
+        return Showcase.objects.filter(pk=pk).values_list("user_id", flat=True).first()
+
+    @conditional_by_version(OWNER_SCOPE, CATALOG_SCOPE, cache=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=["get"], url_path="public", permission_classes=[AllowAny])
     def public_list(self, request):
         """
@@ -177,11 +194,43 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=["get"], url_path="goods")
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="goods",
+        renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, CompoundJSONRenderer],
+    )
     def goods(self, request, pk=None):
-        """获取展柜中的所有谷子"""
+        """
+        获取展柜中的所有谷子。
+        ?format=compound 时返回 {"results": [...], "included": {...}}，谷子只携带外键 ID。
+        ?fields= / ?expand= 裁剪 goods 的字段（见 core/sparse.py）。
+        """
         showcase = self.get_object()
 
+        if wants_compound(request):
+            items = list(
+                ShowcaseGoods.objects.filter(showcase=showcase).select_related("goods")
+            )
+            rows, included = compound.build([item.goods for item in items], request)
+            results = []
+            for row, goods_row in zip(ShowcaseGoodsRowSerializer(items, many=True).data, rows):
+                results.append({"id": row["id"], "goods": goods_row, **row})
+            return Response({"results": results, "included": included})
+
+        fieldset = parse_fieldset(request)
+        if fieldset is not None:
+            goods_serializer = sparse_serializer(GoodsListSerializer, *fieldset)
+            items = list(ShowcaseGoods.objects.filter(showcase=showcase))
+            goods_qs = planner_for(goods_serializer).plan(Goods).apply(
+                Goods.objects.filter(id__in=[item.goods_id for item in items])
+            )
+            goods_by_id = {goods.pk: goods for goods in goods_qs}
+            for item in items:
+                item.goods = goods_by_id[item.goods_id]
+            serializer_class = with_nested(ShowcaseGoodsSerializer, "goods", goods_serializer)
+            return Response(serializer_class(items, many=True).data)
+
         queryset = ShowcaseGoods.objects.filter(showcase=showcase).select_related(
             "goods__ip",
             "goods__category",
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LocationConfig(AppConfig):
     name = 'apps.location'
+
+    def ready(self):
+        # 收纳树闭包表维护
+        import apps.location.receivers  # noqa: F401
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.location.models import StorageNode, StorageNodeClosure
+from core import closure
+
+
+class Command(BaseCommand):
+    """
+    重建收纳节点闭包表（StorageNodeClosure）。
+
+    正常情况下闭包表随节点新建/移动自动维护；
+    当历史数据通过 SQL 直接导入、或怀疑索引与 parent 不一致时，用本命令全量重建。
+    """
+
+    help = "Rebuild the StorageNode subtree (closure) index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            default=None,
+            help="只重建指定用户 ID 的收纳树，默认重建全部用户",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="批量写入大小，默认 1000",
+        )
+
+    def handle(self, *args, **options):
+        user_id = options["user"]
+        batch_size: int = options["batch_size"]
+
+        node_qs = StorageNode.objects.all()
+        scope_filter = None
+        if user_id is not None:
+            node_qs = node_qs.filter(user_id=user_id)
+            scope_filter = {"user_id": user_id}
+
+        owners = dict(node_qs.values_list("id", "user_id"))
+        nodes = list(node_qs.values_list("id", "parent_id"))
+        scope = f"用户 {user_id}" if user_id is not None else "全部用户"
+        self.stdout.write(f"准备重建 {scope} 的 {len(nodes)} 个收纳节点闭包 ...")
+
+        with transaction.atomic():
+            written = closure.rebuild(
+                StorageNodeClosure,
+                nodes,
+                scope_filter=scope_filter,
+                extra_for=lambda node_id: {"user_id": owners[node_id]},
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"重建完成，共写入 {written} 条闭包记录"))
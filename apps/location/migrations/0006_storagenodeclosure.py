@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core import closure
+
+
+def populate_closure(apps, schema_editor):
+    """为已有收纳节点一次性构建闭包表"""
+    StorageNode = apps.get_model('location', 'StorageNode')
+    StorageNodeClosure = apps.get_model('location', 'StorageNodeClosure')
+    owners = dict(StorageNode.objects.values_list('id', 'user_id'))
+    nodes = list(StorageNode.objects.values_list('id', 'parent_id'))
+    closure.rebuild(
+        StorageNodeClosure,
+        nodes,
+        extra_for=lambda node_id: {'user_id': owners[node_id]},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0005_backfill_owner_and_enforce_user_not_null'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageNodeClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0, help_text='祖先到后代的层级距离，自身为 0', verbose_name='层级差')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='location.storagenode', verbose_name='祖先节点')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='location.storagenode', verbose_name='后代节点')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '收纳节点闭包',
+                'verbose_name_plural': '收纳节点闭包',
+                'indexes': [models.Index(fields=['user', 'ancestor'], name='loc_closure_user_anc'), models.Index(fields=['descendant', 'depth'], name='loc_closure_desc_depth')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
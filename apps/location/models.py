@@ -53,3 +53,48 @@ class StorageNode(models.Model):
 
     def __str__(self):
         return self.path_name or self.name
+
+
+class StorageNodeClosure(models.Model):
+    """
+    收纳树闭包表：每一对（祖先, 后代）一行，自身到自身 depth=0。
+    冗余 user 字段，使「某用户下某节点的整棵子树」成为一次按 (user, ancestor) 的索引查询。
+    由 receivers 在节点新建/移动时维护，删除节点时随外键级联清理；
+    历史数据可通过 `python manage.py rebuild_location_index` 重建。
+    """
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="所属用户",
+    )
+    ancestor = models.ForeignKey(
+        StorageNode,
+        on_delete=models.CASCADE,
+        related_name="descendant_links",
+        verbose_name="祖先节点",
+    )
+    descendant = models.ForeignKey(
+        StorageNode,
+        on_delete=models.CASCADE,
+        related_name="ancestor_links",
+        verbose_name="后代节点",
+    )
+    depth = models.PositiveIntegerField(
+        default=0,
+        verbose_name="层级差",
+        help_text="祖先到后代的层级距离，自身为 0",
+    )
+
+    class Meta:
+        verbose_name = "收纳节点闭包"
+        verbose_name_plural = "收纳节点闭包"
+        unique_together = ("ancestor", "descendant")
+        indexes = [
+            models.Index(fields=["user", "ancestor"], name="loc_closure_user_anc"),
+            models.Index(fields=["descendant", "depth"], name="loc_closure_desc_depth"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
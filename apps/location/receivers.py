@@ -0,0 +1,40 @@
+"""
+收纳节点闭包表维护用的信号接收器，在 LocationConfig.ready() 中注册。
+"""
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from core import closure
+
+from .models import StorageNode, StorageNodeClosure
+
+
+@receiver(pre_save, sender=StorageNode)
+def remember_node_parent(sender, instance, raw=False, update_fields=None, **kwargs):
+    """记录保存前的父节点，供 post_save 判断是否需要移动闭包子树。"""
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and "parent" not in update_fields:
+        instance._closure_old_parent_id = instance.parent_id
+        return
+    instance._closure_old_parent_id = (
+        StorageNode.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=StorageNode)
+def sync_node_closure(sender, instance, created, raw=False, **kwargs):
+    """新建节点时插入闭包行；父节点变化时整体移动子树。"""
+    if raw:
+        return
+    if created:
+        closure.insert_node(
+            StorageNodeClosure, instance.pk, instance.parent_id, user_id=instance.user_id
+        )
+        return
+    old_parent_id = getattr(instance, "_closure_old_parent_id", instance.parent_id)
+    if old_parent_id != instance.parent_id:
+        closure.move_subtree(
+            StorageNodeClosure, instance.pk, instance.parent_id, user_id=instance.user_id
+        )
+    instance._closure_old_parent_id = instance.parent_id
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import StorageNode
+from .models import StorageNode, StorageNodeClosure
 from core.permissions import is_admin
 
 
@@ -31,6 +31,16 @@ class StorageNodeSerializer(serializers.ModelSerializer):
             return
         self.fields["parent"].queryset = StorageNode.objects.filter(user=user)
 
+    def validate_parent(self, value):
+        """禁止把节点挂到自身或自身的子孙节点下（会形成环）"""
+        if value is None or self.instance is None:
+            return value
+        if StorageNodeClosure.objects.filter(
+            ancestor_id=self.instance.pk, descendant_id=value.pk
+        ).exists():
+            raise serializers.ValidationError("不能将节点移动到自身或其子节点下")
+        return value
+
     def create(self, validated_data):
         """创建节点时，如果未提供 path_name，则根据父节点自动生成"""
         path_name = validated_data.get("path_name")
@@ -1,3 +1,80 @@
+import io
+
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.goods.models import Category, Goods, IP
+from apps.users.models import Role, User
+from .models import StorageNode, StorageNodeClosure
+
+
+class StorageNodeClosureTestCase(TestCase):
+    """测试收纳节点闭包表的维护、子树查询与重建命令"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='测试角色')
+        self.user = User.objects.create(username='loc_user', password='x', role=self.role)
+        self.other_user = User.objects.create(username='loc_other', password='x', role=self.role)
+        self.client.force_authenticate(user=self.user)
+
+        self.room = StorageNode.objects.create(user=self.user, name='书房', path_name='书房')
+        self.cabinet = StorageNode.objects.create(
+            user=self.user, name='A柜', parent=self.room, path_name='书房/A柜'
+        )
+        self.drawer = StorageNode.objects.create(
+            user=self.user, name='抽屉1', parent=self.cabinet, path_name='书房/A柜/抽屉1'
+        )
+
+        ip = IP.objects.create(name='收纳测试IP')
+        category = Category.objects.create(name='收纳测试品类')
+        self.goods = Goods.objects.create(
+            user=self.user, name='抽屉里的吧唧', ip=ip, category=category, location=self.drawer
+        )
+
+    def _subtree(self, node):
+        return set(
+            StorageNodeClosure.objects.filter(ancestor=node).values_list('descendant_id', flat=True)
+        )
+
+    def test_closure_scoped_per_user(self):
+        """闭包行冗余节点所属用户"""
+        self.assertEqual(self._subtree(self.room), {self.room.id, self.cabinet.id, self.drawer.id})
+        self.assertEqual(
+            set(StorageNodeClosure.objects.values_list('user_id', flat=True)), {self.user.id}
+        )
+
+    def test_include_children_and_location_filter(self):
+        """include_children 与 ?location= 都能取到深层节点下的谷子"""
+        response = self.client.get(f'/api/location/nodes/{self.room.id}/goods/?include_children=true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([g['id'] for g in response.json()], [str(self.goods.id)])
+
+        response = self.client.get(f'/api/goods/?location={self.room.id}')
+        self.assertEqual([g['id'] for g in response.json()['results']], [str(self.goods.id)])
+
+        # 其他用户无法通过他人的节点 ID 取到数据
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(f'/api/goods/?location={self.room.id}')
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_destroy_detaches_goods_in_subtree(self):
+        """删除父节点时整棵子树的谷子取消关联"""
+        response = self.client.delete(f'/api/location/nodes/{self.room.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.goods.refresh_from_db()
+        self.assertIsNone(self.goods.location_id)
+        self.assertFalse(StorageNodeClosure.objects.exists())
+
+    def test_reject_cycle_and_rebuild_command(self):
+        """不能移动到自身子树下；重建命令可恢复被破坏的索引"""
+        response = self.client.patch(
+            f'/api/location/nodes/{self.room.id}/', {'parent': self.drawer.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-# Create your tests here.
+        StorageNodeClosure.objects.all().delete()
+        call_command('rebuild_location_index', user=self.user.id, stdout=io.StringIO())
+        self.assertEqual(self._subtree(self.room), {self.room.id, self.cabinet.id, self.drawer.id})
@@ -1,13 +1,23 @@
 from django.db import transaction
 from rest_framework import generics, status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from apps.goods import compound, rollups
 from apps.goods.models import Goods
 from apps.goods.serializers import GoodsListSerializer
 
-from .models import StorageNode
+from .models import StorageNode, StorageNodeClosure
 from .serializers import StorageNodeSerializer, StorageNodeTreeSerializer
+from core import closure
 from core.permissions import IsOwnerOnly, is_admin
+from core.renderers import CompoundJSONRenderer, wants_compound
+from core.versions import USER_SCOPE, conditional_by_version
+
+
+def _subtree_ids(node):
+    """节点及其全部后代 ID 的闭包子查询（按节点所属用户限定，命中 (user, ancestor) 索引）"""
+    return closure.descendant_ids(StorageNodeClosure, node.id).filter(user_id=node.user_id)
 
 
 class StorageNodeListCreateView(generics.ListCreateAPIView):
@@ -58,34 +68,32 @@ class StorageNodeDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_all_descendants(self, node):
         """
-        递归获取节点的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
+        获取节点的所有后代节点（包括子节点、子节点的子节点等）
+        返回包含该节点及其所有后代的列表，走闭包表一次查询完成
         """
-        descendants = [node]
-        children = node.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
+        return list(StorageNode.objects.filter(id__in=_subtree_ids(node)))
 
     @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         """
         删除节点时：
-        1. 递归获取所有子节点（包括子节点的子节点）
+        1. 通过闭包表获取所有子节点（包括子节点的子节点）
         2. 取消所有节点关联的商品（将商品的 location 设置为 null）
         3. 删除根节点（由于 CASCADE，删除父节点会自动删除所有子节点）
         """
         instance = self.get_object()
         
-        # 获取所有要删除的节点（包括当前节点及其所有后代）
-        nodes_to_delete = self.get_all_descendants(instance)
-        node_ids = [node.id for node in nodes_to_delete]
+        # 要删除的节点（当前节点及其所有后代），以闭包子查询表示
+        node_ids = _subtree_ids(instance)
         
         # 取消所有关联的商品（将 location 设置为 null）
         # 虽然 Goods 的 location 使用了 on_delete=models.SET_NULL，
         # 但为了确保在删除前显式处理，我们先取消关联
-        from apps.goods.models import Goods
-        Goods.objects.filter(user=instance.user, location_id__in=node_ids).update(location=None)
+        affected = Goods.objects.filter(user=instance.user, location_id__in=node_ids)
+        # update() 不触发谷子信号：先记下统计汇总快照，置空后写入差量
+        rollup_old = rollups.snapshots(affected.values_list("id", flat=True))
+        affected.update(location=None)
+        rollups.commit(rollup_old)
         
         # 删除根节点（由于 parent 字段使用了 on_delete=models.CASCADE，
         # 删除父节点时，Django 会自动删除所有子节点）
@@ -114,6 +122,11 @@ class StorageNodeTreeView(generics.ListAPIView):
             return qs
         return qs.filter(user=user)
 
+    @conditional_by_version(USER_SCOPE, cache=True)
+    def list(self, request, *args, **kwargs):
+        # 位置树只随本人的收纳节点变化：版本号未变时直接返回 304 / 缓存的响应
+        return super().list(request, *args, **kwargs)
+
 
 class StorageNodeGoodsView(generics.ListAPIView):
     """
@@ -121,10 +134,20 @@ class StorageNodeGoodsView(generics.ListAPIView):
     
     - GET: 获取指定节点下的所有商品列表
     - 支持查询参数 include_children：是否包含子节点下的商品（默认 false，只查询当前节点）
+    - ?format=compound：返回 {"results": [...], "included": {...}}，谷子只携带外键 ID
     """
 
     serializer_class = GoodsListSerializer
     permission_classes = [IsOwnerOnly]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CompoundJSONRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if not wants_compound(request):
+            return super().list(request, *args, **kwargs)
+        # 侧载模式由 compound 批量加载引用对象，不需要 JOIN / prefetch
+        queryset = self.get_queryset().select_related(None).prefetch_related(None)
+        rows, included = compound.build(queryset, request)
+        return Response({"results": rows, "included": included})
 
     def get_queryset(self):
         """
@@ -142,11 +165,9 @@ class StorageNodeGoodsView(generics.ListAPIView):
         except StorageNode.DoesNotExist:
             return Goods.objects.none()
 
-        # 如果包含子节点，需要获取所有子节点 ID
+        # 如果包含子节点，以闭包子查询表示整棵子树
         if include_children:
-            # 获取所有子节点（包括子节点的子节点）
-            all_nodes = self.get_all_descendants(node)
-            node_ids = [n.id for n in all_nodes]
+            node_ids = _subtree_ids(node)
         else:
             # 只查询当前节点
             node_ids = [node.id]
@@ -167,12 +188,8 @@ class StorageNodeGoodsView(generics.ListAPIView):
 
     def get_all_descendants(self, node):
         """
-        递归获取节点的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
+        获取节点的所有后代节点（包括子节点、子节点的子节点等）
+        返回包含该节点及其所有后代的列表，走闭包表一次查询完成
         """
-        descendants = [node]
-        children = node.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
+        return list(StorageNode.objects.filter(id__in=_subtree_ids(node)))
 
@@ -67,3 +67,23 @@ class Permission(models.Model):
     def __str__(self) -> str:
         return self.code
 
+
+
+class CollectionVersion(models.Model):
+    """
+    数据版本号（单调递增），用于读接口的 ETag / 304。
+
+    - user:<id>：该用户的谷子、收纳位置、主题、展柜发生任何写入时 +1；
+    - catalog：管理员维护的公共目录（IP、角色、品类）发生写入时 +1。
+    与业务写入在同一事务内递增，回滚时一并回滚。维护逻辑见 core/versions.py。
+    """
+
+    key = models.CharField(max_length=50, unique=True, verbose_name="版本键")
+    version = models.BigIntegerField(default=0, verbose_name="版本号")
+
+    class Meta:
+        verbose_name = "数据版本"
+        verbose_name_plural = "数据版本"
+
+    def __str__(self) -> str:
+        return f"{self.key}={self.version}"
@@ -0,0 +1,134 @@
+"""
+闭包表（closure table）通用维护工具。
+
+适用于「自关联 parent 外键」的树：闭包模型需提供 ancestor / descendant 外键与 depth 字段，
+每对（祖先, 后代）一行，自身到自身 depth=0。这样任意深度的「子树」与「祖先链」都只需一次索引查询。
+
+这里的函数只依赖 ``closure_model.objects`` 与上述字段名，因此同样适用于迁移中的历史模型。
+``extra`` 用于写入额外的冗余列（例如按用户隔离的 user_id）。
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+
+def descendant_ids(closure_model, node_id):
+    """返回 node 及其全部后代 ID 的惰性查询集，可直接作为 ``__in`` 子查询使用。"""
+    return closure_model.objects.filter(ancestor_id=node_id).values("descendant_id")
+
+
+def ancestor_ids(closure_model, node_id) -> list:
+    """返回 node 的祖先 ID 列表（从根到自身）。"""
+    return list(
+        closure_model.objects.filter(descendant_id=node_id)
+        .order_by("-depth")
+        .values_list("ancestor_id", flat=True)
+    )
+
+
+def ancestor_map(closure_model, node_ids: Iterable) -> dict:
+    """批量获取多个节点的祖先链：{node_id: [root_id, ..., node_id]}，仅一次查询。"""
+    node_ids = set(node_ids)
+    if not node_ids:
+        return {}
+    result: dict = {node_id: [] for node_id in node_ids}
+    rows = (
+        closure_model.objects.filter(descendant_id__in=node_ids)
+        .order_by("descendant_id", "-depth")
+        .values_list("descendant_id", "ancestor_id")
+    )
+    for descendant_id, ancestor_id in rows:
+        result[descendant_id].append(ancestor_id)
+    return result
+
+
+def insert_node(closure_model, node_id, parent_id, **extra) -> None:
+    """新建节点：继承父节点的全部祖先链，并补上自身行。"""
+    rows = [closure_model(ancestor_id=node_id, descendant_id=node_id, depth=0, **extra)]
+    if parent_id is not None:
+        for ancestor_id, depth in closure_model.objects.filter(
+            descendant_id=parent_id
+        ).values_list("ancestor_id", "depth"):
+            rows.append(
+                closure_model(
+                    ancestor_id=ancestor_id,
+                    descendant_id=node_id,
+                    depth=depth + 1,
+                    **extra,
+                )
+            )
+    closure_model.objects.bulk_create(rows)
+
+
+def move_subtree(closure_model, node_id, new_parent_id, **extra) -> None:
+    """
+    移动子树：先断开子树与外部祖先的连接，再与新父节点的祖先链做笛卡尔积重新连接。
+    子树内部的行保持不变。
+    """
+    subtree = list(
+        closure_model.objects.filter(ancestor_id=node_id).values_list("descendant_id", "depth")
+    )
+    subtree_qs = closure_model.objects.filter(ancestor_id=node_id).values("descendant_id")
+    closure_model.objects.filter(descendant_id__in=subtree_qs).exclude(
+        ancestor_id__in=subtree_qs
+    ).delete()
+
+    if new_parent_id is None:
+        return
+
+    parents = list(
+        closure_model.objects.filter(descendant_id=new_parent_id).values_list("ancestor_id", "depth")
+    )
+    closure_model.objects.bulk_create(
+        [
+            closure_model(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=parent_depth + sub_depth + 1,
+                **extra,
+            )
+            for ancestor_id, parent_depth in parents
+            for descendant_id, sub_depth in subtree
+        ],
+        batch_size=500,
+    )
+
+
+def build_rows(closure_model, nodes: Iterable[tuple], extra_for=None) -> list:
+    """
+    根据 (id, parent_id) 列表在内存中计算完整闭包行（不写库）。
+
+    extra_for: 可选回调，接收 node_id 返回该节点行的额外字段 dict。
+    """
+    parent_of = {node_id: parent_id for node_id, parent_id in nodes}
+    rows = []
+    for node_id in parent_of:
+        extra = extra_for(node_id) if extra_for else {}
+        depth = 0
+        current = node_id
+        seen = set()
+        # seen 防御脏数据中的环，避免死循环
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(
+                closure_model(ancestor_id=current, descendant_id=node_id, depth=depth, **extra)
+            )
+            current = parent_of.get(current)
+            depth += 1
+    return rows
+
+
+def rebuild(closure_model, nodes: Iterable[tuple], scope_filter=None, extra_for=None, batch_size=1000) -> int:
+    """
+    全量重建闭包表（或其中 scope_filter 限定的部分），返回写入行数。
+
+    nodes: (id, parent_id) 列表，需覆盖 scope 内的全部节点。
+    scope_filter: 传给 ``closure_model.objects.filter`` 的条件 dict，None 表示整表。
+    """
+    qs = closure_model.objects.all()
+    if scope_filter:
+        qs = qs.filter(**scope_filter)
+    qs.delete()
+    rows = build_rows(closure_model, nodes, extra_for=extra_for)
+    closure_model.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,54 @@
+"""
+SQLite FTS5 全文索引的 ORM 适配工具。
+
+约定：FTS5 虚拟表以「外部内容表」方式挂在一张普通的 Django 模型表上（content= / content_rowid=），
+由触发器同步，ORM 侧只需维护普通表；查询时通过一个 managed=False 的影子模型 JOIN 虚拟表。
+
+- ``FullTextField``：映射到虚拟表的同名隐藏列，支持 ``__match`` 查找（生成 ``MATCH %s``）。
+- ``fts5_table_exists``：判断当前连接上 FTS5 表是否可用（非 SQLite 或未编译 FTS5 时返回 False）。
+- ``phrase_query``：把用户输入的词转成安全的 FTS5 短语查询，避免语法注入。
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db import connections, models
+from django.db.models import Lookup
+
+# 每个数据库别名下的表存在性缓存（表由迁移创建，运行期不会消失）
+_table_cache: dict = {}
+
+
+class FullTextField(models.TextField):
+    """FTS5 虚拟表的隐藏列（列名与表名相同），仅用于 MATCH 查询。"""
+
+
+@FullTextField.register_lookup
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+def fts5_table_exists(table: str, using: str = "default") -> bool:
+    key = (using, table)
+    if key not in _table_cache:
+        connection = connections[using]
+        if connection.vendor != "sqlite":
+            _table_cache[key] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [table],
+                )
+                _table_cache[key] = cursor.fetchone() is not None
+    return _table_cache[key]
+
+
+def phrase_query(terms: Iterable[str]) -> str:
+    """把每个词包成 FTS5 短语（双引号转义），多个短语之间为 AND。"""
+    return " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
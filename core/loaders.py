@@ -0,0 +1,145 @@
+"""
+序列化器批量加载（DataLoader）。
+
+嵌套字段（方法字段、关联字段）逐个对象取数时容易退化为 N+1，是否退化取决于视图有没有猜对
+select_related / prefetch_related。这里把「取数」从视图挪到序列化器自身：
+
+1. ``BatchListSerializer``（many=True 时使用）在渲染前先遍历字段树做一次「预热」（prime）：
+   - 嵌套序列化器 / 声明了 ``prime`` 的字段：对本批对象缺失的关联调用 prefetch_related_objects，
+     一个关联一次查询，再递归到子对象；
+   - 方法字段：调用序列化器上的 ``prime_<字段名>(instances)``，把需要的键登记到加载器。
+2. 字段取值时调用 ``get_loader(context, LoaderClass).load(key)``：键已解析则直接返回；
+   否则把所有已登记但未解析的键一次性交给 ``batch_load``。
+
+加载器按请求缓存（挂在 DRF Request 上，没有 request 时挂在序列化器 context 上），
+同一响应内多个序列化器共享结果，查询次数与对象数量、使用序列化器的视图都无关。
+"""
+from __future__ import annotations
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+_REGISTRY_ATTR = "_batch_loaders"
+
+
+class BatchLoader:
+    """按键批量加载的基类，子类实现 batch_load(keys) -> {key: value}。"""
+
+    # 键不存在时 load 返回的值（可变默认值请覆盖 missing()）
+    default = None
+
+    def __init__(self):
+        self._cache = {}
+        self._pending = set()
+
+    def batch_load(self, keys: list) -> dict:
+        raise NotImplementedError
+
+    def missing(self, key):
+        return self.default
+
+    def prime(self, keys) -> None:
+        """登记稍后需要的键，首次 load 时与其它未决键一起解析。"""
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._pending.add(key)
+
+    def load(self, key):
+        if key is None:
+            return self.missing(key)
+        if key not in self._cache:
+            self._pending.add(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self) -> None:
+        keys = list(self._pending)
+        self._pending.clear()
+        if not keys:
+            return
+        results = self.batch_load(keys)
+        for key in keys:
+            self._cache[key] = results[key] if key in results else self.missing(key)
+
+
+def get_loader(context, loader_class):
+    """取得当前请求（或序列化器 context）范围内的加载器实例。"""
+    request = context.get("request") if context is not None else None
+    if request is not None:
+        registry = getattr(request, _REGISTRY_ATTR, None)
+        if registry is None:
+            registry = {}
+            setattr(request, _REGISTRY_ATTR, registry)
+    else:
+        registry = context.setdefault(_REGISTRY_ATTR, {})
+    loader = registry.get(loader_class)
+    if loader is None:
+        loader = registry[loader_class] = loader_class()
+    return loader
+
+
+def prefetch_relation(instances: list, source: str) -> None:
+    """本批对象中尚未加载 source 关联的，一次查询补齐（已加载的对象不会重复查询）。"""
+    if not instances or not source or "." in source or source == "*":
+        return
+    instance = instances[0]
+    if not isinstance(instance, models.Model):
+        return
+    try:
+        field = instance._meta.get_field(source)
+    except FieldDoesNotExist:
+        return
+    if not field.is_relation:
+        return
+    models.prefetch_related_objects(instances, source)
+
+
+def related_objects(instances: list, field) -> list:
+    """收集嵌套字段在本批对象上的取值（多值关联已由 prefetch_relation 缓存）。"""
+    result = []
+    for instance in instances:
+        try:
+            value = field.get_attribute(instance)
+        except (AttributeError, KeyError):
+            continue
+        if value is None:
+            continue
+        if isinstance(value, models.Manager):
+            result.extend(value.all())
+        elif isinstance(value, (list, tuple, models.QuerySet)):
+            result.extend(value)
+        else:
+            result.append(value)
+    return result
+
+
+def prime(serializer, instances: list) -> None:
+    """递归预热序列化器字段树，见模块说明。"""
+    if not instances:
+        return
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        hook = getattr(serializer, f"prime_{name}", None)
+        if hook is not None:
+            hook(instances)
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            prefetch_relation(instances, field.source)
+            prime(field.child, related_objects(instances, field))
+        elif isinstance(field, serializers.BaseSerializer):
+            prefetch_relation(instances, field.source)
+            prime(field, related_objects(instances, field))
+        elif hasattr(field, "prime"):
+            field.prime(instances)
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """many=True 时先预热整批对象，再逐个序列化（通过 Meta.list_serializer_class 启用）。"""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        prime(self.child, items)
+        return super().to_representation(items)
@@ -0,0 +1,169 @@
+"""
+查询计划：根据序列化器声明的字段推导 select_related / prefetch_related / only()。
+
+视图按动作声明「用哪个序列化器渲染、额外需要哪些列」，由 QueryPlanner 推导出：
+
+- 嵌套的外键序列化器 -> select_related（位于多值关联之下时改为 prefetch 路径，如 characters__ip）；
+- 嵌套的多值序列化器 / 多值主键字段 -> prefetch_related；
+- 模型列字段、主键关联字段以及额外声明的列 -> 主模型的 only() 列集合（未用到的大字段如 notes 不再读取）。
+
+方法字段（SerializerMethodField 等）无法从字段本身看出依赖，由序列化器在 ``Meta.query_requires``
+中声明，例如 ``{"location_path": ("location",)}``；值为关系名时按关系处理，为列名时加入列集合。
+
+计划与请求无关，首次使用时推导并缓存。
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class QueryPlan:
+    """一个动作的查询计划。only 为 None 表示读取全部列。"""
+
+    def __init__(self, select_related=(), prefetch_related=(), only=None):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only) if only is not None else None
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+    def describe(self) -> dict:
+        return {
+            "select_related": list(self.select_related),
+            "prefetch_related": list(self.prefetch_related),
+            "only": list(self.only) if self.only is not None else None,
+        }
+
+
+def _is_forward_single(field) -> bool:
+    return field.is_relation and field.concrete and (field.many_to_one or field.one_to_one)
+
+
+class _Collector:
+    def __init__(self, model, skip):
+        self.model = model
+        self.skip = set(skip)
+        self.select = []
+        self.prefetch = []
+        self.columns = []
+
+    def _add(self, items, value):
+        if value not in items:
+            items.append(value)
+
+    def relation(self, path: str, in_prefetch: bool, single: bool):
+        if path in self.skip:
+            return False
+        if single and not in_prefetch:
+            self._add(self.select, path)
+        else:
+            self._add(self.prefetch, path)
+        return True
+
+    def walk(self, serializer, model, prefix: str = "", in_prefetch: bool = False):
+        requires = getattr(getattr(serializer, "Meta", None), "query_requires", {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in requires:
+                for source in requires[name]:
+                    self.visit(source, model, prefix, in_prefetch, "declared")
+                continue
+            source = field.source
+            if not source or source == "*" or "." in source:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.visit(source, model, prefix, in_prefetch, "nested", field.child)
+            elif isinstance(field, serializers.BaseSerializer):
+                self.visit(source, model, prefix, in_prefetch, "nested", field)
+            elif isinstance(field, serializers.ManyRelatedField):
+                self.visit(source, model, prefix, in_prefetch, "ids")
+            else:
+                self.visit(source, model, prefix, in_prefetch, "value")
+
+    def visit(self, source, model, prefix, in_prefetch, kind, nested=None):
+        """
+        kind: nested（嵌套序列化器）/ ids（多值主键字段）/ declared（query_requires 声明）/ value（普通字段）。
+        """
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return
+        if not model_field.is_relation:
+            if not prefix:
+                self._add(self.columns, source)
+            return
+
+        single = _is_forward_single(model_field)
+        if single and not prefix:
+            self._add(self.columns, source)
+        # 单值主键字段只需外键列；其余情况都要加载关联对象
+        if kind == "value" or (kind == "ids" and single):
+            return
+        path = f"{prefix}{source}"
+        if not self.relation(path, in_prefetch, single) or nested is None:
+            return
+        self.walk(
+            nested,
+            model_field.related_model,
+            prefix=f"{path}__",
+            in_prefetch=in_prefetch or not single,
+        )
+
+
+class QueryPlanner:
+    """
+    为一个动作推导查询计划。
+
+    serializer_class: 渲染所用的序列化器；None 表示不需要任何关联（例如只做聚合）。
+    columns: 除序列化器字段外额外需要的主模型列（例如排序游标、相似度计算用到的列）。
+    relations: 视图代码直接访问、需要一并加载的关联。
+    full_row: 读取全部列（写操作：保存后信号 / 序列化器可能读取任意列）。
+    skip: 不预加载的关联路径（例如动作内部会修改、需要重新读取的附加图片）。
+    """
+
+    def __init__(self, serializer_class=None, columns=(), relations=(), full_row=False, skip=()):
+        self.serializer_class = serializer_class
+        self.columns = tuple(columns)
+        self.relations = tuple(relations)
+        self.full_row = full_row
+        self.skip = tuple(skip)
+        self._plans = {}
+
+    def plan(self, model) -> QueryPlan:
+        if model not in self._plans:
+            self._plans[model] = self._derive(model)
+        return self._plans[model]
+
+    def _derive(self, model) -> QueryPlan:
+        collector = _Collector(model, self.skip)
+        if self.serializer_class is not None:
+            collector.walk(self.serializer_class(context={}), model)
+        for relation in self.relations:
+            collector.visit(relation, model, "", False, "declared")
+        if self.full_row:
+            only = None
+        elif self.serializer_class is None and not (self.columns or self.relations):
+            only = None
+        else:
+            only = [model._meta.pk.name]
+            for column in (*collector.columns, *self.columns):
+                if column not in only:
+                    only.append(column)
+        return QueryPlan(collector.select, collector.prefetch, only)
+
+
+@lru_cache(maxsize=256)
+def planner_for(serializer_class, columns: tuple = ()) -> QueryPlanner:
+    """为动态生成的序列化器（例如 core/sparse.py）复用同一个 QueryPlanner，计划只推导一次。"""
+    return QueryPlanner(serializer_class, columns=columns)
@@ -0,0 +1,37 @@
+"""
+自定义渲染器。
+"""
+from rest_framework.renderers import JSONRenderer
+
+
+class CompoundJSONRenderer(JSONRenderer):
+    """
+    ?format=compound：编码与普通 JSON 完全相同，只用于内容协商。
+
+    视图通过 ``wants_compound(request)`` 判断是否切换为侧载（compound）响应结构：
+    行内只保留外键 ID，被引用的对象统一放在 ``included`` 中，每个对象只序列化一次。
+    """
+
+    format = "compound"
+
+
+def wants_compound(request) -> bool:
+    renderer = getattr(request, "accepted_renderer", None)
+    return getattr(renderer, "format", None) == CompoundJSONRenderer.format
+
+
+class _StreamingFormatRenderer(JSONRenderer):
+    """
+    导出格式（?format=csv / ?format=ndjson 或对应的 Accept 头）的内容协商：正常响应由视图直接返回
+    StreamingHttpResponse，不经过渲染器；只有错误响应（如筛选参数无效）会走到这里，正文按 JSON 编码。
+    """
+
+
+class CSVRenderer(_StreamingFormatRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(_StreamingFormatRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
@@ -0,0 +1,98 @@
+"""
+读接口响应缓存，由 core/versions.py 的 @conditional_by_version(..., cache=True) 按视图动作启用。
+
+缓存键 = 视图动作 + 请求者（仅依赖用户数据时）+ ETag（数据版本号 + 规范化的查询参数指纹），
+数据变化时版本号递增、键随之改变，旧条目无需主动失效，由缓存后端的条目上限与过期时间回收
+（settings.CACHES["responses"]）。缓存的是序列化后的 response.data，命中时跳过全部业务查询与序列化。
+
+- 请求头 ``X-Response-Cache: bypass`` 跳过缓存（不读也不写），便于排查问题；
+- 响应头 ``X-Response-Cache`` 为 hit / miss / bypass；
+- 各视图动作的命中 / 未命中次数由 stats() 返回（按进程统计）；
+- 视图标记为过期的响应（response.stale，见 core/revalidate.py）不写入缓存。
+"""
+from __future__ import annotations
+
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_ALIAS = "responses"
+STATUS_HEADER = "X-Response-Cache"
+BYPASS_META_KEY = "HTTP_X_RESPONSE_CACHE"
+BYPASS_VALUE = "bypass"
+
+HIT = "hit"
+MISS = "miss"
+BYPASS = "bypass"
+
+_registered = set()
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def register(name: str) -> None:
+    """登记启用了缓存的视图动作（stats() 中列出，即使尚无请求）。"""
+    _registered.add(name)
+
+
+def _record(name: str, outcome: str) -> None:
+    with _lock:
+        _counters[(name, outcome)] += 1
+
+
+def stats() -> dict:
+    """{视图动作: {"hits", "misses", "bypasses", "hit_rate"}}"""
+    with _lock:
+        counters = dict(_counters)
+    result = {}
+    for name in sorted(_registered):
+        hits = counters.get((name, HIT), 0)
+        misses = counters.get((name, MISS), 0)
+        result[name] = {
+            "hits": hits,
+            "misses": misses,
+            "bypasses": counters.get((name, BYPASS), 0),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return result
+
+
+def reset_stats() -> None:
+    with _lock:
+        _counters.clear()
+
+
+def clear() -> None:
+    """清空全部缓存条目（一般无需调用：键中的版本号保证不会读到旧数据）。"""
+    caches[CACHE_ALIAS].clear()
+
+
+def fetch(name: str, request, key: str, render):
+    """命中时直接返回缓存的数据；否则调用 render() 生成响应，200 响应写入缓存。"""
+    if request.META.get(BYPASS_META_KEY, "").lower() == BYPASS_VALUE:
+        _record(name, BYPASS)
+        response = render()
+        response[STATUS_HEADER] = BYPASS
+        return response
+
+    backend = caches[CACHE_ALIAS]
+    data = backend.get(key)
+    if data is not None:
+        _record(name, HIT)
+        response = Response(data)
+        response[STATUS_HEADER] = HIT
+        return response
+
+    _record(name, MISS)
+    response = render()
+    if (
+        response.status_code == status.HTTP_200_OK
+        and not getattr(response, "exception", False)
+        and not getattr(response, "stale", False)
+    ):
+        backend.set(key, response.data)
+    response[STATUS_HEADER] = MISS
+    return response
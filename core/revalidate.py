@@ -0,0 +1,156 @@
+"""
+过期数据先返回、后台重算（stale-while-revalidate）。
+
+适用于计算代价随数据规模增长、又可以接受短暂过期的读接口（如统计看板）：
+
+- 每个 (视图动作, 请求者, 请求指纹) 保存最近一次的计算结果、计算时间与所依据的数据版本号
+  （settings.CACHES["responses"]，键中不含版本号，数据变化后仍能读到上一次的结果）；
+- 版本号未变：结果即最新，直接返回；
+- 版本号已变：立即返回上一次的结果并标记为过期，同时把重算提交到后台线程池；
+  同一个键同时只有一个重算在执行（single-flight），期间的其他请求继续拿到旧结果；
+- 没有旧结果、请求头 ``X-Response-Cache: bypass``、或请求不适用版本号（管理员等）：同步计算。
+
+版本号由 @conditional_by_version 在调用视图前写入 request.data_versions（见 core/versions.py）。
+过期的响应（response.stale = True）不带 ETag、不写入响应缓存，其内容与当前版本号不对应。
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core import response_cache, versions
+
+logger = logging.getLogger(__name__)
+
+# 旧结果的保留时间（秒）：超过后下次请求同步计算
+DEFAULT_TTL = 24 * 3600
+DEFAULT_WORKERS = 2
+
+_inflight = set()
+_lock = threading.Lock()
+_executor = None
+
+
+class Result(NamedTuple):
+    data: object
+    computed_at: float
+    stale: bool
+
+    @property
+    def age(self) -> int:
+        """结果计算至今的秒数。"""
+        return max(0, int(time.time() - self.computed_at))
+
+
+def _ttl() -> int:
+    return getattr(settings, "STALE_WHILE_REVALIDATE_TTL", DEFAULT_TTL)
+
+
+def submit(fn) -> None:
+    """提交后台任务（测试中可替换为同步执行）。"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "STALE_WHILE_REVALIDATE_WORKERS", DEFAULT_WORKERS),
+                thread_name_prefix="revalidate",
+            )
+    _executor.submit(_in_worker, fn)
+
+
+def _in_worker(fn) -> None:
+    try:
+        fn()
+    finally:
+        # 工作线程中的数据库连接不会随请求结束而关闭
+        connections.close_all()
+
+
+def cache_key(name: str, request) -> str:
+    fingerprint = hashlib.sha1(versions.request_fingerprint(request).encode("utf-8")).hexdigest()
+    return f"revalidate:{name}:{getattr(request.user, 'id', None)}:{fingerprint}"
+
+
+def _newer(candidate: dict, stored: dict) -> bool:
+    """版本号只增不减：不会用较旧版本的结果覆盖较新的结果（后台重算与同步计算并发时）。"""
+    return all(candidate.get(key, 0) >= value for key, value in stored.items())
+
+
+def _store(key: str, data_versions: dict, data, computed_at: float) -> None:
+    backend = caches[response_cache.CACHE_ALIAS]
+    stored = backend.get(key)
+    if stored is not None and not _newer(data_versions, stored["versions"]):
+        return
+    backend.set(
+        key,
+        {"versions": data_versions, "data": data, "computed_at": computed_at},
+        timeout=_ttl(),
+    )
+
+
+def _refresh(key: str, keys: list, compute) -> None:
+    try:
+        # 先读版本号再计算：计算期间发生的写入会让结果再次被判定为过期，而不会被误认为最新
+        data_versions = versions.current(keys)
+        computed_at = time.time()
+        _store(key, data_versions, compute(), computed_at)
+    except Exception:
+        logger.exception("后台重算失败：%s", key)
+    finally:
+        with _lock:
+            _inflight.discard(key)
+
+
+def schedule(key: str, keys: list, compute) -> bool:
+    """提交后台重算；同一个键已有重算在执行时不重复提交，返回是否提交。"""
+    with _lock:
+        if key in _inflight:
+            return False
+        _inflight.add(key)
+    try:
+        submit(lambda: _refresh(key, keys, compute))
+    except Exception:
+        with _lock:
+            _inflight.discard(key)
+        raise
+    return True
+
+
+def serve(name: str, request, compute) -> Result:
+    """
+    返回 compute() 的结果：版本号未变时为已保存的结果，已变时为旧结果（stale=True）并在后台重算，
+    没有旧结果时同步计算并保存。compute 会在后台线程中执行，只能依赖创建时捕获的数据（不要访问 request）。
+    """
+    data_versions = getattr(request, "data_versions", None)
+    bypass = request.META.get(response_cache.BYPASS_META_KEY, "").lower() == response_cache.BYPASS_VALUE
+    if data_versions is None or bypass:
+        return Result(compute(), time.time(), False)
+
+    key = cache_key(name, request)
+    stored = caches[response_cache.CACHE_ALIAS].get(key)
+    if stored is not None:
+        if stored["versions"] == data_versions:
+            return Result(stored["data"], stored["computed_at"], False)
+        schedule(key, list(data_versions), compute)
+        return Result(stored["data"], stored["computed_at"], True)
+
+    computed_at = time.time()
+    data = compute()
+    _store(key, data_versions, data, computed_at)
+    return Result(data, computed_at, False)
+
+
+def mark(response, result: Result):
+    """过期结果：设置 response.stale 与 Age 响应头（秒）。"""
+    if result.stale:
+        response.stale = True
+        response["Age"] = str(result.age)
+    return response
@@ -0,0 +1,108 @@
+"""
+客户端选择字段（sparse fieldsets）：?fields= / ?expand=。
+
+- fields：逗号分隔的顶层字段，只返回这些字段（id 总是返回）。其中的嵌套对象字段默认只返回 ID
+  （外键为单个 ID，多值关联为 ID 数组），不再 JOIN / 预取关联表。
+- expand：需要返回完整嵌套对象的字段（自动加入 fields）。
+
+sparse_serializer() 生成裁剪后的序列化器子类（按参数缓存），视图再用 core/planner.py 对它推导
+查询计划，因此字段越少，SQL 中的 JOIN、预取与读取列也越少。
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _split(value) -> tuple:
+    return tuple(dict.fromkeys(part.strip() for part in (value or "").split(",") if part.strip()))
+
+
+def parse_fieldset(request):
+    """返回 (fields, expand)；两个参数都未提供时返回 None（使用完整输出）。"""
+    params = request.query_params
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+    fields = _split(params.get(FIELDS_PARAM)) or None
+    return fields, _split(params.get(EXPAND_PARAM))
+
+
+def _is_nested(field) -> bool:
+    return isinstance(field, serializers.BaseSerializer)
+
+
+def _collapsed(field):
+    """嵌套序列化器 -> 只读主键字段（保持原 source）。"""
+    kwargs = {"read_only": True}
+    if field.source:
+        kwargs["source"] = field.source
+    if isinstance(field, serializers.ListSerializer):
+        kwargs["many"] = True
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+@lru_cache(maxsize=256)
+def sparse_serializer(serializer_class, fields, expand):
+    """
+    生成只包含 fields（None 表示全部字段）的序列化器子类，未在 expand 中的嵌套字段折叠为 ID。
+    只写字段原样保留（不参与输出，且部分序列化器在 __init__ 中会访问它们）。
+    """
+    declared = serializer_class._declared_fields
+    readable = [
+        name for name in serializer_class.Meta.fields
+        if not (name in declared and declared[name].write_only)
+    ]
+    nested = [name for name in readable if name in declared and _is_nested(declared[name])]
+
+    unknown = [name for name in (fields or ()) if name not in readable]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"未知字段：{', '.join(unknown)}"})
+    invalid = [name for name in expand if name not in nested]
+    if invalid:
+        raise ValidationError(
+            {EXPAND_PARAM: f"不可展开的字段：{', '.join(invalid)}（可选：{', '.join(nested)}）"}
+        )
+
+    if fields is None:
+        selected = set(readable)
+    else:
+        selected = {"id", *fields, *expand}
+    if fields is not None:
+        # fields 模式下嵌套字段默认折叠；未指定 fields 时保持完整嵌套
+        collapse = [name for name in nested if name in selected and name not in expand]
+    else:
+        collapse = []
+
+    attrs = {}
+    for name, field in declared.items():
+        if field.write_only:
+            continue
+        if name not in selected:
+            attrs[name] = None
+        elif name in collapse:
+            attrs[name] = _collapsed(field)
+    meta_fields = tuple(
+        name for name in serializer_class.Meta.fields
+        if name in selected or (name in declared and declared[name].write_only)
+    )
+    attrs["Meta"] = type("Meta", (serializer_class.Meta,), {"fields": meta_fields})
+    return type(f"Sparse{serializer_class.__name__}", (serializer_class,), attrs)
+
+
+@lru_cache(maxsize=256)
+def with_nested(serializer_class, name, nested_class):
+    """把 serializer_class 上的嵌套字段 name 换成 nested_class（例如裁剪后的谷子序列化器）。"""
+    field = serializer_class._declared_fields[name]
+    kwargs = {"read_only": True}
+    if field.source:
+        kwargs["source"] = field.source
+    return type(
+        f"{serializer_class.__name__}With{nested_class.__name__}",
+        (serializer_class,),
+        {name: nested_class(**kwargs)},
+    )
@@ -0,0 +1,172 @@
+"""
+数据版本号与条件请求（ETag / If-None-Match）。
+
+写入侧：业务模型的信号接收器调用 bump_user(user_id) / bump_catalog()，在写入所在的事务中
+把对应的 CollectionVersion 行 +1（UPDATE ... SET version = version + 1）。
+
+读取侧：视图方法用 @conditional_by_version("user", "catalog") 装饰。处理请求前只做一次版本查询，
+由「版本号 + 路径与规范化的查询参数 + 响应格式」得到强 ETag；与 If-None-Match 一致时
+直接返回 304，不再执行任何业务查询与序列化。
+
+版本号在业务查询之前读取：若两者之间发生写入，响应内容比 ETag 新，客户端下次请求时版本号
+已变化，只会多拿一次 200，不会拿到过期的 304。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.users.models import CollectionVersion
+from core import response_cache
+from core.permissions import is_admin
+
+USER_SCOPE = "user"
+CATALOG_SCOPE = "catalog"
+# 公开资源（如公开展柜）：依赖资源所属用户的数据，由视图的 get_version_owner_id() 给出所属用户
+OWNER_SCOPE = "owner"
+CATALOG_KEY = "catalog"
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def _bump(key: str) -> None:
+    if CollectionVersion.objects.filter(key=key).update(version=F("version") + 1):
+        return
+    # 首次写入以当前时间（微秒）为起点：数据库重建或事务回滚后，版本号不会与旧的 ETag / 缓存条目重合
+    try:
+        with transaction.atomic():
+            CollectionVersion.objects.create(key=key, version=time.time_ns() // 1000)
+    except IntegrityError:
+        # 并发首次创建：对方已插入，再递增一次
+        CollectionVersion.objects.filter(key=key).update(version=F("version") + 1)
+
+
+def bump_user(*user_ids) -> None:
+    """用户数据（谷子 / 收纳位置 / 主题 / 展柜）发生写入。"""
+    for user_id in dict.fromkeys(user_ids):
+        if user_id is not None:
+            _bump(user_key(user_id))
+
+
+def bump_catalog() -> None:
+    """公共目录（IP / 角色 / 品类）发生写入。"""
+    _bump(CATALOG_KEY)
+
+
+def current(keys) -> dict:
+    """一次查询读取多个版本号，未写入过的键为 0。"""
+    stored = dict(CollectionVersion.objects.filter(key__in=list(keys)).values_list("key", "version"))
+    return {key: stored.get(key, 0) for key in keys}
+
+
+def _scope_keys(view, request, kwargs, scopes):
+    """请求对应的版本键；无法用版本号描述的请求（未登录访问用户数据、管理员跨用户查看）返回 None。"""
+    keys = []
+    for scope in scopes:
+        if scope == CATALOG_SCOPE:
+            keys.append(CATALOG_KEY)
+        elif scope == OWNER_SCOPE:
+            owner_id = view.get_version_owner_id(request, **kwargs)
+            if owner_id is None:
+                return None
+            keys.append(user_key(owner_id))
+        else:
+            user = getattr(request, "user", None)
+            if not getattr(user, "id", None) or is_admin(user):
+                return None
+            keys.append(user_key(user.id))
+    return keys
+
+
+def resolve(view, request, kwargs, scopes):
+    """{版本键: 版本号}；不适用时返回 None。"""
+    keys = _scope_keys(view, request, kwargs, scopes)
+    if keys is None:
+        return None
+    return current(keys)
+
+
+def request_fingerprint(request) -> str:
+    """路径 + 排序后的查询参数 + 响应格式：参数顺序不同的等价请求得到同一指纹。"""
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    renderer = getattr(request, "accepted_renderer", None)
+    return json.dumps(
+        [request.path, params, getattr(renderer, "format", "")],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def compute_etag(request, versions: dict) -> str:
+    raw = "|".join([
+        *(f"{key}={value}" for key, value in versions.items()),
+        request_fingerprint(request),
+    ])
+    return '"%s"' % hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _matches(request, etag: str) -> bool:
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    # If-None-Match 使用弱比较
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in parse_etags(header)]
+    return "*" in tags or etag in tags
+
+
+def conditional_by_version(*scopes, cache: bool = False):
+    """
+    读接口装饰器：scopes 为 "user" / "catalog" / "owner" 的组合，表示响应依赖哪些数据。
+    命中 If-None-Match 时返回 304；正常的 200 响应附带 ETag。
+    cache=True 时同时启用响应缓存（见 core/response_cache.py），键中包含版本号，无需主动失效。
+    视图返回的过期响应（response.stale，见 core/revalidate.py）不附带 ETag、不写入响应缓存。
+    """
+
+    def decorator(method):
+        name = method.__qualname__
+        if cache:
+            response_cache.register(name)
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = resolve(self, request, kwargs, scopes)
+            if versions is None:
+                return method(self, request, *args, **kwargs)
+            etag = compute_etag(request, versions)
+            if _matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            # 供视图使用（如 core/revalidate.py 判断已保存的结果是否过期），避免再查一次版本号
+            request.data_versions = versions
+            if cache:
+                # 依赖用户数据的响应因请求者而异（可见性、管理员视图等），按请求者区分缓存条目
+                per_user = any(scope != CATALOG_SCOPE for scope in scopes)
+                requester = getattr(request.user, "id", None) if per_user else None
+                response = response_cache.fetch(
+                    name,
+                    request,
+                    f"{name}:{requester}:{etag}",
+                    lambda: method(self, request, *args, **kwargs),
+                )
+            else:
+                response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and not getattr(response, "stale", False):
+                response["ETag"] = etag
+            return response
+
+        return wrapper
+
+    return decorator